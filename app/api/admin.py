@@ -0,0 +1,115 @@
+"""
+Admin API endpoints for NeuraFormAI
+Operational tasks that must not be reachable by regular users
+"""
+
+import zlib
+import logging
+from typing import Optional, AsyncIterator
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from app.api.auth import require_admin
+from app.services.conversation_import import ConversationImporter, iter_jsonl
+from app.config.sharding import shard_router
+from app.services.message_archive import run_partition_maintenance
+from app.services.sampling_profiler import ProfilerBusyError, dump_tasks, sampling_profiler
+from app.services.model_router import model_router
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+async def _request_lines(request: Request) -> AsyncIterator[bytes]:
+    """Yield the request body, transparently gunzipping it when needed"""
+    if request.headers.get("content-encoding") == "gzip":
+        decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        async for chunk in request.stream():
+            yield decompressor.decompress(chunk)
+        yield decompressor.flush()
+    else:
+        async for chunk in request.stream():
+            yield chunk
+
+
+@router.post("/conversations/import")
+async def import_conversations(
+    request: Request,
+    user_id: Optional[str] = Query(None, description="Assign every conversation to this user"),
+    batch_size: int = Query(5000, ge=100, le=100000),
+):
+    """Bulk-load JSON-lines conversations (nested or /chat/export format)"""
+    importer = ConversationImporter(batch_size=batch_size)
+    try:
+        stats = await importer.import_records(iter_jsonl(_request_lines(request)), user_id=user_id)
+    except (ValueError, KeyError, zlib.error) as e:
+        logger.error(f"Conversation import rejected after {importer.stats}: {e}")
+        raise HTTPException(status_code=400, detail=f"Invalid import data: {e}")
+
+    logger.info(f"Conversation import finished: {stats}")
+    return {"success": True, **stats}
+
+
+@router.post("/messages/partitions/maintain")
+async def maintain_message_partitions():
+    """Create upcoming message partitions and archive expired ones now"""
+    result = await run_partition_maintenance(list(shard_router.archives.values()))
+    return {"success": True, "shards": result}
+
+
+@router.post("/messages/partitions/{partition_name}/archive")
+async def archive_message_partition(partition_name: str, shard: str = Query("primary")):
+    """Archive a single monthly partition to disk regardless of its age"""
+    if shard not in shard_router.shards:
+        raise HTTPException(status_code=404, detail=f"Unknown shard '{shard}'")
+    if len(partition_name) != 16 or not partition_name.startswith("messages_p") or not partition_name[10:].isdigit():
+        raise HTTPException(status_code=400, detail="Not a monthly message partition")
+    archived = await shard_router.archive(shard).archive_partition(partition_name)
+    return {"success": True, "shard": shard, "partition": partition_name, "messages": archived}
+
+
+@router.get("/profile")
+async def profile_process(
+    seconds: float = Query(10, gt=0, le=120),
+    interval_ms: int = Query(10, ge=1, le=1000),
+    all_threads: bool = Query(False, description="Sample worker threads too, not just the event loop"),
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+):
+    """Sample this worker's stacks for a while and return collapsed stacks.
+
+    ``format=collapsed`` returns plain text for flamegraph.pl/speedscope;
+    ``json`` also includes a dump of pending asyncio tasks.
+    """
+    try:
+        result = await sampling_profiler.profile(seconds, interval_ms=interval_ms, all_threads=all_threads)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"] + "\n")
+    return {"success": True, **result, "tasks": dump_tasks()}
+
+
+@router.get("/tasks")
+async def list_asyncio_tasks(stack_limit: int = Query(20, ge=1, le=200)):
+    """Pending asyncio tasks and where each one is suspended"""
+    tasks = dump_tasks(stack_limit)
+    return {"success": True, "count": len(tasks), "tasks": tasks}
+
+
+@router.get("/models")
+async def list_routed_models():
+    """Candidate LLMs with the latency, error and price figures the router ranks them by"""
+    return {"success": True, **model_router.snapshot(), "ranking": model_router.ranking()}
+
+
+@router.post("/models/refresh")
+async def refresh_model_catalog():
+    """Reload candidate prices and availability from the OpenRouter catalog"""
+    try:
+        found = await model_router.refresh_catalog()
+    except Exception as e:
+        logger.error(f"Model catalog refresh failed: {e}")
+        raise HTTPException(status_code=502, detail=f"Catalog refresh failed: {e}")
+    return {"success": True, "listed": found, **model_router.snapshot()}
@@ -5,12 +5,15 @@ Handles OAuth login, user registration, and session management
 
 from datetime import date
 from typing import Optional, Dict, Any
-from fastapi import APIRouter, HTTPException, Depends, Request, Response
+import os
+import hmac
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Header
 from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr, validator, ValidationError
 import logging
 
+from app.config.database import DatabaseUnavailableError
 from app.services.auth_service import oauth_service, AuthProvider
 from app.services.user_service import UserProfile
 import aiohttp
@@ -143,6 +146,15 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     
     return user
 
+# Dependency guarding operational endpoints (imports, jobs, diagnostics)
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Require the X-Admin-Token header to match ADMIN_API_TOKEN"""
+    expected = os.getenv('ADMIN_API_TOKEN')
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
 @router.post("/login/oauth", response_model=LoginResponse)
 async def oauth_login(request: OAuthLoginRequest):
     """OAuth login endpoint"""
@@ -203,6 +215,8 @@ async def oauth_login(request: OAuthLoginRequest):
                 message=message
             )
     
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"OAuth login failed: {e}")
         # Return error detail to aid debugging (temporary; tighten in production)
@@ -242,6 +256,8 @@ async def email_login(request: EmailLoginRequest):
             session_token=session_token
         )
             
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Email login error: {e}")
         raise HTTPException(status_code=500, detail="Login failed")
@@ -347,6 +363,8 @@ async def oauth_register_user(request: UserRegistrationRequest):
     
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"User registration failed: {e}")
         # Return the error message to help diagnose setup issues (temporary; tighten in prod)
@@ -402,6 +420,8 @@ async def email_register_user(request: EmailRegistrationRequest):
     except ValueError as e:
         logger.error(f"Validation error in registration: {e}")
         raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Email registration failed: {e}")
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
@@ -473,6 +493,8 @@ async def update_profile(
     
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Profile update failed: {e}")
         raise HTTPException(status_code=500, detail="Profile update failed")
@@ -494,6 +516,8 @@ async def accept_terms_and_privacy(current_user: UserProfile = Depends(get_curre
         else:
             raise HTTPException(status_code=404, detail="User not found")
     
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Terms acceptance failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to accept terms")
@@ -516,6 +540,8 @@ async def logout(current_user: UserProfile = Depends(get_current_user), credenti
         else:
             raise HTTPException(status_code=404, detail="Session not found")
     
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Logout failed: {e}")
         raise HTTPException(status_code=500, detail="Logout failed")
@@ -542,6 +568,8 @@ async def delete_account(current_user: UserProfile = Depends(get_current_user),
         else:
             raise HTTPException(status_code=404, detail="User not found")
     
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Account deletion failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to deactivate account")
@@ -560,6 +588,8 @@ async def get_active_sessions(current_user: UserProfile = Depends(get_current_us
         sessions = await oauth_service.db.fetch(query, current_user.id)
         return {"sessions": [dict(session) for session in sessions]}
     
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Failed to get sessions: {e}")
         raise HTTPException(status_code=500, detail="Failed to get sessions")
@@ -582,6 +612,8 @@ async def invalidate_session_by_id(session_id: str, current_user: UserProfile =
         else:
             raise HTTPException(status_code=404, detail="Session not found")
     
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Failed to invalidate session: {e}")
         raise HTTPException(status_code=500, detail="Failed to invalidate session") 
\ No newline at end of file
@@ -1,19 +1,49 @@
-from fastapi import APIRouter, Body, Query, HTTPException
+import os
+import json
+import time
+import logging
+import zlib
+import asyncio
+from fastapi import APIRouter, Body, Header, Query, HTTPException, Request, Response
 from pydantic import BaseModel
-from app.services.chat_engine import ChatEngine
+from prometheus_client import Counter
+from app.config.database import DatabaseUnavailableError
+from app.services.chat_engine import ABANDONED_TURN_POLICY, ChatEngine
 from app.services.conversation_service import ConversationService
 from fastapi.responses import StreamingResponse, JSONResponse
-from app.services.elevenlabs_tts import synthesize_reply_as_stream
-from typing import List, Dict, Any
+from app.services.tts_backend import synthesize_reply_as_stream
+from app.services.audio_prefetch import TTS_PREFETCH, AudioBuffer, audio_prefetcher
+from app.services.audio_format import AudioFormat, negotiate
+from app.services.single_flight import (
+    CHAT_COALESCE_TTL_S, IDEMPOTENCY_TTL_S, IdempotencyKeyConflictError, chat_single_flight, fingerprint,
+)
+from app.helpers.turn_timing import TurnTimings, start_turn
+from app.config.logging_config import redact
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Tuple
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# How often an in-flight turn checks whether its client is still connected
+DISCONNECT_POLL_S = float(os.getenv("DISCONNECT_POLL_S", "0.25"))
+# Status logged for requests the client abandoned (nginx convention; nobody receives it)
+CLIENT_CLOSED_REQUEST = 499
+
+ABANDONED_TURNS = Counter(
+    'chat_abandoned_turns_total',
+    'Chat turns whose client disconnected before the response finished',
+    ['route', 'stage'],  # stage is "reply" (before the reply was ready) or "audio" (mid TTS stream)
+)
+
 class ChatRequest(BaseModel):
     user_id: str
     message: str
     mode: str
     voice_enabled: bool = True 
     save_to_history: bool = True 
+    audio_format: Optional[str] = None  # format of audio_url, e.g. "opus" or "mp3_44100_64" (see app/services/audio_format.py)
 
 class ChatResponse(BaseModel):
     reply: str
@@ -21,78 +51,288 @@ class ChatResponse(BaseModel):
     completion_tokens: int
     total_tokens: int
     voice_id: str | None = None 
+    turn_id: str | None = None  # pass to /chat/speak to voice this reply without generating again
+    audio_url: str | None = None  # audio being synthesized in the background (voice_enabled only)
+
+class SpeakRequest(BaseModel):
+    user_id: str
+    # Either a turn_id from /chat/, or a new message to generate a reply for
+    turn_id: Optional[str] = None
+    message: Optional[str] = None
+    mode: str = "safe"
+    voice_enabled: bool = True
+    # Output format; overrides the Accept header
+    audio_format: Optional[str] = None
+
+# === Keep fire-and-forget tasks referenced until they finish ===
+_background_tasks = set()
+
+def _keep_running(task: asyncio.Task):
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def _unless_disconnected(http_request: Request, work: Awaitable[Any]) -> Optional[Any]:
+    """Run a turn, giving up on it if the client disconnects first.
+
+    Returns None when the client went away. The turn is then cancelled,
+    which aborts the upstream LLM request, unless ABANDONED_TURN_POLICY
+    is "complete", in which case it finishes in the background.
+    """
+    task = asyncio.create_task(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_S)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    ABANDONED_TURNS.labels(route=http_request.url.path, stage="reply").inc()
+    logger.info("🔌 Client disconnected from %s before the reply; policy=%s", http_request.url.path, ABANDONED_TURN_POLICY)
+    if ABANDONED_TURN_POLICY == "complete":
+        _keep_running(task)
+    else:
+        task.cancel()
+        await asyncio.wait({task})
+    return None
 
 # === Chat endpoint for generating replies ===
 @router.post("/", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
-    print(f"📩 [/chat/] message received from {request.user_id} | voice_enabled={request.voice_enabled} | save_to_history={request.save_to_history}")
-    result = await ChatEngine.generate_reply(
-        user_id=request.user_id,
-        message=request.message,
-        mode=request.mode,
-        save_to_history=request.save_to_history,
-    )
+async def chat_endpoint(request: ChatRequest, response: Response, http_request: Request):
+    logger.info("📩 [/chat/] message received from %s | voice_enabled=%s | save_to_history=%s", request.user_id, request.voice_enabled, request.save_to_history)
+    timings = start_turn()
+    audio_format = _negotiate_format(request.audio_format) if request.voice_enabled else None
+
+    # Retries and double-submits of the same turn share one LLM call and one saved reply
+    request_fingerprint = fingerprint(request.user_id, request.mode, request.save_to_history, request.message)
+    idempotency_key = http_request.headers.get("Idempotency-Key")
+    if idempotency_key:
+        key, ttl_s = f"{request.user_id}:key:{idempotency_key}", IDEMPOTENCY_TTL_S
+    else:
+        key, ttl_s = f"{request.user_id}:msg:{request_fingerprint}", CHAT_COALESCE_TTL_S
+
+    try:
+        coalesced = await _unless_disconnected(http_request, chat_single_flight.run(
+            key,
+            lambda: ChatEngine.generate_reply(
+                user_id=request.user_id,
+                message=request.message,
+                mode=request.mode,
+                save_to_history=request.save_to_history,
+            ),
+            request_fingerprint=request_fingerprint,
+            ttl_s=ttl_s,
+        ))
+    except IdempotencyKeyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if coalesced is None:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+    result, outcome = coalesced
+    if outcome != "leader":
+        response.headers["X-Coalesced"] = outcome
+    if TTS_PREFETCH and request.voice_enabled and result.get("turn_id"):
+        # Synthesize now so the audio is (nearly) ready when the client asks for it
+        audio_prefetcher.start(
+            result["turn_id"], request.user_id, result["reply"], result.get("voice_id"),
+            result.get("conversation_id"), result.get("message_id"), audio_format,
+        )
+        result = {**result, "audio_url": _audio_url(result["turn_id"], request.user_id, audio_format)}
+    response.headers["Server-Timing"] = timings.server_timing()
     return ChatResponse(**result)
 
+async def _timed_audio(audio_stream, timings: TurnTimings, started: float,
+                       conversation_id: Optional[str], message_id: Optional[str]) -> AsyncIterator[bytes]:
+    """Pass audio through, recording time to the first chunk as tts_ttfb.
+
+    Headers are already sent by then, so the value is stored on the
+    reply message rather than in Server-Timing.
+    """
+    first_chunk = True
+    try:
+        async for chunk in audio_stream:
+            if first_chunk:
+                first_chunk = False
+                ttfb_ms = (time.perf_counter() - started) * 1000
+                timings.add("tts_ttfb", ttfb_ms)
+                logger.debug("⏱️ TTS first byte after %.0fms", ttfb_ms)
+                if conversation_id and message_id:
+                    _keep_running(asyncio.create_task(ConversationService().add_message_timings(
+                        conversation_id, message_id, {"tts_ttfb": round(ttfb_ms, 1)}
+                    )))
+            yield chunk
+    except (asyncio.CancelledError, GeneratorExit):
+        # Client disconnected mid-stream: stop pulling audio from the TTS backend
+        ABANDONED_TURNS.labels(route="/chat/speak", stage="audio").inc()
+        logger.info("🔌 Client disconnected during TTS streaming; closing the upstream stream")
+        await audio_stream.aclose()
+        raise
+
+# === Audio formats ===
+def _negotiate_format(requested: Optional[str], accept: Optional[str] = None) -> AudioFormat:
+    try:
+        return negotiate(requested, accept)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+# === Buffered (prefetched) audio ===
+def _audio_url(turn_id: str, user_id: str, audio_format: AudioFormat) -> str:
+    return f"/chat/turns/{turn_id}/audio?user_id={user_id}&format={audio_format.name}"
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """First byte range of a "bytes=" Range header as (start, end) inclusive, or None if unsatisfiable"""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or not spec or size == 0:
+        return None
+    first, _, last = spec.split(",")[0].strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            start, end = max(0, size - int(last)), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+def _buffered_audio(buffer: AudioBuffer, range_header: Optional[str] = None,
+                    headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serve a turn's audio buffer.
+
+    A complete buffer is served with Content-Length and honours Range;
+    one still being synthesized is streamed from its first byte and
+    continues live (Range is ignored until it is complete).
+    """
+    headers = {**(headers or {}), "Vary": "Accept"}
+    media_type = buffer.audio_format.media_type
+    if not buffer.complete:
+        return StreamingResponse(buffer.iter_chunks(), media_type=media_type, headers=headers)
+
+    headers["Accept-Ranges"] = "bytes"
+    if range_header:
+        byte_range = _parse_range(range_header, buffer.size)
+        if byte_range is None:
+            headers["Content-Range"] = f"bytes */{buffer.size}"
+            return Response(status_code=416, headers=headers)
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{buffer.size}"
+        return Response(buffer.read_range(start, end), status_code=206, media_type=media_type, headers=headers)
+    return Response(buffer.read_range(0, buffer.size - 1), media_type=media_type, headers=headers)
+
+@router.get("/turns/{turn_id}/audio")
+async def turn_audio(turn_id: str, user_id: str = Query(...), format: Optional[str] = Query(None),
+                     range: Optional[str] = Header(None), accept: Optional[str] = Header(None)):
+    """Audio of a finished turn; joins the prefetch if it is still running, synthesizes if it is gone"""
+    audio_format = _negotiate_format(format, accept)
+    buffer = audio_prefetcher.get(turn_id, user_id, audio_format)
+    if buffer is None:
+        turn = await ChatEngine.get_turn(user_id, turn_id)
+        if turn is None:
+            raise HTTPException(status_code=404, detail="Turn not found")
+        buffer = audio_prefetcher.start(
+            turn_id, user_id, turn["reply"], turn["voice_id"], turn["conversation_id"], turn["message_id"],
+            audio_format,
+        )
+    return _buffered_audio(buffer, range)
+
 # === Chat endpoint for streaming TTS audio ===
 @router.post("/speak")
-async def chat_speak_endpoint(request: ChatRequest):
-    print(f"📡 [/chat/speak] Received TTS request | voice_enabled={request.voice_enabled}")
+async def chat_speak_endpoint(request: SpeakRequest, http_request: Request, accept: Optional[str] = Header(None)):
+    logger.info("📡 [/chat/speak] Received TTS request | turn_id=%s | voice_enabled=%s", request.turn_id, request.voice_enabled)
+    timings = start_turn()
+    audio_format = _negotiate_format(request.audio_format, accept) if request.voice_enabled else None
 
-    result = await ChatEngine.generate_reply(
-        user_id=request.user_id,
-        message=request.message,
-        mode=request.mode,
-    )
+    if request.turn_id:
+        # Voice a reply /chat/ already generated and saved
+        result = await ChatEngine.get_turn(request.user_id, request.turn_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Turn not found")
+    elif request.message:
+        result = await _unless_disconnected(http_request, ChatEngine.generate_reply(
+            user_id=request.user_id,
+            message=request.message,
+            mode=request.mode,
+        ))
+        if result is None:
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
+    else:
+        raise HTTPException(status_code=422, detail="Either turn_id or message is required")
 
     if not request.voice_enabled:
-        print("🔇 [BACKEND] voice_enabled is FALSE — skipping ElevenLabs.")
+        logger.info("🔇 [BACKEND] voice_enabled is FALSE — skipping TTS.")
         return JSONResponse(
             content={"skipped": True, "reason": "voice disabled"},
-            status_code=200
+            status_code=200,
+            headers={"Server-Timing": timings.server_timing()},
         )
 
+    if request.turn_id:
+        buffer = audio_prefetcher.get(request.turn_id, request.user_id, audio_format) or audio_prefetcher.start(
+            request.turn_id, request.user_id, result["reply"], result["voice_id"],
+            result["conversation_id"], result["message_id"], audio_format,
+        )
+        return _buffered_audio(buffer, headers={"Server-Timing": timings.server_timing()})
+
     voice_id = result.get("voice_id")
-    print(f"🗣️ Sending to ElevenLabs: \"{result['reply'][:60]}...\" | voice_id={voice_id}")
-    audio_stream = synthesize_reply_as_stream(result["reply"], voice_id)
+    logger.debug("🗣️ Sending to TTS: %s | voice_id=%s", redact(result['reply']), voice_id)
+    tts_started = time.perf_counter()
+    audio_stream = synthesize_reply_as_stream(result["reply"], voice_id, request.user_id, audio_format)
     return StreamingResponse(
-        content=audio_stream,
-        media_type="audio/mpeg",
-        status_code=200
+        content=_timed_audio(
+            audio_stream, timings, tts_started, result.get("conversation_id"), result.get("message_id")
+        ),
+        media_type=audio_format.media_type,
+        status_code=200,
+        headers={"Server-Timing": timings.server_timing(), "Vary": "Accept"},
     )
 
 # === Endpoint to convert text to speech using active persona ===
 @router.post("/speak-from-text")
-def speak_from_text(
+async def speak_from_text(
     user_id: str = Body(..., embed=True),
-    reply: str = Body(..., embed=True)
+    reply: str = Body(..., embed=True),
+    audio_format: Optional[str] = Body(None, embed=True),
+    accept: Optional[str] = Header(None)
 ):
     """
     Converts a given reply text to speech using the active persona's voice.
-    Requires both user_id and reply in the JSON body.
+    Requires both user_id and reply in the JSON body; audio_format (or the
+    Accept header) picks the output format, MP3 by default.
     """
-    print(f"🎙️ [Backend] speak-from-text called for user_id={user_id}")
-    print(f"📨 Payload: \"{reply[:60]}...\"")
+    output_format = _negotiate_format(audio_format, accept)
+    logger.info("🎙️ [Backend] speak-from-text called for user_id=%s", user_id)
+    logger.debug("📨 Payload: %s", redact(reply))
 
     try:
         # Get persona voice via ChatEngine helper (per user session)
         voice_id = ChatEngine.get_voice_id(user_id)
-        print(f"🗣️ Using voice_id={voice_id}")
+        logger.debug("🗣️ Using voice_id=%s", voice_id)
+
+        # /chat/ usually started synthesizing this exact reply already
+        buffer = audio_prefetcher.find_text(user_id, reply, voice_id, output_format)
+        if buffer is not None:
+            logger.debug("🎙️ [Backend] Serving prefetched audio for turn %s", buffer.turn_id)
+            return _buffered_audio(buffer)
 
         # Generate and stream audio
-        print(f"🎙️ [Backend] Calling synthesize_reply_as_stream...")
-        audio_stream = synthesize_reply_as_stream(reply, voice_id)
-        print(f"🎙️ [Backend] Audio stream created, returning StreamingResponse...")
+        logger.debug("🎙️ [Backend] Calling synthesize_reply_as_stream...")
+        audio_stream = synthesize_reply_as_stream(reply, voice_id, user_id, output_format)
+        logger.debug("🎙️ [Backend] Audio stream created, returning StreamingResponse...")
         
         return StreamingResponse(
             content=audio_stream,
-            media_type="audio/mpeg",
-            status_code=200
+            media_type=output_format.media_type,
+            status_code=200,
+            headers={"Vary": "Accept"}
         )
     except Exception as e:
-        print(f"❌ [Backend] Error in speak-from-text: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ [Backend] Error in speak-from-text: %s", e)
         raise
 
 # === Endpoint to get conversation history ===
@@ -104,14 +344,14 @@ async def get_conversation_history(
     """
     Get conversation history for a user-persona pair.
     """
-    print(f"📚 [Backend] get_conversation_history called for user_id={user_id}, persona_name={persona_name}")
+    logger.info("📚 [Backend] get_conversation_history called for user_id=%s, persona_name=%s", user_id, persona_name)
 
     try:
         conv_service = ConversationService()
         conversation_id = await conv_service.get_or_create_conversation(user_id, persona_name)
-        messages = await conv_service.get_conversation_messages(conversation_id)
+        messages = await conv_service.get_conversation_messages(conversation_id, user_id=user_id)
         
-        print(f"📚 [Backend] Found {len(messages)} messages in conversation history")
+        logger.debug("📚 [Backend] Found %s messages in conversation history", len(messages))
         
         return {
             "success": True,
@@ -119,10 +359,51 @@ async def get_conversation_history(
             "messages": messages
         }
         
+    except DatabaseUnavailableError:
+        # Surface as 503 with Retry-After rather than a 500
+        raise
+    except Exception as e:
+        logger.exception("❌ [Backend] Error in get_conversation_history: %s", e)
+        return JSONResponse(
+            content={"success": False, "error": str(e)},
+            status_code=500
+        )
+
+
+# === Endpoint to search conversation history ===
+@router.get("/search")
+async def search_conversation_history(
+    user_id: str = Query(..., description="User ID"),
+    q: str = Query(..., min_length=1, description="Search terms (web search syntax)"),
+    persona_name: Optional[str] = Query(None, description="Restrict to one persona"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    """
+    Full-text search over a user's messages, ranked by relevance.
+    """
+    try:
+        logger.info("🔎 [Backend] Searching history for user_id=%s, persona=%s", user_id, persona_name)
+
+        conversation_service = ConversationService()
+        page = await conversation_service.search_messages(
+            user_id, q, persona_name=persona_name, limit=limit, cursor=cursor
+        )
+
+        return JSONResponse(
+            content={"success": True, **page},
+            status_code=200
+        )
+
+    except ValueError as e:
+        return JSONResponse(
+            content={"success": False, "error": str(e)},
+            status_code=400
+        )
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
-        print(f"❌ [Backend] Error in get_conversation_history: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ [Backend] Error in search_conversation_history: %s", e)
         return JSONResponse(
             content={"success": False, "error": str(e)},
             status_code=500
@@ -136,7 +417,7 @@ async def get_conversation_for_persona(
 ):
     """Get conversation ID for a specific user-persona pair"""
     try:
-        print(f"🔍 [Backend] Getting conversation for user_id={user_id}, persona={persona_name}")
+        logger.info("🔍 [Backend] Getting conversation for user_id=%s, persona=%s", user_id, persona_name)
         
         conversation_service = ConversationService()
         conversation_id = await conversation_service.get_conversation_for_persona(user_id, persona_name)
@@ -152,16 +433,70 @@ async def get_conversation_for_persona(
                 status_code=404
             )
         
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
-        print(f"❌ [Backend] Error in get_conversation_for_persona: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ [Backend] Error in get_conversation_for_persona: %s", e)
         return JSONResponse(
             content={"success": False, "error": str(e)},
             status_code=500
         )
 
 
+# === Endpoint to export a user's full history ===
+_EXPORT_FLUSH_BYTES = 64 * 1024
+
+async def _encode_export(records: AsyncIterator[Dict[str, Any]], compress: bool) -> AsyncIterator[bytes]:
+    """Serialize export records as JSON lines, optionally gzip-compressed.
+
+    Lines are buffered into ~64 KB chunks so the response is written in
+    a few large sends rather than one per message.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+    buffer = bytearray()
+
+    async for record in records:
+        buffer += json.dumps(record, ensure_ascii=False).encode("utf-8")
+        buffer += b"\n"
+        if len(buffer) >= _EXPORT_FLUSH_BYTES:
+            chunk = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+            buffer.clear()
+            if chunk:
+                yield chunk
+
+    tail = compressor.compress(bytes(buffer)) + compressor.flush() if compressor else bytes(buffer)
+    if tail:
+        yield tail
+
+
+@router.get("/export")
+async def export_conversation_history(
+    user_id: str = Query(..., description="User ID"),
+    format: str = Query("ndjson", pattern="^(ndjson|jsonl.gz)$", description="ndjson or jsonl.gz")
+):
+    """
+    Stream every conversation and message for a user as JSON lines.
+    Each conversation record is followed by its message records.
+    """
+    logger.info("📦 [Backend] Exporting history for user_id=%s as %s", user_id, format)
+
+    try:
+        UUID(user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid user_id")
+
+    compress = format == "jsonl.gz"
+    conversation_service = ConversationService()
+    records = conversation_service.iter_user_history(user_id)
+
+    return StreamingResponse(
+        content=_encode_export(records, compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="history-{user_id}.{"jsonl.gz" if compress else "ndjson"}"'},
+        status_code=200
+    )
+
+
 # === Conversation Management Models ===
 class UpdateConversationRequest(BaseModel):
     title: str
@@ -172,7 +507,7 @@ class UpdateConversationRequest(BaseModel):
 async def get_conversations(user_id: str = Query(..., description="User ID")):
     """Get all conversations for a user"""
     try:
-        print(f"📂 [Backend] Getting conversations for user_id={user_id}")
+        logger.info("📂 [Backend] Getting conversations for user_id=%s", user_id)
         
         conversation_service = ConversationService()
         conversations = await conversation_service.get_user_conversations(user_id)
@@ -182,10 +517,10 @@ async def get_conversations(user_id: str = Query(..., description="User ID")):
             status_code=200
         )
         
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
-        print(f"❌ [Backend] Error in get_conversations: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ [Backend] Error in get_conversations: %s", e)
         return JSONResponse(
             content={"success": False, "error": str(e)},
             status_code=500
@@ -196,7 +531,7 @@ async def get_conversations(user_id: str = Query(..., description="User ID")):
 async def update_conversation(conversation_id: str, request: UpdateConversationRequest):
     """Update conversation title"""
     try:
-        print(f"✏️ [Backend] Updating conversation {conversation_id} title to: {request.title}")
+        logger.info("✏️ [Backend] Updating conversation %s title to: %s", conversation_id, redact(request.title))
         
         conversation_service = ConversationService()
         success = await conversation_service.update_conversation_title(conversation_id, request.title)
@@ -212,10 +547,10 @@ async def update_conversation(conversation_id: str, request: UpdateConversationR
                 status_code=404
             )
             
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
-        print(f"❌ [Backend] Error in update_conversation: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ [Backend] Error in update_conversation: %s", e)
         return JSONResponse(
             content={"success": False, "error": str(e)},
             status_code=500
@@ -226,7 +561,7 @@ async def update_conversation(conversation_id: str, request: UpdateConversationR
 async def delete_conversation(conversation_id: str):
     """Delete a conversation and all its messages"""
     try:
-        print(f"🗑️ [Backend] Deleting conversation {conversation_id}")
+        logger.info("🗑️ [Backend] Deleting conversation %s", conversation_id)
         
         conversation_service = ConversationService()
         success = await conversation_service.delete_conversation(conversation_id)
@@ -242,10 +577,10 @@ async def delete_conversation(conversation_id: str):
                 status_code=404
             )
             
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
-        print(f"❌ [Backend] Error in delete_conversation: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ [Backend] Error in delete_conversation: %s", e)
         return JSONResponse(
             content={"success": False, "error": str(e)},
             status_code=500
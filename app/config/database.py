@@ -4,21 +4,73 @@ Supports both local PostgreSQL and Supabase cloud database
 """
 
 import os
+import time
 import asyncio
 from typing import Optional, Dict, Any
 from contextlib import asynccontextmanager
 import asyncpg
 from asyncpg import Pool, Connection
+from prometheus_client import Counter, Gauge, Histogram
 import logging
 
 logger = logging.getLogger(__name__)
 
+# === Pool and query instrumentation ===
+DB_POOL_ACQUIRE_WAIT = Histogram(
+    'db_pool_acquire_wait_seconds',
+    'Time spent waiting for a connection from the pool',
+    ['pool'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+DB_POOL_ACQUIRE_REJECTED = Counter(
+    'db_pool_acquire_rejected_total',
+    'Connection acquisitions that failed fast instead of queueing',
+    ['pool', 'reason'],  # reason is "timeout" or "saturated"
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections',
+    'Connections in the pool by state',
+    ['pool', 'state'],  # state is "in_use" or "idle"
+)
+DB_POOL_MAX_SIZE = Gauge(
+    'db_pool_max_size',
+    'Configured maximum number of pooled connections',
+    ['pool'],
+)
+DB_POOL_WAITERS = Gauge(
+    'db_pool_waiters',
+    'Callers currently waiting for a pooled connection',
+    ['pool'],
+)
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds',
+    'Duration of queries issued through DatabaseConfig',
+    ['pool', 'operation'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+
+class DatabaseUnavailableError(Exception):
+    """Raised when a pooled connection cannot be obtained in time.
+
+    API layers translate this into a 503 so callers back off instead of
+    queueing behind a saturated pool.
+    """
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 class DatabaseConfig:
     """Database configuration and connection management"""
     
-    def __init__(self):
+    def __init__(self, name: str = 'primary', dsn: Optional[str] = None):
+        self.name = name
+        self.dsn = dsn
         self.pool: Optional[Pool] = None
         self._config = self._load_config()
+        self._waiters = 0
     
     def _load_config(self) -> Dict[str, Any]:
         """Load database configuration from environment variables"""
@@ -34,6 +86,13 @@ class DatabaseConfig:
             'ssl_cert': os.getenv('DB_SSL_CERT'),
             'ssl_key': os.getenv('DB_SSL_KEY'),
             'ssl_ca': os.getenv('DB_SSL_CA'),
+            # Seconds to wait for a pooled connection before failing with 503
+            'acquire_timeout': float(os.getenv('DB_ACQUIRE_TIMEOUT', '5')),
+            # Waiting callers allowed before new ones are rejected outright (0 = unbounded)
+            'max_waiters': int(os.getenv('DB_MAX_WAITERS', '0')),
+            # Server-side statement_timeout applied to every pooled connection (0 = disabled)
+            'statement_timeout_ms': int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '15000')),
+            'slow_query_ms': int(os.getenv('DB_SLOW_QUERY_MS', '500')),
         }
     
     async def initialize(self):
@@ -50,57 +109,140 @@ class DatabaseConfig:
                 # Remove None values
                 ssl_config = {k: v for k, v in ssl_config.items() if v is not None}
             
+            server_settings = {}
+            if self._config['statement_timeout_ms'] > 0:
+                server_settings['statement_timeout'] = str(self._config['statement_timeout_ms'])
+            
+            if self.dsn:
+                # Extra nodes (e.g. conversation shards) are addressed by DSN
+                connect_kwargs = {'dsn': self.dsn}
+            else:
+                connect_kwargs = {
+                    'host': self._config['host'],
+                    'port': self._config['port'],
+                    'database': self._config['database'],
+                    'user': self._config['user'],
+                    'password': self._config['password'],
+                }
+            
             self.pool = await asyncpg.create_pool(
-                host=self._config['host'],
-                port=self._config['port'],
-                database=self._config['database'],
-                user=self._config['user'],
-                password=self._config['password'],
+                **connect_kwargs,
                 min_size=self._config['min_size'],
                 max_size=self._config['max_size'],
+                server_settings=server_settings or None,
                 **ssl_config if ssl_config else {}
             )
+            self.refresh_pool_gauges()
             
-            logger.info(f"Database pool initialized with {self._config['min_size']}-{self._config['max_size']} connections")
+            logger.info(f"Database pool '{self.name}' initialized with {self._config['min_size']}-{self._config['max_size']} connections")
             
         except Exception as e:
-            logger.error(f"Failed to initialize database pool: {e}")
+            logger.error(f"Failed to initialize database pool '{self.name}': {e}")
             raise
     
     async def close(self):
         """Close database connection pool"""
         if self.pool:
             await self.pool.close()
-            logger.info("Database pool closed")
+            logger.info(f"Database pool '{self.name}' closed")
+    
+    def refresh_pool_gauges(self):
+        """Publish current in-use/idle connection counts"""
+        if not self.pool:
+            return
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        DB_POOL_CONNECTIONS.labels(pool=self.name, state='in_use').set(size - idle)
+        DB_POOL_CONNECTIONS.labels(pool=self.name, state='idle').set(idle)
+        DB_POOL_MAX_SIZE.labels(pool=self.name).set(self.pool.get_max_size())
+        DB_POOL_WAITERS.labels(pool=self.name).set(self._waiters)
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Snapshot of pool utilisation for health checks and logs"""
+        if not self.pool:
+            return {'initialized': False}
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        return {
+            'initialized': True,
+            'size': size,
+            'idle': idle,
+            'in_use': size - idle,
+            'waiters': self._waiters,
+            'min_size': self.pool.get_min_size(),
+            'max_size': self.pool.get_max_size(),
+        }
     
     @asynccontextmanager
-    async def get_connection(self):
-        """Get a database connection from the pool"""
+    async def get_connection(self, timeout: Optional[float] = None, statement_timeout_ms: Optional[int] = None):
+        """Get a database connection from the pool
+        
+        Fails fast with DatabaseUnavailableError when the pool is saturated
+        (too many waiters) or no connection frees up within ``timeout``
+        seconds (defaults to DB_ACQUIRE_TIMEOUT). ``statement_timeout_ms``
+        overrides the server-side statement timeout for this checkout only;
+        the pool resets it when the connection is released.
+        """
         if not self.pool:
             raise RuntimeError("Database pool not initialized. Call initialize() first.")
         
-        async with self.pool.acquire() as connection:
+        max_waiters = self._config['max_waiters']
+        if max_waiters and self._waiters >= max_waiters and self.pool.get_idle_size() == 0:
+            DB_POOL_ACQUIRE_REJECTED.labels(pool=self.name, reason='saturated').inc()
+            logger.warning(f"Database pool '{self.name}' saturated ({self._waiters} waiters); rejecting request")
+            raise DatabaseUnavailableError("Database is busy, please retry shortly")
+        
+        acquire_timeout = timeout if timeout is not None else self._config['acquire_timeout']
+        self._waiters += 1
+        DB_POOL_WAITERS.labels(pool=self.name).set(self._waiters)
+        started = time.perf_counter()
+        try:
+            connection = await self.pool.acquire(timeout=acquire_timeout or None)
+        except asyncio.TimeoutError:
+            DB_POOL_ACQUIRE_REJECTED.labels(pool=self.name, reason='timeout').inc()
+            logger.warning(f"Timed out after {acquire_timeout}s waiting for a database connection ({self.pool_stats()})")
+            raise DatabaseUnavailableError("Database is busy, please retry shortly")
+        finally:
+            self._waiters -= 1
+            DB_POOL_ACQUIRE_WAIT.labels(pool=self.name).observe(time.perf_counter() - started)
+            self.refresh_pool_gauges()
+        
+        try:
+            if statement_timeout_ms is not None:
+                await connection.execute(f"SET statement_timeout = {int(statement_timeout_ms)}")
             yield connection
+        finally:
+            await self.pool.release(connection)
+            self.refresh_pool_gauges()
+    
+    async def _run(self, operation: str, query: str, *args, **kwargs):
+        """Run a query on a pooled connection and record its duration"""
+        statement_timeout_ms = kwargs.pop('statement_timeout_ms', None)
+        async with self.get_connection(statement_timeout_ms=statement_timeout_ms) as conn:
+            started = time.perf_counter()
+            try:
+                return await getattr(conn, operation)(query, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                DB_QUERY_DURATION.labels(pool=self.name, operation=operation).observe(elapsed)
+                if elapsed * 1000 >= self._config['slow_query_ms']:
+                    logger.warning(f"Slow query ({elapsed * 1000:.0f} ms): {' '.join(query.split())[:200]}")
     
     async def execute(self, query: str, *args, **kwargs):
         """Execute a query without returning results"""
-        async with self.get_connection() as conn:
-            return await conn.execute(query, *args, **kwargs)
+        return await self._run('execute', query, *args, **kwargs)
     
     async def fetch(self, query: str, *args, **kwargs):
         """Fetch all rows from a query"""
-        async with self.get_connection() as conn:
-            return await conn.fetch(query, *args, **kwargs)
+        return await self._run('fetch', query, *args, **kwargs)
     
     async def fetchrow(self, query: str, *args, **kwargs):
         """Fetch a single row from a query"""
-        async with self.get_connection() as conn:
-            return await conn.fetchrow(query, *args, **kwargs)
+        return await self._run('fetchrow', query, *args, **kwargs)
     
     async def fetchval(self, query: str, *args, **kwargs):
         """Fetch a single value from a query"""
-        async with self.get_connection() as conn:
-            return await conn.fetchval(query, *args, **kwargs)
+        return await self._run('fetchval', query, *args, **kwargs)
 
 # Global database instance
 db = DatabaseConfig()
@@ -168,4 +310,8 @@ SUPABASE_SERVICE_ROLE_KEY=your_service_role_key_here
 DB_MIN_SIZE=5
 DB_MAX_SIZE=20
 DB_SSL=false
+DB_ACQUIRE_TIMEOUT=5
+DB_MAX_WAITERS=0
+DB_STATEMENT_TIMEOUT_MS=15000
+DB_SLOW_QUERY_MS=500
 """ 
\ No newline at end of file
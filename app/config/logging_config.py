@@ -0,0 +1,137 @@
+"""
+Logging configuration for NeuraFormAI
+Non-blocking, level-gated, optionally JSON logging with sampling and content redaction
+"""
+
+import os
+import sys
+import json
+import queue
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from prometheus_client import Counter
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Per-logger levels, e.g. "app.api.chat=WARNING,app.services.chat_engine=DEBUG"
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+# Fraction of below-WARNING records kept per logger, e.g. "app.api.chat=0.1"
+LOG_SAMPLE = os.getenv('LOG_SAMPLE', '')
+# text or json
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# Log user messages, replies and TTS text verbatim (off by default)
+LOG_MESSAGE_CONTENT = os.getenv('LOG_MESSAGE_CONTENT', 'false').lower() == 'true'
+
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total',
+    'Log records discarded because the log queue was full',
+)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+# === Redaction ===
+def redact(text: Optional[str], preview: int = 60) -> str:
+    """Stand-in for user/model text in log lines.
+
+    Only the length is logged unless LOG_MESSAGE_CONTENT is enabled, in
+    which case a short preview is shown.
+    """
+    if text is None:
+        return '<none>'
+    if LOG_MESSAGE_CONTENT:
+        return repr(text[:preview] + ('...' if len(text) > preview else ''))
+    return f'<{len(text)} chars>'
+
+
+# === Handlers, filters and formatters ===
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of a logger's records below WARNING; warnings and errors always pass"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields become top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def _parse_pairs(raw: str) -> Dict[str, str]:
+    pairs = {}
+    for item in raw.split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+# === Setup ===
+def setup_logging():
+    """Route all logging through a background thread; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+
+    for name, level in _parse_pairs(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+    for name, rate in _parse_pairs(LOG_SAMPLE).items():
+        logging.getLogger(name).addFilter(SamplingFilter(float(rate)))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
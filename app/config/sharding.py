@@ -0,0 +1,190 @@
+"""
+Conversation sharding for NeuraFormAI
+Routes each user's conversations and messages to one of several Postgres nodes
+"""
+
+import os
+import time
+import bisect
+import hashlib
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from app.config.database import db, DatabaseConfig
+from app.services.message_archive import ARCHIVE_DIR, MessageArchive
+from app.services.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_SHARD = 'primary'
+VIRTUAL_NODES = int(os.getenv('DB_SHARD_VIRTUAL_NODES', '128'))
+# Seconds a user->shard lookup is trusted before re-reading user_shards
+SHARD_MAP_TTL = float(os.getenv('DB_SHARD_MAP_TTL', '60'))
+SHARD_MAP_CACHE_SIZE = 100_000
+
+
+def _parse_shard_dsns(raw: str) -> Dict[str, str]:
+    """Parse DB_SHARDS, e.g. "shard1=postgresql://...,shard2=postgresql://..." """
+    shards = {}
+    for entry in filter(None, (part.strip() for part in raw.split(','))):
+        name, sep, dsn = entry.partition('=')
+        if not sep or not name.strip() or not dsn.strip():
+            raise ValueError(f"Invalid DB_SHARDS entry {entry!r}; expected name=dsn")
+        if name.strip() == PRIMARY_SHARD:
+            raise ValueError(f"'{PRIMARY_SHARD}' is reserved for the main database")
+        shards[name.strip()] = dsn.strip()
+    return shards
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class ShardRouter:
+    """Maps users to conversation shards.
+
+    Placement comes from a consistent-hash ring over the configured
+    shards, overridden by pins in the ``user_shards`` table on the primary
+    database. Users are pinned when their first conversation is created,
+    so adding a shard only affects new users until the rebalancer moves
+    existing ones. With no DB_SHARDS configured every lookup resolves to
+    the primary database without touching the shard map.
+    """
+
+    def __init__(self):
+        self.shards: Dict[str, DatabaseConfig] = {PRIMARY_SHARD: db}
+        for name, dsn in _parse_shard_dsns(os.getenv('DB_SHARDS', '')).items():
+            self.shards[name] = DatabaseConfig(name=name, dsn=dsn)
+
+        self.archives: Dict[str, MessageArchive] = {
+            name: MessageArchive(
+                database, ARCHIVE_DIR if name == PRIMARY_SHARD else ARCHIVE_DIR / name
+            )
+            for name, database in self.shards.items()
+        }
+
+        ring = sorted(
+            (_hash(f"{name}#{i}"), name) for name in self.shards for i in range(VIRTUAL_NODES)
+        )
+        self._ring_keys = [point for point, _ in ring]
+        self._ring_names = [name for _, name in ring]
+
+        self._user_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._conversation_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    @property
+    def is_sharded(self) -> bool:
+        return len(self.shards) > 1
+
+    async def initialize(self):
+        """Open pools for the extra shards (the primary is opened by init_database)"""
+        for name, database in self.shards.items():
+            if name != PRIMARY_SHARD:
+                await database.initialize()
+
+    async def close(self):
+        for name, database in self.shards.items():
+            if name != PRIMARY_SHARD:
+                await database.close()
+
+    # === Placement ===
+    def ring_shard(self, user_id: str) -> str:
+        """Shard chosen by the hash ring, ignoring any pin"""
+        index = bisect.bisect(self._ring_keys, _hash(str(user_id))) % len(self._ring_keys)
+        return self._ring_names[index]
+
+    @staticmethod
+    def _cache_put(cache: OrderedDict, key: str, shard: str):
+        cache[key] = (shard, time.monotonic() + SHARD_MAP_TTL)
+        cache.move_to_end(key)
+        if len(cache) > SHARD_MAP_CACHE_SIZE:
+            cache.popitem(last=False)
+
+    @staticmethod
+    def _cache_get(cache: OrderedDict, key: str) -> Optional[str]:
+        cached = cache.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        return None
+
+    async def shard_for_user(self, user_id: str) -> str:
+        """Current shard of a user: cached pin, user_shards row, else the ring"""
+        if not self.is_sharded:
+            return PRIMARY_SHARD
+
+        cached = self._cache_get(self._user_cache, user_id)
+        record_cache('shard_map_user', hit=cached is not None)
+        if cached:
+            return cached
+
+        shard = await db.fetchval("SELECT shard_id FROM public.user_shards WHERE user_id = $1", UUID(user_id))
+        if shard not in self.shards:
+            if shard:
+                logger.error(f"User {user_id} is pinned to unknown shard '{shard}'; using hash ring")
+            shard = self.ring_shard(user_id)
+        self._cache_put(self._user_cache, user_id, shard)
+        return shard
+
+    async def pin_user(self, user_id: str, shard: str, replace: bool = False):
+        """Record a user's shard so later ring changes don't move them implicitly"""
+        if not self.is_sharded:
+            return
+        if replace:
+            await db.execute("""
+                INSERT INTO public.user_shards (user_id, shard_id) VALUES ($1, $2)
+                ON CONFLICT (user_id) DO UPDATE SET shard_id = EXCLUDED.shard_id, updated_at = NOW()
+            """, UUID(user_id), shard)
+        else:
+            await db.execute("""
+                INSERT INTO public.user_shards (user_id, shard_id) VALUES ($1, $2)
+                ON CONFLICT (user_id) DO NOTHING
+            """, UUID(user_id), shard)
+        self._cache_put(self._user_cache, user_id, shard)
+
+    def remember_conversation(self, conversation_id: str, shard: str):
+        """Cache where a conversation lives so id-only calls skip the fan-out"""
+        if not self.is_sharded:
+            return
+        self._cache_put(self._conversation_cache, conversation_id, shard)
+
+    async def shard_for_conversation(self, conversation_id: str, user_id: Optional[str] = None) -> Optional[str]:
+        """Shard holding a conversation; asks every shard if the owner is unknown"""
+        if not self.is_sharded:
+            return PRIMARY_SHARD
+        if user_id:
+            return await self.shard_for_user(user_id)
+
+        cached = self._cache_get(self._conversation_cache, conversation_id)
+        record_cache('shard_map_conversation', hit=cached is not None)
+        if cached:
+            return cached
+
+        for name, database in self.shards.items():
+            owner = await database.fetchval("SELECT user_id FROM conversations WHERE id = $1", UUID(conversation_id))
+            if owner:
+                self.remember_conversation(conversation_id, name)
+                return name
+        return None
+
+    # === Connections ===
+    def database(self, shard: str) -> DatabaseConfig:
+        return self.shards[shard]
+
+    def archive(self, shard: str) -> MessageArchive:
+        return self.archives[shard]
+
+    @asynccontextmanager
+    async def connection_for_user(self, user_id: str, **kwargs):
+        shard = await self.shard_for_user(user_id)
+        async with self.shards[shard].get_connection(**kwargs) as conn:
+            yield conn
+
+    def shard_names(self) -> List[str]:
+        return list(self.shards)
+
+
+# Global shard router
+shard_router = ShardRouter()
@@ -45,7 +45,13 @@ def load_persona(file_path: str) -> dict:
 
     return {
         "messages": messages,
-        "voice_id": voice_id
+        "voice_id": voice_id,
+        # Optional LLM routing preferences (see app/services/model_router.py)
+        "model": data.get("model"),
+        "model_policy": data.get("model_policy"),
+        # Optional TTS preferences (see app/services/tts_backend.py)
+        "tts_backend": data.get("tts_backend"),
+        "tts_model": data.get("tts_model"),
     }
 
 # === Load only persona metadata (name, voice_id, vrm_model) ===
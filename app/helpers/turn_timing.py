@@ -0,0 +1,68 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# === Per-turn latency breakdown ===
+# Stages used by the chat path, in the order they happen
+STAGES = (
+    "admission_wait",
+    "persona_load",
+    "conversation_resolve",
+    "history_fetch",
+    "context_build",
+    "llm_ttfb",
+    "llm_total",
+    "db_write",
+    "tts_ttfb",
+)
+
+
+class TurnTimings:
+    """Milliseconds spent in each stage of one chat turn.
+
+    Timing a stage more than once adds up (the user and reply writes
+    both count towards ``db_write``).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(ms, 1) for name, ms in self.stages.items()}
+
+    def server_timing(self) -> str:
+        """Value for the Server-Timing response header"""
+        entries = [f"{name};dur={ms:.1f}" for name, ms in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_turn: ContextVar[Optional[TurnTimings]] = ContextVar("turn_timings", default=None)
+
+
+# === Start timing a turn (called by the endpoint) ===
+def start_turn() -> TurnTimings:
+    timings = TurnTimings()
+    _current_turn.set(timings)
+    return timings
+
+
+# === Timings of the turn being handled; a throwaway one outside a request ===
+def current_turn() -> TurnTimings:
+    timings = _current_turn.get()
+    if timings is None:
+        timings = start_turn()
+    return timings
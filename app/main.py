@@ -1,9 +1,30 @@
-from fastapi import FastAPI
+import logging
+from app.config.logging_config import setup_logging, shutdown_logging
+
+# === Logging goes through a background writer; set up before anything logs ===
+setup_logging()
+logger = logging.getLogger(__name__)
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.api import chat, personas
 from app.api.auth import router as auth_router
-import asyncio
+from app.api.admin import router as admin_router
+import os
 from app.services.openrouter_credits import get_openrouter_credits
-from app.config.database import init_database, cleanup_database
+from app.config.database import db, init_database, cleanup_database, DatabaseUnavailableError
+from app.services.conversation_store import get_conversation_store
+from app.services.analytics_buffer import analytics_buffer
+from app.services.analytics_rollup import analytics_rollup
+from app.services.metrics import MetricsMiddleware
+from app.services.loop_watchdog import loop_watchdog
+from app.services.openrouter_client import LLMUnavailableError, openrouter_client
+from app.services.model_router import model_router
+from app.services.admission import AdmissionRejectedError
+from app.services.audio_prefetch import audio_prefetcher
+from app.services.tts_backend import close_tts_backends
+from app.config.sharding import shard_router
 
 app = FastAPI(
     title="NeuraPalAI",
@@ -23,27 +44,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# === Request latency metrics (outermost, so CORS handling is timed too) ===
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(chat.router, prefix="/chat", tags=["Chat"])
 
 # === Include routers for chat and personas ===
 app.include_router(personas.router, prefix="/api")
 app.include_router(auth_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
+
+# === Shed load when the database pool is saturated ===
+@app.exception_handler(DatabaseUnavailableError)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailableError):
+    return JSONResponse(
+        content={"success": False, "error": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# === Every model failed or is circuit-broken ===
+@app.exception_handler(LLMUnavailableError)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailableError):
+    return JSONResponse(
+        content={"success": False, "error": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# === Too many turns in flight, or this user is over their rate ===
+@app.exception_handler(AdmissionRejectedError)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejectedError):
+    return JSONResponse(
+        content={"success": False, "error": str(exc), "reason": exc.reason},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# === Prometheus scrape endpoint ===
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    for database in {db.name: db, **shard_router.shards}.values():
+        database.refresh_pool_gauges()
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.on_event("startup")
 async def log_openrouter_credits():
     try:
         credits = await get_openrouter_credits()
-        print("✅ OpenRouter Credits:")
-        print(credits)
+        logger.info("✅ OpenRouter Credits: %s", credits)
     except Exception as e:
-        print("❌ Failed to fetch OpenRouter credits:", str(e))
+        logger.error("❌ Failed to fetch OpenRouter credits: %s", e)
 
 
 @app.on_event("startup")
 async def startup_database():
-    await init_database()
+    await loop_watchdog.start()
+    await model_router.start()
+    store = get_conversation_store()
+    # Auth still needs Postgres; a SQLite-only node can run without it
+    if store.uses_postgres or os.getenv("DB_HOST"):
+        await init_database()
+        await analytics_buffer.start()
+        await analytics_rollup.start()
+    await store.initialize()
 
 
 @app.on_event("shutdown")
 async def shutdown_database():
+    await get_conversation_store().close()
+    if db.pool:
+        await analytics_rollup.stop()
+        await analytics_buffer.stop()
     await cleanup_database()
+    await openrouter_client.close()
+    await audio_prefetcher.close()
+    await close_tts_backends()
+    await model_router.stop()
+    await loop_watchdog.stop()
+    shutdown_logging()
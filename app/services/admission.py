@@ -0,0 +1,197 @@
+"""
+Admission control for NeuraFormAI
+Caps concurrent LLM turns globally and rate-limits each user before work starts
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.helpers.turn_timing import current_turn
+
+logger = logging.getLogger(__name__)
+
+# Turns allowed to talk to the LLM at once, across all users
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+# Turns allowed to wait for a slot; beyond this they are rejected outright
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "64"))
+# Longest a turn may wait for a slot; turns expected to wait longer are rejected up front
+LLM_QUEUE_TIMEOUT_S = float(os.getenv("LLM_QUEUE_TIMEOUT_S", "10"))
+# Per-user token bucket: sustained turns per minute and burst size (0 disables)
+USER_TURNS_PER_MIN = float(os.getenv("USER_TURNS_PER_MIN", "20"))
+USER_TURN_BURST = int(os.getenv("USER_TURN_BURST", "5"))
+
+# Buckets kept before idle (full) ones are dropped
+_MAX_BUCKETS = 10000
+# Starting guess for how long a turn holds its slot, until real ones are measured
+_INITIAL_HOLD_S = 3.0
+
+ADMISSION_ACTIVE = Gauge('admission_active', 'LLM turns currently holding a slot')
+ADMISSION_QUEUED = Gauge('admission_queued', 'LLM turns waiting for a slot')
+ADMISSION_REJECTED = Counter(
+    'admission_rejected_total',
+    'Turns refused with 429',
+    ['reason'],  # user_rate, queue_full, overloaded or queue_timeout
+)
+ADMISSION_WAIT = Histogram(
+    'admission_wait_seconds',
+    'Time admitted turns spent waiting for a slot',
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a turn is refused before any upstream work starts.
+
+    API layers translate this into a 429 with Retry-After.
+    """
+
+    def __init__(self, message: str, reason: str, retry_after: int = 1):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Global concurrency cap with a bounded FIFO queue, plus per-user token buckets.
+
+    A turn first takes a token from its user's bucket (refilled at
+    ``user_rate_per_min``, holding at most ``user_burst``), then a slot.
+    When no slot is free it queues, unless the queue is full or the
+    expected wait (queue position times the average slot hold time over
+    the slot count) already exceeds ``queue_timeout_s``; such turns are
+    rejected immediately rather than after timing out. Rejections carry
+    a Retry-After estimate.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, queue_size: int = LLM_QUEUE_SIZE,
+                 queue_timeout_s: float = LLM_QUEUE_TIMEOUT_S, user_rate_per_min: float = USER_TURNS_PER_MIN,
+                 user_burst: int = USER_TURN_BURST):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_size = queue_size
+        self.queue_timeout_s = queue_timeout_s
+        self.user_rate_s = user_rate_per_min / 60
+        self.user_burst = user_burst
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # user_id -> (tokens, time.monotonic() of last refill)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        # Exponentially weighted average of how long a turn holds its slot
+        self._avg_hold_s = _INITIAL_HOLD_S
+
+    # === Per-user rate ===
+    def _take_token(self, user_id: str):
+        if self.user_rate_s <= 0:
+            return
+        now = time.monotonic()
+        tokens, last = self._buckets.get(user_id, (self.user_burst, now))
+        tokens = min(self.user_burst, tokens + (now - last) * self.user_rate_s)
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            retry_after = (1 - tokens) / self.user_rate_s
+            self._reject("user_rate", f"Too many messages from user {user_id}", retry_after)
+        self._buckets[user_id] = (tokens - 1, now)
+        if len(self._buckets) > _MAX_BUCKETS:
+            self._prune_buckets(now)
+
+    def _refund_token(self, user_id: str):
+        if self.user_rate_s > 0 and user_id in self._buckets:
+            tokens, last = self._buckets[user_id]
+            self._buckets[user_id] = (min(self.user_burst, tokens + 1), last)
+
+    def _prune_buckets(self, now: float):
+        # A bucket that would have refilled completely is the same as no bucket
+        full_after = self.user_burst / self.user_rate_s
+        self._buckets = {
+            user_id: (tokens, last) for user_id, (tokens, last) in self._buckets.items()
+            if now - last < full_after
+        }
+
+    # === Global slots ===
+    def _expected_wait(self, position: int) -> float:
+        return (position + 1) * self._avg_hold_s / self.max_concurrency
+
+    def _reject(self, reason: str, message: str, retry_after: float):
+        ADMISSION_REJECTED.labels(reason=reason).inc()
+        logger.warning("⚠️ Admission rejected (%s): %s", reason, message)
+        raise AdmissionRejectedError(message, reason, retry_after=max(1, int(retry_after + 0.999)))
+
+    async def _acquire_slot(self):
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return
+        position = len(self._waiters)
+        if position >= self.queue_size:
+            self._reject("queue_full", "Chat is at capacity", self._expected_wait(position))
+        if self._expected_wait(position) > self.queue_timeout_s:
+            self._reject("overloaded", "Chat is overloaded", self._expected_wait(position))
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUED.set(len(self._waiters))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release_slot()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            ADMISSION_QUEUED.set(len(self._waiters))
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject("queue_timeout", "Timed out waiting for a chat slot", self._expected_wait(len(self._waiters)))
+        ADMISSION_QUEUED.set(len(self._waiters))
+
+    def _release_slot(self):
+        # Hand the slot straight to the oldest waiter, so it cannot be overtaken
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                ADMISSION_QUEUED.set(len(self._waiters))
+                return
+        self.active -= 1
+        ADMISSION_ACTIVE.set(self.active)
+
+    # === Public API ===
+    @asynccontextmanager
+    async def admit(self, user_id: str) -> AsyncIterator[None]:
+        """Hold a slot for one turn of ``user_id``; raises AdmissionRejectedError when refused"""
+        self._take_token(user_id)
+        waited = time.perf_counter()
+        try:
+            await self._acquire_slot()
+        except AdmissionRejectedError:
+            self._refund_token(user_id)
+            raise
+        wait_s = time.perf_counter() - waited
+        ADMISSION_WAIT.observe(wait_s)
+        ADMISSION_ACTIVE.set(self.active)
+        current_turn().add("admission_wait", wait_s * 1000)
+
+        held = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._avg_hold_s = 0.9 * self._avg_hold_s + 0.1 * (time.perf_counter() - held)
+            self._release_slot()
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "avg_hold_s": round(self._avg_hold_s, 3),
+        }
+
+
+# Global admission controller
+admission_controller = AdmissionController()
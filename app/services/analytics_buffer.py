@@ -0,0 +1,243 @@
+"""
+Buffered analytics ingestion for NeuraFormAI
+Events are queued in memory and written to user_analytics in COPY batches
+"""
+
+import os
+import json
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from prometheus_client import Counter, Gauge
+
+from app.config.database import db
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_BATCH_SIZE = int(os.getenv('ANALYTICS_BATCH_SIZE', '500'))
+ANALYTICS_FLUSH_INTERVAL_S = float(os.getenv('ANALYTICS_FLUSH_INTERVAL_S', '2'))
+# Events held in memory before new ones go to the spill file (up to as many again
+# wait in memory for the background task to spill them; past that they are dropped)
+ANALYTICS_MAX_BUFFER = int(os.getenv('ANALYTICS_MAX_BUFFER', '10000'))
+ANALYTICS_SPILL_PATH = Path(os.getenv('ANALYTICS_SPILL_PATH', 'data/analytics_spill.jsonl'))
+# Events are dropped once the spill file reaches this size
+ANALYTICS_SPILL_MAX_BYTES = int(os.getenv('ANALYTICS_SPILL_MAX_BYTES', str(50 * 1024 * 1024)))
+
+COLUMNS = ('id', 'user_id', 'event_type', 'event_data', 'session_id', 'created_at')
+
+ANALYTICS_EVENTS = Counter(
+    'analytics_events_total',
+    'Analytics events by outcome',
+    ['outcome'],  # buffered, written, spilled, dropped
+)
+ANALYTICS_BUFFERED = Gauge('analytics_buffer_events', 'Analytics events waiting in memory')
+
+Event = Tuple[UUID, UUID, str, str, Optional[str], datetime]
+
+
+def _event_to_json(event: Event) -> str:
+    event_id, user_id, event_type, event_data, session_id, created_at = event
+    return json.dumps({
+        'id': str(event_id),
+        'user_id': str(user_id),
+        'event_type': event_type,
+        'event_data': event_data,
+        'session_id': session_id,
+        'created_at': created_at.isoformat(),
+    })
+
+
+def _event_from_json(line: str) -> Event:
+    data = json.loads(line)
+    return (
+        UUID(data['id']),
+        UUID(data['user_id']),
+        data['event_type'],
+        data['event_data'],
+        data['session_id'],
+        datetime.fromisoformat(data['created_at']),
+    )
+
+
+class AnalyticsBuffer:
+    """Accepts analytics events without touching the database.
+
+    ``track`` only appends to an in-memory queue. A background task
+    writes the queue with COPY every ``flush_interval_s`` seconds, or as
+    soon as ``batch_size`` events are waiting. When the queue is full,
+    events go to a bounded overflow queue, and the background task
+    appends them (and batches whose write failed) to a local JSONL spill
+    file from a worker thread. The file is replayed once writes succeed
+    again. Events past a full overflow queue or ``spill_max_bytes`` are
+    dropped and counted. ``stop`` flushes whatever is left.
+    """
+
+    def __init__(self, database=db, batch_size: int = ANALYTICS_BATCH_SIZE,
+                 flush_interval_s: float = ANALYTICS_FLUSH_INTERVAL_S,
+                 max_buffer: int = ANALYTICS_MAX_BUFFER, spill_path: Path = ANALYTICS_SPILL_PATH,
+                 spill_max_bytes: int = ANALYTICS_SPILL_MAX_BYTES):
+        self.db = database
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_buffer = max_buffer
+        self.spill_path = Path(spill_path)
+        self.spill_max_bytes = spill_max_bytes
+        self._events: Deque[Event] = deque()
+        # Events that arrived while the queue was full, waiting to be spilled
+        self._overflow: Deque[Event] = deque()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # === Producer side (request path) ===
+    def track(self, user_id: str, event_type: str, event_data: Optional[Dict[str, Any]] = None,
+              session_id: Optional[str] = None) -> None:
+        """Queue an event; never blocks on the database"""
+        try:
+            event = (
+                uuid4(),
+                UUID(str(user_id)),
+                event_type,
+                json.dumps(event_data or {}, default=str),
+                session_id,
+                datetime.now(timezone.utc),
+            )
+        except (ValueError, TypeError) as e:
+            logger.error(f"Discarding analytics event {event_type} for user {user_id}: {e}")
+            ANALYTICS_EVENTS.labels(outcome='dropped').inc()
+            return
+
+        if len(self._events) >= self.max_buffer:
+            if len(self._overflow) >= self.max_buffer:
+                ANALYTICS_EVENTS.labels(outcome='dropped').inc()
+            else:
+                self._overflow.append(event)
+            self._wakeup.set()
+            return
+
+        self._events.append(event)
+        ANALYTICS_EVENTS.labels(outcome='buffered').inc()
+        ANALYTICS_BUFFERED.set(len(self._events))
+        if len(self._events) >= self.batch_size:
+            self._wakeup.set()
+
+    def _spill(self, events: List[Event]) -> None:
+        """Append events to the spill file, dropping them if it is full (blocking; run in a thread)"""
+        try:
+            size = self.spill_path.stat().st_size if self.spill_path.exists() else 0
+            if size >= self.spill_max_bytes:
+                ANALYTICS_EVENTS.labels(outcome='dropped').inc(len(events))
+                logger.warning(f"Analytics spill file full; dropped {len(events)} events")
+                return
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(_event_to_json(event) + '\n' for event in events))
+            ANALYTICS_EVENTS.labels(outcome='spilled').inc(len(events))
+        except OSError as e:
+            ANALYTICS_EVENTS.labels(outcome='dropped').inc(len(events))
+            logger.error(f"Could not spill {len(events)} analytics events: {e}")
+
+    # === Consumer side (background task) ===
+    async def _write(self, events: List[Event]) -> None:
+        """COPY a batch in; events of users that no longer exist are skipped"""
+        columns = ', '.join(COLUMNS)
+        async with self.db.get_connection() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS analytics_staging
+                        (LIKE public.user_analytics INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+                """)
+                await conn.copy_records_to_table('analytics_staging', records=events, columns=COLUMNS)
+                await conn.execute(f"""
+                    INSERT INTO public.user_analytics ({columns})
+                    SELECT {columns} FROM analytics_staging s
+                    WHERE EXISTS (SELECT 1 FROM public.users u WHERE u.id = s.user_id)
+                    ON CONFLICT (id) DO NOTHING
+                """)
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of events written"""
+        written = 0
+        async with self._flush_lock:
+            if self._overflow:
+                overflow = list(self._overflow)
+                self._overflow.clear()
+                await asyncio.to_thread(self._spill, overflow)
+
+            while self._events:
+                batch = [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+                ANALYTICS_BUFFERED.set(len(self._events))
+                try:
+                    await self._write(batch)
+                except Exception as e:
+                    logger.error(f"Analytics flush of {len(batch)} events failed, spilling to disk: {e}")
+                    await asyncio.to_thread(self._spill, batch)
+                    break
+                written += len(batch)
+                ANALYTICS_EVENTS.labels(outcome='written').inc(len(batch))
+            else:
+                # Queue drained without errors: the database is healthy again
+                written += await self._replay_spill()
+        return written
+
+    async def _replay_spill(self) -> int:
+        """Load spilled events back once writes are succeeding"""
+        replaying = self.spill_path.with_suffix('.replay')
+        if not replaying.exists():
+            if not self.spill_path.exists():
+                return 0
+            self.spill_path.rename(replaying)
+
+        text = await asyncio.to_thread(replaying.read_text, encoding='utf-8')
+        events = [_event_from_json(line) for line in text.splitlines() if line]
+        for start in range(0, len(events), self.batch_size):
+            try:
+                await self._write(events[start:start + self.batch_size])
+            except Exception as e:
+                logger.error(f"Replaying spilled analytics failed, will retry: {e}")
+                # Keep what's left for the next attempt
+                remaining = ''.join(_event_to_json(event) + '\n' for event in events[start:])
+                await asyncio.to_thread(replaying.write_text, remaining, encoding='utf-8')
+                return start
+        replaying.unlink()
+        ANALYTICS_EVENTS.labels(outcome='written').inc(len(events))
+        logger.info(f"Replayed {len(events)} spilled analytics events")
+        return len(events)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analytics flush loop error: {e}")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write out anything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Global analytics buffer
+analytics_buffer = AnalyticsBuffer()
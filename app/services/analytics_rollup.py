@@ -0,0 +1,160 @@
+"""
+Daily analytics rollups for NeuraFormAI
+Folds raw user_analytics events into per-user, per-type, per-day counts
+"""
+
+import os
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Optional
+
+from app.config.database import db
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_INTERVAL_S = int(os.getenv('ANALYTICS_ROLLUP_INTERVAL_S', '900'))
+# Already rolled-up days recounted on every run, for events that arrive late
+ROLLUP_LOOKBACK_DAYS = int(os.getenv('ANALYTICS_ROLLUP_LOOKBACK_DAYS', '2'))
+# Days aggregated per transaction while catching up
+ROLLUP_CHUNK_DAYS = int(os.getenv('ANALYTICS_ROLLUP_CHUNK_DAYS', '7'))
+# Raw events older than this are deleted once rolled up (0 = keep forever)
+RAW_RETENTION_DAYS = int(os.getenv('ANALYTICS_RAW_RETENTION_DAYS', '90'))
+PRUNE_CHUNK_SIZE = int(os.getenv('ANALYTICS_PRUNE_CHUNK_SIZE', '5000'))
+PRUNE_CHUNK_PAUSE_MS = int(os.getenv('ANALYTICS_PRUNE_CHUNK_PAUSE_MS', '100'))
+
+# pg advisory lock key, so only one app process rolls up at a time
+_ROLLUP_LOCK_KEY = 0x616E6C79
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time(), tzinfo=timezone.utc)
+
+
+class AnalyticsRollup:
+    """Maintains ``user_analytics_daily`` from the raw event table.
+
+    ``analytics_rollup_state.rolled_up_to`` marks the first day that is
+    not yet rolled up: every earlier day is complete in the rollup
+    table, and readers take the rest from the raw events. Each run
+    recounts whole UTC days from the watermark (minus
+    ``lookback_days``) up to yesterday, replacing the stored counts, so
+    it is safe to rerun. Raw events are only pruned past both the
+    retention horizon and the lookback window, so a recount never sees
+    a partially deleted day.
+    """
+
+    def __init__(self, database=db, interval_s: int = ROLLUP_INTERVAL_S,
+                 lookback_days: int = ROLLUP_LOOKBACK_DAYS, chunk_days: int = ROLLUP_CHUNK_DAYS,
+                 retention_days: int = RAW_RETENTION_DAYS):
+        self.db = database
+        self.interval_s = interval_s
+        self.lookback_days = lookback_days
+        self.chunk_days = max(1, chunk_days)
+        self.retention_days = retention_days
+        self._task: Optional[asyncio.Task] = None
+
+    # === Aggregation ===
+    async def roll_up(self) -> int:
+        """Aggregate every complete day not yet rolled up; returns rollup rows written"""
+        written = 0
+        async with self.db.get_connection(statement_timeout_ms=0) as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", _ROLLUP_LOCK_KEY):
+                return 0
+            try:
+                today = datetime.now(timezone.utc).date()
+                done = await conn.fetchval("SELECT rolled_up_to FROM public.analytics_rollup_state WHERE id = 1")
+                if done is None:
+                    # First run: backfill from the oldest raw event
+                    first = await conn.fetchval("SELECT MIN(created_at) FROM public.user_analytics")
+                    start = first.astimezone(timezone.utc).date() if first else today
+                else:
+                    start = min(done, today) - timedelta(days=self.lookback_days)
+
+                while start < today:
+                    end = min(start + timedelta(days=self.chunk_days), today)
+                    async with conn.transaction():
+                        result = await conn.execute("""
+                            INSERT INTO public.user_analytics_daily (user_id, event_type, day, event_count)
+                            SELECT user_id, event_type, (created_at AT TIME ZONE 'UTC')::date, COUNT(*)
+                            FROM public.user_analytics
+                            WHERE created_at >= $1 AND created_at < $2
+                            GROUP BY 1, 2, 3
+                            ON CONFLICT (user_id, event_type, day)
+                            DO UPDATE SET event_count = EXCLUDED.event_count
+                        """, _day_start(start), _day_start(end))
+                        await conn.execute("""
+                            INSERT INTO public.analytics_rollup_state (id, rolled_up_to, updated_at)
+                            VALUES (1, $1, NOW())
+                            ON CONFLICT (id) DO UPDATE
+                            SET rolled_up_to = GREATEST(analytics_rollup_state.rolled_up_to, EXCLUDED.rolled_up_to),
+                                updated_at = NOW()
+                        """, end)
+                    written += int(result.split()[-1])
+                    start = end
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", _ROLLUP_LOCK_KEY)
+        return written
+
+    # === Retention ===
+    async def prune_raw(self, chunk_size: int = PRUNE_CHUNK_SIZE,
+                        pause_s: float = PRUNE_CHUNK_PAUSE_MS / 1000) -> int:
+        """Delete raw events that are rolled up and past the retention horizon"""
+        if self.retention_days <= 0:
+            return 0
+        done = await self.db.fetchval("SELECT rolled_up_to FROM public.analytics_rollup_state WHERE id = 1")
+        if done is None:
+            return 0
+        today = datetime.now(timezone.utc).date()
+        cutoff = min(today - timedelta(days=self.retention_days), done - timedelta(days=self.lookback_days))
+
+        deleted = 0
+        while True:
+            result = await self.db.execute("""
+                DELETE FROM public.user_analytics
+                WHERE id IN (
+                    SELECT id FROM public.user_analytics
+                    WHERE created_at < $1
+                    LIMIT $2
+                )
+            """, _day_start(cutoff), chunk_size)
+            count = int(result.split()[-1])
+            deleted += count
+            if count < chunk_size:
+                return deleted
+            await asyncio.sleep(pause_s)
+
+    async def run(self) -> Dict[str, int]:
+        rolled_up = await self.roll_up()
+        pruned = await self.prune_raw()
+        return {'rolled_up': rolled_up, 'pruned': pruned}
+
+    # === Background task ===
+    async def _run(self) -> None:
+        while True:
+            try:
+                result = await self.run()
+                if result['rolled_up'] or result['pruned']:
+                    logger.info(f"Analytics rollup: {result}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analytics rollup failed: {e}")
+            await asyncio.sleep(self.interval_s)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global analytics rollup job
+analytics_rollup = AnalyticsRollup()
@@ -0,0 +1,120 @@
+"""
+Audio output formats for NeuraFormAI
+Picks a TTS format from a request's format parameter or Accept header
+"""
+
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from prometheus_client import Counter
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    """One TTS output format, named the way ElevenLabs names its output_format values"""
+
+    codec: str  # mp3, opus or pcm (signed 16-bit little-endian, mono)
+    sample_rate: int
+    bitrate: Optional[int] = None  # kbps; None for pcm
+
+    @property
+    def name(self) -> str:
+        if self.bitrate is None:
+            return f"{self.codec}_{self.sample_rate}"
+        return f"{self.codec}_{self.sample_rate}_{self.bitrate}"
+
+    @property
+    def media_type(self) -> str:
+        if self.codec == "mp3":
+            return "audio/mpeg"
+        if self.codec == "opus":
+            return "audio/ogg; codecs=opus"
+        return f"audio/pcm;rate={self.sample_rate};channels=1"
+
+
+FORMATS = {
+    fmt.name: fmt for fmt in (
+        [AudioFormat("mp3", 22050, 32)]
+        + [AudioFormat("mp3", 44100, bitrate) for bitrate in (32, 64, 96, 128, 192)]
+        + [AudioFormat("opus", 48000, bitrate) for bitrate in (32, 64, 96, 128, 192)]
+        + [AudioFormat("pcm", rate) for rate in (16000, 22050, 24000, 44100)]
+    )
+}
+
+# Format used when the client does not ask for one; MP3 is what every client can play
+TTS_DEFAULT_FORMAT = os.getenv("TTS_DEFAULT_FORMAT", "mp3_44100_128")
+if TTS_DEFAULT_FORMAT not in FORMATS:
+    raise ValueError(f"Unknown TTS_DEFAULT_FORMAT '{TTS_DEFAULT_FORMAT}'; use one of {', '.join(FORMATS)}")
+# What a bare codec ("opus", audio/ogg, ...) means
+_CODEC_DEFAULTS = {
+    "mp3": TTS_DEFAULT_FORMAT if TTS_DEFAULT_FORMAT.startswith("mp3_") else "mp3_44100_128",
+    "opus": "opus_48000_64",
+    "pcm": "pcm_24000",
+}
+_MEDIA_TYPE_CODECS = {
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+    "audio/pcm": "pcm",
+    "audio/l16": "pcm",
+}
+
+TTS_FORMAT_REQUESTS = Counter('tts_format_requests_total', 'Audio requests by negotiated output format', ['format'])
+
+
+def default_format() -> AudioFormat:
+    return FORMATS[TTS_DEFAULT_FORMAT]
+
+
+def _parse_accept(accept: str) -> List[Tuple[float, str, dict]]:
+    """Media ranges of an Accept header as (q, type, params), most preferred first"""
+    ranges = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *raw_params = [item.strip() for item in part.split(";")]
+        params = {}
+        for raw in raw_params:
+            key, _, value = raw.partition("=")
+            params[key.strip().lower()] = value.strip().strip('"')
+        try:
+            q = float(params.pop("q", 1))
+        except ValueError:
+            q = 0
+        if media_type and q > 0:
+            ranges.append((q, -position, media_type.lower(), params))
+    ranges.sort(reverse=True)
+    return [(q, media_type, params) for q, _, media_type, params in ranges]
+
+
+def _from_accept(accept: str) -> Optional[AudioFormat]:
+    for _, media_type, params in _parse_accept(accept):
+        if media_type in ("*/*", "audio/*"):
+            return default_format()
+        codec = _MEDIA_TYPE_CODECS.get(media_type)
+        if codec is None:
+            continue
+        if codec == "pcm" and f"pcm_{params.get('rate')}" in FORMATS:
+            return FORMATS[f"pcm_{params['rate']}"]
+        return FORMATS[_CODEC_DEFAULTS[codec]]
+    return None
+
+
+def negotiate(requested: Optional[str] = None, accept: Optional[str] = None) -> AudioFormat:
+    """Output format for a request.
+
+    ``requested`` (a format name such as "mp3_44100_64", or just a
+    codec) wins over the Accept header; an Accept header naming no
+    supported audio type gets the default format. Raises ValueError for
+    an unknown ``requested`` format.
+    """
+    if requested:
+        requested = requested.strip().lower()
+        name = _CODEC_DEFAULTS.get(requested, requested)
+        if name not in FORMATS:
+            raise ValueError(f"Unsupported audio format '{requested}'; use one of {', '.join(FORMATS)}")
+        fmt = FORMATS[name]
+    else:
+        fmt = (_from_accept(accept) if accept else None) or default_format()
+    TTS_FORMAT_REQUESTS.labels(format=fmt.name).inc()
+    return fmt
@@ -0,0 +1,222 @@
+"""
+Speculative TTS prefetch for NeuraFormAI
+Synthesizes a reply's audio as soon as the text exists, into a buffer clients can join
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from prometheus_client import Counter, Gauge
+
+from app.services.conversation_service import ConversationService
+from app.services.tts_backend import synthesize_reply_as_stream
+from app.services.audio_format import AudioFormat, default_format
+from app.services.single_flight import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Start TTS for voice-enabled /chat/ replies before the client asks for audio
+TTS_PREFETCH = os.getenv("TTS_PREFETCH", "true").lower() == "true"
+# Buffers are dropped this long after they were started, read or not
+TTS_PREFETCH_TTL_S = int(os.getenv("TTS_PREFETCH_TTL_S", "300"))
+# Memory budget for all buffers; the oldest are dropped first
+TTS_PREFETCH_MAX_BYTES = int(float(os.getenv("TTS_PREFETCH_MAX_MB", "64")) * 1024 * 1024)
+
+TTS_PREFETCH_EVENTS = Counter(
+    'tts_prefetch_total',
+    'Speculative TTS buffers by what happened to them',
+    ['event'],  # started, joined_live, served_complete, unused (dropped unread), failed
+)
+TTS_PREFETCH_BYTES = Gauge('tts_prefetch_buffered_bytes', 'Audio bytes held in prefetch buffers')
+
+
+def _buffer_key(turn_id: str, audio_format: AudioFormat) -> str:
+    return f"{turn_id}/{audio_format.name}"
+
+
+class AudioBuffer:
+    """Audio of one turn in one format, appended while it is synthesized.
+
+    Any number of readers can iterate it, from the first byte, while it
+    is still filling; once ``complete`` it can also be sliced for range
+    requests.
+    """
+
+    def __init__(self, turn_id: str, user_id: str, text_key: str, audio_format: AudioFormat):
+        self.turn_id = turn_id
+        self.user_id = user_id
+        self.text_key = text_key
+        self.audio_format = audio_format
+        self.key = _buffer_key(turn_id, audio_format)
+        self.created_at = time.monotonic()
+        self.chunks: List[bytes] = []
+        self.size = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.reads = 0
+        self._changed = asyncio.Condition()
+        self._data: Optional[bytes] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.done and self.error is None
+
+    async def append(self, chunk: bytes):
+        async with self._changed:
+            self.chunks.append(chunk)
+            self.size += len(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        """Everything buffered so far, then new chunks as they arrive"""
+        self.reads += 1
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.chunks) or self.done)
+
+    def read_range(self, start: int, end: int) -> bytes:
+        """Bytes start..end inclusive of a complete buffer"""
+        self.reads += 1
+        if self._data is None:
+            self._data = b''.join(self.chunks)
+        return self._data[start:end + 1]
+
+
+class AudioPrefetcher:
+    """Per-turn, per-format audio buffers filled by background TTS tasks.
+
+    ``start`` is idempotent per turn and format, so coalesced or
+    replayed /chat/ responses share one synthesis. Buffers are also
+    indexed by user, text, voice and format, so clients that ask for
+    audio by text
+    (/chat/speak-from-text) reuse a prefetched reply too. Buffers live
+    for ``ttl_s`` and within ``max_bytes`` overall; state is per
+    process, and a request that lands on another worker simply
+    synthesizes again.
+    """
+
+    def __init__(self, ttl_s: int = TTS_PREFETCH_TTL_S, max_bytes: int = TTS_PREFETCH_MAX_BYTES):
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        # Keyed by turn_id and format name
+        self._buffers: "OrderedDict[str, AudioBuffer]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # text key -> buffer key
+        self._by_text: Dict[str, str] = {}
+        # Fire-and-forget timing writes, referenced until they finish
+        self._background: Set[asyncio.Task] = set()
+
+    def _evict(self):
+        now = time.monotonic()
+        total = sum(buffer.size for buffer in self._buffers.values())
+        while self._buffers:
+            key, oldest = next(iter(self._buffers.items()))
+            if oldest.created_at + self.ttl_s > now and total <= self.max_bytes:
+                break
+            del self._buffers[key]
+            if self._by_text.get(oldest.text_key) == key:
+                del self._by_text[oldest.text_key]
+            total -= oldest.size
+            task = self._tasks.pop(key, None)
+            if task is not None:
+                task.cancel()
+            if not oldest.reads:
+                TTS_PREFETCH_EVENTS.labels(event='unused').inc()
+        TTS_PREFETCH_BYTES.set(total)
+
+    async def _synthesize(self, buffer: AudioBuffer, text: str, voice_id: Optional[str],
+                          conversation_id: Optional[str], message_id: Optional[str]):
+        started = time.perf_counter()
+        error = None
+        try:
+            async for chunk in synthesize_reply_as_stream(text, voice_id, buffer.user_id, buffer.audio_format):
+                first_chunk = not buffer.chunks
+                await buffer.append(chunk)
+                if first_chunk and conversation_id and message_id:
+                    ttfb_ms = (time.perf_counter() - started) * 1000
+                    task = asyncio.create_task(ConversationService().add_message_timings(
+                        conversation_id, message_id, {"tts_ttfb": round(ttfb_ms, 1)}
+                    ))
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+        except asyncio.CancelledError:
+            error = ConnectionAbortedError("Audio synthesis was cancelled")
+            raise
+        except Exception as e:
+            error = e
+            TTS_PREFETCH_EVENTS.labels(event='failed').inc()
+            logger.error("❌ TTS prefetch failed for turn %s: %s", buffer.turn_id, e)
+        finally:
+            await asyncio.shield(buffer.finish(error))
+            if self._tasks.get(buffer.key) is asyncio.current_task():
+                del self._tasks[buffer.key]
+            self._evict()
+
+    def start(self, turn_id: str, user_id: str, text: str, voice_id: Optional[str],
+              conversation_id: Optional[str] = None, message_id: Optional[str] = None,
+              audio_format: Optional[AudioFormat] = None) -> AudioBuffer:
+        """Buffer for this turn and format, starting synthesis unless it already exists"""
+        self._evict()
+        audio_format = audio_format or default_format()
+        buffer = self._buffers.get(_buffer_key(turn_id, audio_format))
+        if buffer is not None and buffer.error is None:
+            return buffer
+        buffer = AudioBuffer(turn_id, user_id, fingerprint(user_id, voice_id, audio_format.name, text), audio_format)
+        self._buffers[buffer.key] = buffer
+        self._by_text[buffer.text_key] = buffer.key
+        self._tasks[buffer.key] = asyncio.create_task(
+            self._synthesize(buffer, text, voice_id, conversation_id, message_id)
+        )
+        TTS_PREFETCH_EVENTS.labels(event='started').inc()
+        return buffer
+
+    def get(self, turn_id: str, user_id: str, audio_format: Optional[AudioFormat] = None) -> Optional[AudioBuffer]:
+        """Usable buffer of this user's turn in this format, or None"""
+        return self._get(_buffer_key(turn_id, audio_format or default_format()), user_id)
+
+    def _get(self, key: str, user_id: str) -> Optional[AudioBuffer]:
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.user_id != user_id or buffer.error is not None:
+            return None
+        if buffer.created_at + self.ttl_s <= time.monotonic():
+            return None
+        TTS_PREFETCH_EVENTS.labels(event='served_complete' if buffer.done else 'joined_live').inc()
+        return buffer
+
+    def find_text(self, user_id: str, text: str, voice_id: Optional[str],
+                  audio_format: Optional[AudioFormat] = None) -> Optional[AudioBuffer]:
+        """Buffer already holding (or synthesizing) this text in this voice and format for this user"""
+        audio_format = audio_format or default_format()
+        key = self._by_text.get(fingerprint(user_id, voice_id, audio_format.name, text))
+        return self._get(key, user_id) if key else None
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._buffers.clear()
+        self._by_text.clear()
+        TTS_PREFETCH_BYTES.set(0)
+
+
+# Global audio prefetcher
+audio_prefetcher = AudioPrefetcher()
@@ -17,7 +17,8 @@ from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 
 from app.services.user_service import UserService, AuthProvider, UserProfile
-from app.config.database import db
+from app.config.database import db, DatabaseUnavailableError
+from app.services.analytics_buffer import analytics_buffer
 
 logger = logging.getLogger(__name__)
 
@@ -102,6 +103,8 @@ class OAuthService:
                 "token_picture": avatar_url
             }
             
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Google authentication failed: {e}")
             # Surface reason to client to aid debugging (token remains server-verified)
@@ -161,6 +164,8 @@ class OAuthService:
             # User doesn't exist, need to collect additional info
             return False, None, "additional_info_required"
             
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Facebook authentication failed: {e}")
             return False, None, "Facebook authentication failed"
@@ -220,6 +225,8 @@ class OAuthService:
             # User doesn't exist, need to collect additional info
             return False, None, "additional_info_required"
             
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Apple authentication failed: {e}")
             return False, None, "Apple authentication failed"
@@ -307,6 +314,9 @@ class OAuthService:
                 )
                 return self.user_service._row_to_user_profile(result)
             return None
+        except DatabaseUnavailableError:
+            # Surface as 503 rather than an authentication failure
+            raise
         except Exception as e:
             logger.error(f"Failed to validate session {session_token}: {e}")
             return None
@@ -326,6 +336,8 @@ class OAuthService:
                 logger.info(f"Invalidated session: {session_token}")
                 return True
             return False
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Failed to invalidate session {session_token}: {e}")
             return False
@@ -337,24 +349,12 @@ class OAuthService:
         event_data: Optional[Dict[str, Any]] = None,
         session_id: Optional[str] = None
     ):
-        """Track user analytics event"""
-        query = """
-            INSERT INTO public.user_analytics (
-                user_id, event_type, event_data, session_id
-            ) VALUES ($1, $2, $3::jsonb, $4)
+        """Track user analytics event
+
+        Only queues the event; it is written in a batch by the analytics
+        buffer, so this never waits on the database.
         """
-        
-        try:
-            import json as _json
-            await self.db.execute(
-                query,
-                user_id,
-                event_type,
-                _json.dumps(event_data or {}),
-                session_id,
-            )
-        except Exception as e:
-            logger.error(f"Failed to track analytics event for user {user_id}: {e}")
+        analytics_buffer.track(user_id, event_type, event_data, session_id)
 
     async def prune_old_sessions(self, retention_days: int = 30) -> None:
         """Delete expired or inactive sessions older than retention window.
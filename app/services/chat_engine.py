@@ -1,26 +1,37 @@
-import httpx
 import os
 import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
 from dotenv import load_dotenv
 from app.helpers.persona_loader import load_persona
+from app.helpers.turn_timing import current_turn
+from app.config.database import DatabaseUnavailableError
 from app.services.persona_manager import PersonaManager
 from app.services.conversation_service import ConversationService
+from app.services.metrics import record_cache
+from app.services.openrouter_client import LLMUnavailableError, openrouter_client
+from app.services.model_router import model_router
+from app.services.admission import admission_controller
 
 load_dotenv()
 
-API_KEY = os.getenv("OPENAI_API_KEY")
-API_BASE = os.getenv("OPENAI_API_BASE", "https://openrouter.ai/api")
-MODEL = os.getenv("OPENAI_MODEL", "openai/gpt-3.5-turbo")
+logger = logging.getLogger(__name__)
 
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}",
-    "Content-Type": "application/json",
-    "HTTP-Referer": "http://localhost",
-    "X-Title": "NeuraPalAI",
-}
+# What happens to a turn whose client disconnects before the reply is ready:
+#   discard  - cancel the LLM call and delete the saved user message, so a retry starts clean
+#   keep     - cancel the LLM call but keep the user message, unanswered, in history
+#   complete - let the LLM call finish and save the reply; only the response (and TTS) is dropped
+ABANDONED_TURN_POLICY = os.getenv("ABANDONED_TURN_POLICY", "discard").lower()
+# Replies kept in memory for audio requests by turn_id; older turns are read back from the database
+TURN_CACHE_TTL_S = int(os.getenv("TURN_CACHE_TTL_S", "900"))
+_TURN_CACHE_MAX = 10000
 
 class ChatEngine:
     _persona_cache = {}  # { user_id: { "messages": [...], "voice_id": str, "last_loaded": timestamp } }
+    _recent_turns = OrderedDict()  # { turn_id: (expires_at, user_id, { "reply", "voice_id", ... }) }
 
     # === Private methods to manage persona loading and caching ===
     @staticmethod
@@ -37,11 +48,17 @@ class ChatEngine:
             ChatEngine._persona_cache[user_id] = {
                 "messages": persona_data["messages"],
                 "voice_id": persona_data["voice_id"],
+                "model": persona_data.get("model"),
+                "model_policy": persona_data.get("model_policy"),
+                "tts_backend": persona_data.get("tts_backend"),
+                "tts_model": persona_data.get("tts_model"),
                 "last_loaded": mtime,
             }
-            print(f"🔄 Persona loaded for user {user_id} -> {os.path.basename(persona_path)}")
+            record_cache("persona", hit=False)
+            logger.info("🔄 Persona loaded for user %s -> %s", user_id, os.path.basename(persona_path))
         else:
-            print(f"✅ Using cached persona for user {user_id}")
+            record_cache("persona", hit=True)
+            logger.debug("✅ Using cached persona for user %s", user_id)
 
     # === Get persona data and voice ID ===
     @staticmethod
@@ -51,6 +68,8 @@ class ChatEngine:
         return {
             "messages": cached["messages"].copy(),
             "voice_id": cached["voice_id"],
+            "model": cached["model"],
+            "model_policy": cached["model_policy"],
         }
 
     # === Public methods for chat operations ===
@@ -59,13 +78,20 @@ class ChatEngine:
         ChatEngine._load_persona_if_needed(user_id)
         return ChatEngine._persona_cache[user_id]["voice_id"]
 
+    @staticmethod
+    def get_tts_config(user_id: str) -> dict:
+        """The persona's TTS backend and model, each None unless the persona sets it"""
+        ChatEngine._load_persona_if_needed(user_id)
+        cached = ChatEngine._persona_cache[user_id]
+        return {"backend": cached["tts_backend"], "model": cached["tts_model"]}
+
     # === Context management ===
     @staticmethod
     def clear_context(user_id: str):
         """Completely clears conversation cache for a user."""
         if user_id in ChatEngine._persona_cache:
             del ChatEngine._persona_cache[user_id]
-            print(f"🧹 Cleared and invalidated persona cache for user {user_id}")
+            logger.info("🧹 Cleared and invalidated persona cache for user %s", user_id)
 
     # === Persona management ===
     @staticmethod
@@ -74,13 +100,62 @@ class ChatEngine:
         Force-loads persona messages/voice after switching personas.
         """
         ChatEngine._load_persona_if_needed(user_id)
-        print(f"⚡ Preloaded persona for user {user_id}")
+        logger.info("⚡ Preloaded persona for user %s", user_id)
+
+    # === Finished turns (so audio can be produced without generating again) ===
+    @staticmethod
+    def _remember_turn(user_id: str, turn: dict) -> str:
+        """Cache a finished turn and return its id.
+
+        Saved turns get "<conversation_id>.<message_id>" so any worker can
+        load them from the database; unsaved ones only live in this cache.
+        """
+        if turn.get("conversation_id") and turn.get("message_id"):
+            turn_id = f"{turn['conversation_id']}.{turn['message_id']}"
+        else:
+            turn_id = uuid.uuid4().hex
+        cache = ChatEngine._recent_turns
+        cache[turn_id] = (time.monotonic() + TURN_CACHE_TTL_S, user_id, {
+            "reply": turn["reply"],
+            "voice_id": turn["voice_id"],
+            "conversation_id": turn.get("conversation_id"),
+            "message_id": turn.get("message_id"),
+        })
+        now = time.monotonic()
+        while cache and (len(cache) > _TURN_CACHE_MAX or next(iter(cache.values()))[0] < now):
+            cache.popitem(last=False)
+        return turn_id
+
+    @staticmethod
+    async def get_turn(user_id: str, turn_id: str) -> Optional[dict]:
+        """Reply text and voice of a finished turn of this user, or None"""
+        cached = ChatEngine._recent_turns.get(turn_id)
+        if cached and cached[0] >= time.monotonic():
+            return cached[2] if cached[1] == user_id else None
+
+        conversation_id, _, message_id = turn_id.partition(".")
+        if not message_id:
+            return None
+        try:
+            message = await ConversationService().get_message(conversation_id, message_id, user_id)
+        except ValueError:
+            return None
+        if message is None or message["sender_type"] != "ai":
+            return None
+        return {
+            "reply": message["content"],
+            "voice_id": message["metadata"].get("voice_id") or ChatEngine.get_voice_id(user_id),
+            "conversation_id": conversation_id,
+            "message_id": message_id,
+        }
 
     # === Chat operations ===
     @staticmethod
     async def generate_reply(user_id: str, message: str, mode: str, save_to_history: bool = True) -> dict:
         if mode == "safe":
-            return await ChatEngine._use_openrouter_with_persistence(user_id, message, save_to_history)
+            # Refused turns raise AdmissionRejectedError before any upstream work
+            async with admission_controller.admit(user_id):
+                return await ChatEngine._use_openrouter_with_persistence(user_id, message, save_to_history)
         else:
             return {
                 "reply": "Unfiltered mode not implemented yet.",
@@ -96,7 +171,7 @@ class ChatEngine:
         try:
             conv_service = ConversationService()
             conversation_id = await conv_service.get_or_create_conversation(user_id, persona_name)
-            messages = await conv_service.get_conversation_messages(conversation_id)
+            messages = await conv_service.get_conversation_messages(conversation_id, user_id=user_id)
             
             # Convert database messages to OpenAI format
             openai_messages = []
@@ -107,129 +182,120 @@ class ChatEngine:
                     "content": msg['content']
                 })
             
-            print(f"📚 Loaded {len(openai_messages)} messages from conversation history")
+            logger.debug("📚 Loaded %s messages from conversation history", len(openai_messages))
             return openai_messages
             
+        except DatabaseUnavailableError:
+            # A turn without its history would be a different conversation
+            raise
         except Exception as e:
-            print(f"❌ Error loading conversation history: {e}")
+            logger.error("❌ Error loading conversation history: %s", e)
             return []
 
     # === OpenRouter API interaction with persistence ===
     @staticmethod
     async def _use_openrouter_with_persistence(user_id: str, message: str, save_to_history: bool = True) -> dict:
         start_time = time.time()
+        timings = current_turn()
+        conversation_id = user_message_id = reply_save = None
         
         try:
             # Get persona and current persona name
-            persona = ChatEngine._get_persona(user_id)
-            persona_name = PersonaManager.get_active_persona_name(user_id)
+            with timings.stage("persona_load"):
+                persona = ChatEngine._get_persona(user_id)
+                persona_name = PersonaManager.get_active_persona_name(user_id)
             if not persona_name:
                 persona_name = "Assistant"  # fallback
             
             # Get or create conversation
             conv_service = ConversationService()
-            conversation_id = await conv_service.get_or_create_conversation(user_id, persona_name)
+            with timings.stage("conversation_resolve"):
+                conversation_id = await conv_service.get_or_create_conversation(user_id, persona_name)
             
             # Load conversation history from database
-            conversation_history = await ChatEngine.load_conversation_history(user_id, persona_name)
+            with timings.stage("history_fetch"):
+                conversation_history = await ChatEngine.load_conversation_history(user_id, persona_name)
             
             # Build messages array: persona system messages + conversation history + new user message
-            messages = persona["messages"].copy()  # Start with persona system messages
-            messages.extend(conversation_history)  # Add conversation history
-            messages.append({"role": "user", "content": message})  # Add new user message
+            with timings.stage("context_build"):
+                messages = persona["messages"].copy()  # Start with persona system messages
+                messages.extend(conversation_history)  # Add conversation history
+                messages.append({"role": "user", "content": message})  # Add new user message
             
-            print(f"🔄 Total messages in context: {len(messages)} (persona: {len(persona['messages'])}, history: {len(conversation_history)}, new: 1)")
+            logger.debug("🔄 Total messages in context: %s (persona: %s, history: %s, new: 1)", len(messages), len(persona['messages']), len(conversation_history))
             
             # Save user message to database only if save_to_history is True
             if save_to_history:
-                await conv_service.save_message(
-                    conversation_id=conversation_id,
-                    sender_type="user",
-                    content=message,
-                    user_id=user_id
-                )
+                with timings.stage("db_write"):
+                    user_message_id = await conv_service.save_message(
+                        conversation_id=conversation_id,
+                        sender_type="user",
+                        content=message,
+                        user_id=user_id
+                    )
             
-            # Call OpenAI API
+            # Call OpenAI API on the best-ranked model; the others are fallbacks
+            models = model_router.rank(persona["model"], persona["model_policy"])
             payload = {
-                "model": MODEL,
+                "model": models[0],
                 "messages": messages,
                 "max_tokens": 300,
                 "temperature": 0.8,
             }
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{API_BASE}/chat/completions",
-                    headers=HEADERS,
-                    json=payload,
-                )
-
-                response.raise_for_status()
-                result = response.json()
-                reply = result["choices"][0]["message"]["content"].strip()
-                usage = result.get("usage", {})
-                
-                processing_time = int((time.time() - start_time) * 1000)
-                
-                # Save AI reply to database
-                await conv_service.save_message(
+            result = await openrouter_client.complete(payload, models)
+            reply = result["choices"][0]["message"]["content"].strip()
+            usage = result.get("usage", {})
+            
+            processing_time = int((time.time() - start_time) * 1000)
+            
+            # Save AI reply to database (its own write is only in Server-Timing).
+            # Once issued the insert always finishes, so a disconnect from here on
+            # leaves a complete turn rather than a reply without its user message
+            with timings.stage("db_write"):
+                reply_save = asyncio.ensure_future(conv_service.save_message(
                     conversation_id=conversation_id,
                     sender_type="ai",
                     content=reply,
                     tokens_used=usage.get("total_tokens", 0),
-                    processing_time_ms=processing_time
-                )
-                
-                print(f"💾 Saved conversation to database (conversation_id: {conversation_id})")
-
-                return {
-                    "reply": reply,
-                    "prompt_tokens": usage.get("prompt_tokens", 0),
-                    "completion_tokens": usage.get("completion_tokens", 0),
-                    "total_tokens": usage.get("total_tokens", 0),
-                    "voice_id": persona["voice_id"],
-                }
-                
-        except Exception as e:
-            print(f"❌ Error in _use_openrouter_with_persistence: {e}")
-            # Fallback to original method if database fails
-            return await ChatEngine._use_openrouter(user_id, message)
-
-    # === Original OpenRouter API interaction (fallback) ===
-    @staticmethod
-    async def _use_openrouter(user_id: str, message: str) -> dict:
-        persona = ChatEngine._get_persona(user_id)
-        messages = persona["messages"]
-        voice_id = persona["voice_id"]
-
-        messages.append({"role": "user", "content": message})
-
-        for m in messages:
-            print(f"{m['role'].upper()}: {m['content']}\n")
-
-        payload = {
-            "model": MODEL,
-            "messages": messages,
-            "max_tokens": 300,
-            "temperature": 0.8,
-        }
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE}/chat/completions",
-                headers=HEADERS,
-                json=payload,
-            )
-
-            response.raise_for_status()
-            result = response.json()
-            reply = result["choices"][0]["message"]["content"].strip()
-            usage = result.get("usage", {})
+                    processing_time_ms=processing_time,
+                    metadata={"timings": timings.as_dict(), "voice_id": persona["voice_id"]},
+                ))
+                message_id = await asyncio.shield(reply_save)
+            
+            logger.debug("💾 Saved conversation to database (conversation_id: %s)", conversation_id)
 
-            return {
+            result = {
                 "reply": reply,
                 "prompt_tokens": usage.get("prompt_tokens", 0),
                 "completion_tokens": usage.get("completion_tokens", 0),
                 "total_tokens": usage.get("total_tokens", 0),
-                "voice_id": voice_id,
+                "voice_id": persona["voice_id"],
+                "conversation_id": conversation_id,
+                "message_id": message_id,
             }
+            result["turn_id"] = ChatEngine._remember_turn(user_id, result)
+            return result
+                
+        except asyncio.CancelledError:
+            # Client went away before the reply was saved
+            if user_message_id and reply_save is None and ABANDONED_TURN_POLICY == "discard":
+                await asyncio.shield(ChatEngine._discard_message(conversation_id, user_message_id))
+            raise
+        except LLMUnavailableError:
+            # Already retried and failed over; the API answers 503
+            raise
+        except DatabaseUnavailableError:
+            # The pool is saturated: answer 503 rather than spend an LLM call without history
+            raise
+        except Exception as e:
+            logger.error("❌ Error in _use_openrouter_with_persistence: %s", e)
+            raise
+
+    @staticmethod
+    async def _discard_message(conversation_id: str, message_id: str):
+        try:
+            await ConversationService().delete_message(conversation_id, message_id)
+            logger.info("🗑️ Discarded user message of abandoned turn (conversation_id: %s)", conversation_id)
+        except Exception as e:
+            logger.error("❌ Failed to discard abandoned user message: %s", e)
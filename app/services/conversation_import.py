@@ -0,0 +1,305 @@
+"""
+Bulk conversation import for NeuraFormAI
+Loads JSON-lines history with COPY instead of row-by-row save_message calls
+"""
+
+import json
+import random
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional
+from uuid import UUID, uuid4
+
+from app.config.database import db
+from app.config.sharding import shard_router
+from app.services.message_archive import is_partitioned, ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_COLUMNS = ('id', 'user_id', 'persona_id', 'title', 'is_active', 'created_at', 'updated_at')
+MESSAGE_COLUMNS = (
+    'id', 'conversation_id', 'sender_type', 'content', 'user_id',
+    'ai_persona_id', 'tokens_used', 'processing_time_ms', 'metadata', 'created_at',
+)
+
+
+def _parse_timestamp(value: Optional[str], default: datetime) -> datetime:
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+async def iter_jsonl(lines: AsyncIterable[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Decode JSON lines from an async byte stream of arbitrary chunking"""
+    pending = b''
+    async for chunk in lines:
+        pending += chunk
+        *complete, pending = pending.split(b'\n')
+        for line in complete:
+            if line.strip():
+                yield json.loads(line)
+    if pending.strip():
+        yield json.loads(pending)
+
+
+async def iter_jsonl_file(lines: Iterable[str]) -> AsyncIterator[Dict[str, Any]]:
+    """Decode JSON lines from a (sync) text file object"""
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+class ConversationImporter:
+    """Writes conversations and messages in batches via COPY.
+
+    Accepts either nested records (one conversation per line with a
+    ``messages`` list) or the flat ``conversation``/``message`` record
+    stream produced by ``/chat/export``. Conversation and message ids
+    from the input are preserved and rows that already exist are skipped,
+    so re-running an import is safe. Each batch is split by the shard
+    that owns the conversation's user.
+    """
+
+    def __init__(self, batch_size: int = 5000):
+        self.db = db
+        self.router = shard_router
+        self.batch_size = batch_size
+        self._persona_ids: Dict[str, Dict[str, UUID]] = {}
+        self.stats = {'conversations': 0, 'messages': 0, 'batches': 0}
+        self._partitioned: Dict[str, bool] = {}
+
+    # === Input normalisation ===
+    async def _iter_conversations(self, records: AsyncIterable[Dict[str, Any]],
+                                  user_id: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Group input records into conversations with their messages"""
+        current = None
+        async for record in records:
+            record_type = record.get('type')
+            if record_type == 'message':
+                if current is None:
+                    raise ValueError("Message record appears before any conversation record")
+                current['messages'].append(record)
+                # Split very long conversations so a batch never outgrows batch_size
+                if len(current['messages']) >= self.batch_size:
+                    yield current
+                    current = {**current, 'messages': []}
+                continue
+
+            if current is not None:
+                yield current
+            current = dict(record)
+            current['id'] = current.get('id') or str(uuid4())
+            current['messages'] = list(current.get('messages') or [])
+            if user_id:
+                current['user_id'] = user_id
+            if not current.get('user_id'):
+                raise ValueError("Conversation record has no user_id and none was supplied")
+
+            # Flat streams carry messages separately; nested records are complete
+            if record_type is None:
+                yield current
+                current = None
+
+        if current is not None:
+            yield current
+
+    # === Bulk resolution ===
+    async def _resolve_personas(self, conn, shard: str, names: Iterable[str]) -> Dict[str, UUID]:
+        """Map persona names to ids on a shard, creating any that do not exist yet"""
+        persona_ids = self._persona_ids.setdefault(shard, {})
+        missing = sorted({n.lower() for n in names} - persona_ids.keys())
+        if not missing:
+            return persona_ids
+
+        await conn.execute("""
+            INSERT INTO personas (id, name, display_name, description, personality_config)
+            SELECT gen_random_uuid(), n, initcap(n), 'AI persona named ' || n, '{}'::jsonb
+            FROM unnest($1::text[]) AS n
+            WHERE NOT EXISTS (SELECT 1 FROM personas p WHERE LOWER(p.name) = n)
+            ON CONFLICT (name) DO NOTHING
+        """, missing)
+
+        rows = await conn.fetch(
+            "SELECT id, LOWER(name) AS name FROM personas WHERE LOWER(name) = ANY($1::text[])",
+            missing,
+        )
+        for row in rows:
+            persona_ids[row['name']] = row['id']
+        return persona_ids
+
+    # === Batch writes ===
+    async def _flush(self, conversations: List[Dict[str, Any]], shard: Optional[str] = None) -> None:
+        if not conversations:
+            return
+
+        if shard:
+            await self._flush_shard(shard, conversations)
+        else:
+            by_shard: Dict[str, List[Dict[str, Any]]] = {}
+            for conv in conversations:
+                user_shard = await self.router.shard_for_user(conv['user_id'])
+                by_shard.setdefault(user_shard, []).append(conv)
+
+            for user_shard, shard_conversations in by_shard.items():
+                await self._flush_shard(user_shard, shard_conversations)
+                for user_id in {conv['user_id'] for conv in shard_conversations}:
+                    await self.router.pin_user(user_id, user_shard)
+
+        self.stats['batches'] += 1
+        logger.info(
+            f"Imported batch {self.stats['batches']}: "
+            f"{self.stats['conversations']} conversations, {self.stats['messages']} messages so far"
+        )
+
+    async def _flush_shard(self, shard: str, conversations: List[Dict[str, Any]]) -> None:
+        now = datetime.now(timezone.utc)
+        conversation_rows = []
+        message_rows = []
+
+        async with self.router.database(shard).get_connection(statement_timeout_ms=0) as conn:
+            async with conn.transaction():
+                persona_ids = await self._resolve_personas(
+                    conn, shard, (c.get('persona_name') or 'assistant' for c in conversations)
+                )
+
+                for conv in conversations:
+                    conversation_id = UUID(conv['id'])
+                    user_id = UUID(conv['user_id'])
+                    persona_name = (conv.get('persona_name') or 'assistant').lower()
+                    persona_id = persona_ids[persona_name]
+                    created_at = _parse_timestamp(conv.get('created_at'), now)
+                    last_message_at = created_at
+
+                    for msg in conv['messages']:
+                        sent_at = _parse_timestamp(msg.get('created_at'), created_at)
+                        last_message_at = max(last_message_at, sent_at)
+                        is_user = msg.get('sender_type', 'user') == 'user'
+                        message_rows.append((
+                            UUID(msg['id']) if msg.get('id') else uuid4(),
+                            conversation_id,
+                            msg.get('sender_type', 'user'),
+                            msg['content'],
+                            user_id if is_user else None,
+                            None if is_user else persona_id,
+                            msg.get('tokens_used'),
+                            msg.get('processing_time_ms'),
+                            json.dumps(msg.get('metadata') or {}),
+                            sent_at,
+                        ))
+
+                    conversation_rows.append((
+                        conversation_id,
+                        user_id,
+                        persona_id,
+                        conv.get('title') or f"Chat with {persona_name.title()}",
+                        conv.get('is_active', True),
+                        created_at,
+                        _parse_timestamp(conv.get('updated_at'), last_message_at),
+                    ))
+
+                # Historical imports may predate every existing monthly partition
+                if shard not in self._partitioned:
+                    self._partitioned[shard] = await is_partitioned(conn)
+                if self._partitioned[shard] and message_rows:
+                    sent = [row[-1] for row in message_rows]
+                    await ensure_partitions(conn, min(sent), max(sent))
+
+                # COPY into staging tables, then merge so existing rows are skipped
+                await conn.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS import_conversations
+                        (LIKE conversations INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+                    CREATE TEMP TABLE IF NOT EXISTS import_messages
+                        (LIKE messages INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+                """)
+                await conn.copy_records_to_table(
+                    'import_conversations', records=conversation_rows, columns=CONVERSATION_COLUMNS
+                )
+                await conn.copy_records_to_table(
+                    'import_messages', records=message_rows, columns=MESSAGE_COLUMNS
+                )
+
+                conversation_cols = ', '.join(CONVERSATION_COLUMNS)
+                message_cols = ', '.join(MESSAGE_COLUMNS)
+                inserted_conversations = await conn.execute(f"""
+                    INSERT INTO conversations ({conversation_cols})
+                    SELECT {conversation_cols} FROM import_conversations
+                    ON CONFLICT DO NOTHING
+                """)
+                inserted_messages = await conn.execute(f"""
+                    INSERT INTO messages ({message_cols})
+                    SELECT {message_cols} FROM import_messages
+                    ON CONFLICT DO NOTHING
+                """)
+
+        self.stats['conversations'] += int(inserted_conversations.split()[-1])
+        self.stats['messages'] += int(inserted_messages.split()[-1])
+
+    async def import_records(self, records: AsyncIterable[Dict[str, Any]],
+                             user_id: Optional[str] = None, shard: Optional[str] = None) -> Dict[str, int]:
+        """Import a stream of records, flushing every ``batch_size`` messages.
+
+        ``user_id`` assigns every conversation to one user, which is how a
+        ``/chat/export`` file is loaded back into an account. ``shard``
+        writes everything to that shard without pinning anyone to it.
+        """
+        batch: List[Dict[str, Any]] = []
+        batch_messages = 0
+
+        async for conversation in self._iter_conversations(records, user_id):
+            batch.append(conversation)
+            batch_messages += len(conversation['messages'])
+            if batch_messages >= self.batch_size:
+                await self._flush(batch, shard)
+                batch, batch_messages = [], 0
+
+        await self._flush(batch, shard)
+        return dict(self.stats)
+
+    # === Synthetic data for load tests ===
+    async def ensure_users(self, user_ids: List[UUID]) -> None:
+        """Create placeholder users so synthetic conversations satisfy FKs"""
+        await self.db.execute("""
+            INSERT INTO users (id, first_name, last_name, email, birthdate, auth_provider)
+            SELECT u, 'Load', 'Test', u::text || '@loadtest.invalid', DATE '2000-01-01', 'email'
+            FROM unnest($1::uuid[]) AS u
+            ON CONFLICT DO NOTHING
+        """, user_ids)
+
+
+async def generate_synthetic_history(
+    user_ids: List[UUID],
+    conversations_per_user: int,
+    messages_per_conversation: int,
+    personas: List[str],
+    seed: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield nested conversation records with plausible sizes and timestamps"""
+    rng = random.Random(seed)
+    words = (
+        "hello how are you today I was thinking about music art code travel coffee "
+        "books sleep weather games friends work dinner plans weekend movie idea"
+    ).split()
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+
+    for user_id in user_ids:
+        for _ in range(conversations_per_user):
+            created_at = start + timedelta(seconds=rng.randint(0, 360 * 86400))
+            messages = []
+            sent_at = created_at
+            for i in range(messages_per_conversation):
+                sent_at += timedelta(seconds=rng.randint(5, 600))
+                sender = 'user' if i % 2 == 0 else 'ai'
+                length = rng.randint(4, 40) if sender == 'user' else rng.randint(15, 120)
+                messages.append({
+                    'sender_type': sender,
+                    'content': ' '.join(rng.choice(words) for _ in range(length)),
+                    'created_at': sent_at.isoformat(),
+                    'tokens_used': None if sender == 'user' else rng.randint(50, 400),
+                })
+            yield {
+                'user_id': str(user_id),
+                'persona_name': rng.choice(personas),
+                'created_at': created_at.isoformat(),
+                'messages': messages,
+            }
@@ -0,0 +1,30 @@
+"""
+Background purge of deleted conversations for NeuraFormAI
+Deletes run on the request path only as a flag flip; this removes the rows later
+"""
+
+import os
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL_S = int(os.getenv('CONVERSATION_PURGE_INTERVAL_S', '60'))
+# Messages removed per statement, and the pause between statements
+PURGE_CHUNK_SIZE = int(os.getenv('CONVERSATION_PURGE_CHUNK_SIZE', '500'))
+PURGE_CHUNK_PAUSE_MS = int(os.getenv('CONVERSATION_PURGE_CHUNK_PAUSE_MS', '100'))
+
+
+async def purge_loop(store, interval_s: int = PURGE_INTERVAL_S, chunk_size: int = PURGE_CHUNK_SIZE,
+                     pause_ms: int = PURGE_CHUNK_PAUSE_MS):
+    """Background task run for the lifetime of the app"""
+    while True:
+        try:
+            purged = await store.purge_deleted(chunk_size, pause_ms / 1000)
+            if purged:
+                logger.info(f"Purged {purged} deleted conversations")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Conversation purge failed: {e}")
+        await asyncio.sleep(interval_s)
@@ -0,0 +1,126 @@
+"""
+Conversation storage backends for NeuraFormAI
+ConversationService talks to one of these; CONVERSATION_STORE picks which
+"""
+
+import os
+import json
+import base64
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import UUID
+
+# postgres (default) or sqlite
+CONVERSATION_STORE = os.getenv('CONVERSATION_STORE', 'postgres').lower()
+
+
+class ConversationStore(ABC):
+    """Storage interface behind ConversationService.
+
+    Ids are returned as strings and timestamps as ISO 8601 strings, so
+    callers can't tell which backend served them.
+    """
+
+    # Whether the store keeps conversations in the Postgres database
+    uses_postgres = False
+
+    async def initialize(self):
+        """Open connections and start background work"""
+
+    async def close(self):
+        """Release everything opened by initialize()"""
+
+    # === Conversations ===
+    @abstractmethod
+    async def get_or_create_conversation(self, user_id: str, persona_name: str) -> str:
+        """Id of the user's active conversation with a persona, created if needed"""
+
+    @abstractmethod
+    async def get_conversation_for_persona(self, user_id: str, persona_name: str) -> Optional[str]:
+        """Id of the user's active conversation with a persona, or None"""
+
+    @abstractmethod
+    async def get_user_conversations(self, user_id: str) -> List[Dict[str, Any]]:
+        """All conversations of a user, most recently updated first"""
+
+    @abstractmethod
+    async def update_conversation_title(self, conversation_id: str, title: str,
+                                        user_id: Optional[str] = None) -> bool:
+        """Rename a conversation; False if it doesn't exist"""
+
+    @abstractmethod
+    async def delete_conversation(self, conversation_id: str, user_id: Optional[str] = None) -> bool:
+        """Hide a conversation from every read; False if it doesn't exist"""
+
+    @abstractmethod
+    async def purge_deleted(self, chunk_size: int, pause_s: float) -> int:
+        """Physically remove deleted conversations, pausing between message chunks"""
+
+    # === Messages ===
+    @abstractmethod
+    async def save_message(self, conversation_id: str, sender_type: str, content: str,
+                           user_id: str = None, persona_id: str = None, tokens_used: int = None,
+                           processing_time_ms: int = None, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Append a message and bump the conversation's updated_at"""
+
+    @abstractmethod
+    async def add_message_timings(self, conversation_id: str, message_id: str,
+                                  timings: Dict[str, float]) -> bool:
+        """Merge stage timings into a message's metadata['timings']"""
+
+    @abstractmethod
+    async def get_message(self, conversation_id: str, message_id: str,
+                          user_id: str) -> Optional[Dict[str, Any]]:
+        """One live message of a user's conversation, or None"""
+
+    @abstractmethod
+    async def delete_message(self, conversation_id: str, message_id: str) -> bool:
+        """Remove one message, e.g. the user half of an abandoned turn"""
+
+    @abstractmethod
+    async def get_conversation_messages(self, conversation_id: str, limit: int = 100,
+                                        user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Oldest-first messages of a conversation"""
+
+    @abstractmethod
+    async def search_messages(self, user_id: str, query_text: str, persona_name: Optional[str] = None,
+                              limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Full-text search over a user's messages, best matches first"""
+
+    @abstractmethod
+    def iter_user_history(self, user_id: str, batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a user's entire history as flat export records"""
+
+    # === Search cursors ===
+    @staticmethod
+    def _encode_search_cursor(rank: float, message_id: str) -> str:
+        """Encode the (rank, id) position of the last result as an opaque cursor"""
+        raw = json.dumps({"r": rank, "id": message_id}).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    @staticmethod
+    def _decode_search_cursor(cursor: str) -> Tuple[float, UUID]:
+        """Decode a cursor produced by _encode_search_cursor"""
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return float(data["r"]), UUID(data["id"])
+        except Exception:
+            raise ValueError("Invalid search cursor")
+
+
+_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """The process-wide store selected by CONVERSATION_STORE"""
+    global _store
+    if _store is None:
+        if CONVERSATION_STORE == 'sqlite':
+            from app.services.sqlite_store import SQLiteConversationStore
+            _store = SQLiteConversationStore()
+        elif CONVERSATION_STORE == 'postgres':
+            from app.services.postgres_store import PostgresConversationStore
+            _store = PostgresConversationStore()
+        else:
+            raise ValueError(f"Unknown CONVERSATION_STORE '{CONVERSATION_STORE}'; use postgres or sqlite")
+    return _store
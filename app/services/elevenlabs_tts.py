@@ -1,52 +1,151 @@
-from elevenlabs.client import ElevenLabs
+"""
+ElevenLabs TTS backend for NeuraFormAI
+Streams speech from the ElevenLabs API over pooled async HTTP connections
+"""
+
 import os
+import time
+import random
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+import httpx
 from dotenv import load_dotenv
 from pathlib import Path
-from app.services.chat_engine import ChatEngine
-from ..helpers.text_cleaner import sanitize_for_speech
+from prometheus_client import Counter, Histogram
+from app.services.tts_backend import TTSBackend
+from app.services.audio_format import AudioFormat
 
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
+logger = logging.getLogger(__name__)
+
 API_KEY = os.getenv("ELEVENLABS_API_KEY")
-client = ElevenLabs(api_key=API_KEY)
+if not API_KEY:
+    logger.warning("❌ [ElevenLabs] ELEVENLABS_API_KEY is not set; TTS requests will fail")
+API_BASE = os.getenv("ELEVENLABS_API_BASE", "https://api.elevenlabs.io")
+# Default model; a persona may pick another with tts_model
+MODEL_ID = os.getenv("ELEVENLABS_MODEL_ID", "eleven_monolingual_v1")
 
-# === Synthesize text to speech using ElevenLabs ===
-def synthesize_reply_as_stream(text: str, voice_id: str = None):
-    """
-    Stream TTS audio for a given text. If no voice_id is provided,
-    automatically retrieves it from the currently active persona
-    using ChatEngine (single source of truth).
+# Open connections to ElevenLabs, shared by all audio streams of this process
+TTS_MAX_CONNECTIONS = int(os.getenv("TTS_MAX_CONNECTIONS", "100"))
+TTS_CONNECT_TIMEOUT_S = float(os.getenv("TTS_CONNECT_TIMEOUT_S", "5"))
+# Longest gap allowed between audio chunks (and before the first one)
+TTS_READ_TIMEOUT_S = float(os.getenv("TTS_READ_TIMEOUT_S", "15"))
+# Retries when the stream could not be opened (connect errors, 429, 5xx); never once audio has flowed
+TTS_CONNECT_RETRIES = int(os.getenv("TTS_CONNECT_RETRIES", "2"))
+_BACKOFF_BASE_S = 0.25
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# === ElevenLabs instrumentation ===
+ELEVENLABS_TTFB = Histogram(
+    'elevenlabs_ttfb_seconds',
+    'Time from starting a TTS stream to its first audio chunk',
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0),
+)
+ELEVENLABS_BYTES = Counter('elevenlabs_audio_bytes_total', 'Audio bytes streamed from ElevenLabs')
+ELEVENLABS_ERRORS = Counter('elevenlabs_errors_total', 'Failed ElevenLabs TTS streams')
+ELEVENLABS_RETRIES = Counter('elevenlabs_retries_total', 'ElevenLabs stream requests retried before any audio')
+
+
+class ElevenLabsError(Exception):
+    """Raised when ElevenLabs refuses a TTS request"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"ElevenLabs returned {status_code}: {detail}")
+        self.status_code = status_code
+
+
+class ElevenLabsBackend(TTSBackend):
+    """Async ElevenLabs streaming over one pooled HTTP connection pool.
+
+    Audio is read chunk by chunk on the event loop, so a stream holds a
+    pooled connection but no worker thread. Opening the stream is
+    retried with jittered backoff on connect errors and retryable
+    statuses; once audio has been yielded a failure is raised as is.
+    Closing the iterator early closes the upstream response.
     """
-    print(f"🎙️ [ElevenLabs] Starting TTS synthesis...")
-    print(f"🎙️ [ElevenLabs] API_KEY exists: {bool(API_KEY)}")
-    print(f"🎙️ [ElevenLabs] API_KEY length: {len(API_KEY) if API_KEY else 0}")
-    
-    if not voice_id:
-        voice_id = ChatEngine.get_voice_id()
-        print(f"🎙️ No voice_id provided. Using persona voice: {voice_id}")
-
-    cleaned_text = sanitize_for_speech(text)
-    print(f"🎙️ [ElevenLabs] Cleaned text: {cleaned_text[:50]}...")
-    print(f"🎙️ [ElevenLabs] Voice ID: {voice_id}")
 
+    name = "elevenlabs"
+
+    def __init__(self, api_key: Optional[str] = API_KEY, connect_retries: int = TTS_CONNECT_RETRIES):
+        self.api_key = api_key
+        self.connect_retries = connect_retries
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=API_BASE,
+                headers={"xi-api-key": self.api_key or ""},
+                timeout=httpx.Timeout(TTS_READ_TIMEOUT_S, connect=TTS_CONNECT_TIMEOUT_S),
+                limits=httpx.Limits(max_connections=TTS_MAX_CONNECTIONS, max_keepalive_connections=20),
+            )
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def stream(self, text: str, voice_id: Optional[str], audio_format: AudioFormat,
+               model_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        return _instrumented(self._stream(text, voice_id, audio_format, model_id or MODEL_ID))
+
+    async def _stream(self, text: str, voice_id: Optional[str], audio_format: AudioFormat,
+                      model_id: str) -> AsyncIterator[bytes]:
+        if not voice_id:
+            raise ValueError("ElevenLabs needs a voice_id")
+        body = {"text": text, "model_id": model_id}
+        attempt = 0
+        while True:
+            try:
+                async with self._client().stream(
+                    "POST", f"/v1/text-to-speech/{voice_id}/stream",
+                    params={"output_format": audio_format.name}, json=body,
+                ) as response:
+                    if response.status_code >= 400:
+                        detail = (await response.aread()).decode("utf-8", "replace")[:500]
+                        raise ElevenLabsError(response.status_code, detail)
+                    async for chunk in response.aiter_bytes():
+                        yield chunk
+                    return
+            except (ElevenLabsError, httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                retryable = not isinstance(e, ElevenLabsError) or e.status_code in _RETRYABLE_STATUS
+                if not retryable or attempt >= self.connect_retries:
+                    raise
+                attempt += 1
+                ELEVENLABS_RETRIES.inc()
+                delay = random.uniform(0, _BACKOFF_BASE_S * 2 ** attempt)
+                logger.warning("⚠️ [ElevenLabs] %s; retry %s in %.2fs", e, attempt, delay)
+                await asyncio.sleep(delay)
+
+
+async def _instrumented(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Yield the audio stream, recording first-chunk latency, bytes and failures"""
+    start = time.perf_counter()
+    first_chunk = True
     try:
-        print(f"🎙️ [ElevenLabs] Calling ElevenLabs API...")
-        stream = client.text_to_speech.stream(
-            voice_id=voice_id,
-            model_id="eleven_monolingual_v1",
-            text=cleaned_text,
-        )
-        print(f"🎙️ [ElevenLabs] Stream created successfully")
-        return stream
+        async for chunk in stream:
+            if first_chunk:
+                first_chunk = False
+                ELEVENLABS_TTFB.observe(time.perf_counter() - start)
+            ELEVENLABS_BYTES.inc(len(chunk))
+            yield chunk
     except Exception as e:
+        ELEVENLABS_ERRORS.inc()
         error_msg = str(e).lower()
         if "quota" in error_msg or "credits" in error_msg or "limit" in error_msg:
-            print(f"❌ [ElevenLabs] CREDIT LIMIT REACHED: {e}")
-            print(f"💡 [ElevenLabs] Please add credits to your ElevenLabs account")
-        elif "unauthorized" in error_msg or "401" in error_msg:
-            print(f"❌ [ElevenLabs] API KEY INVALID: {e}")
-            print(f"💡 [ElevenLabs] Please check your ElevenLabs API key")
+            logger.error("❌ [ElevenLabs] CREDIT LIMIT REACHED: %s", e)
+            logger.warning("💡 [ElevenLabs] Please add credits to your ElevenLabs account")
+        elif isinstance(e, ElevenLabsError) and e.status_code == 401:
+            logger.error("❌ [ElevenLabs] API KEY INVALID: %s", e)
+            logger.warning("💡 [ElevenLabs] Please check your ElevenLabs API key")
         else:
-            print(f"❌ [ElevenLabs] Error creating stream: {e}")
+            logger.error("❌ [ElevenLabs] Error streaming audio: %s", e)
         raise
+    finally:
+        # Closing early (client gone) must close the upstream response too
+        await stream.aclose()
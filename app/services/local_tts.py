@@ -0,0 +1,150 @@
+"""
+Local TTS stand-in for NeuraFormAI
+Deterministic silent audio, paced like speech, for load tests, CI and failover
+"""
+
+import os
+import struct
+import asyncio
+import logging
+from typing import AsyncIterator, Iterator, List, Optional
+
+from app.services.tts_backend import TTSBackend
+from app.services.audio_format import AudioFormat
+
+logger = logging.getLogger(__name__)
+
+# Delay before the first chunk, to mimic a remote TTS service
+LOCAL_TTS_TTFB_MS = float(os.getenv("LOCAL_TTS_TTFB_MS", "0"))
+# Audio is delivered this many times faster than it plays (0 = as fast as possible)
+LOCAL_TTS_REALTIME_FACTOR = float(os.getenv("LOCAL_TTS_REALTIME_FACTOR", "0"))
+# Speaking rate that sets the audio length for a text
+LOCAL_TTS_CHARS_PER_S = float(os.getenv("LOCAL_TTS_CHARS_PER_S", "15"))
+
+# About this much audio per chunk
+_CHUNK_S = 0.5
+
+# === MP3 ===
+# Bitrate index of each kbps value, for MPEG-1 (44.1 kHz) and MPEG-2 (22.05 kHz) Layer III
+_MPEG1_BITRATES = {32: 1, 40: 2, 48: 3, 56: 4, 64: 5, 80: 6, 96: 7, 112: 8, 128: 9, 160: 10, 192: 11}
+_MPEG2_BITRATES = {8: 1, 16: 2, 24: 3, 32: 4, 40: 5, 48: 6, 56: 7, 64: 8, 80: 9, 96: 10, 112: 11, 128: 12}
+
+
+def silent_mp3_frame(sample_rate: int, bitrate: int) -> bytes:
+    """One mono Layer III frame without padding or CRC.
+
+    All-zero side information means no coded samples, so every decoder
+    plays it as silence.
+    """
+    if sample_rate == 44100:
+        version, index, frame_bytes = 0xFB, _MPEG1_BITRATES[bitrate], 144000 * bitrate // sample_rate
+    else:
+        version, index, frame_bytes = 0xF3, _MPEG2_BITRATES[bitrate], 72000 * bitrate // sample_rate
+    header = bytes((0xFF, version, index << 4, 0xC4))
+    return header + bytes(frame_bytes - len(header))
+
+
+def _mp3(fmt: AudioFormat, duration_s: float) -> Iterator[bytes]:
+    frame = silent_mp3_frame(fmt.sample_rate, fmt.bitrate)
+    frame_s = (1152 if fmt.sample_rate == 44100 else 576) / fmt.sample_rate
+    total = max(1, int(duration_s / frame_s + 0.999))
+    per_chunk = max(1, int(_CHUNK_S / frame_s))
+    for sent in range(0, total, per_chunk):
+        yield frame * min(per_chunk, total - sent)
+
+
+# === PCM ===
+def _pcm(fmt: AudioFormat, duration_s: float) -> Iterator[bytes]:
+    total = max(1, int(duration_s * fmt.sample_rate))
+    per_chunk = int(_CHUNK_S * fmt.sample_rate)
+    for sent in range(0, total, per_chunk):
+        yield bytes(2 * min(per_chunk, total - sent))
+
+
+# === Ogg Opus ===
+# A 20 ms mono CELT frame with no energy: Opus's usual silence packet
+_OPUS_SILENCE = bytes((0xF8, 0xFF, 0xFE))
+_OPUS_FRAME_SAMPLES = 960
+_OGG_SERIAL = 0x4E465241
+
+
+def _ogg_crc_table() -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_OGG_CRC = _ogg_crc_table()
+
+
+def _ogg_page(packets: List[bytes], granule: int, sequence: int, flags: int = 0) -> bytes:
+    lacing = bytearray()
+    for packet in packets:
+        lacing += b'\xff' * (len(packet) // 255) + bytes((len(packet) % 255,))
+    header = struct.pack('<4sBBqIIIB', b'OggS', 0, flags, granule, _OGG_SERIAL, sequence, 0, len(lacing))
+    page = bytearray(header + lacing + b''.join(packets))
+    crc = 0
+    for byte in page:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC[(crc >> 24) ^ byte]
+    page[22:26] = struct.pack('<I', crc)
+    return bytes(page)
+
+
+def _opus(fmt: AudioFormat, duration_s: float) -> Iterator[bytes]:
+    head = struct.pack('<8sBBHIhB', b'OpusHead', 1, 1, 0, fmt.sample_rate, 0, 0)
+    vendor = b'NeuraFormAI local TTS'
+    tags = struct.pack('<8sI', b'OpusTags', len(vendor)) + vendor + struct.pack('<I', 0)
+    total = max(1, int(duration_s * 50 + 0.999))
+    per_page = int(_CHUNK_S * 50)
+    # Header pages go out with the first audio page
+    chunk = _ogg_page([head], 0, 0, flags=0x02) + _ogg_page([tags], 0, 1)
+    sequence = 2
+    for sent in range(0, total, per_page):
+        packets = min(per_page, total - sent)
+        last = sent + packets >= total
+        granule = (sent + packets) * _OPUS_FRAME_SAMPLES
+        chunk += _ogg_page([_OPUS_SILENCE] * packets, granule, sequence, flags=0x04 if last else 0)
+        sequence += 1
+        yield chunk
+        chunk = b''
+
+
+_ENCODERS = {"mp3": _mp3, "pcm": _pcm, "opus": _opus}
+
+
+class LocalTTSBackend(TTSBackend):
+    """Synthetic speech that costs nothing and needs no network.
+
+    The audio is silence in the requested format, with a length that
+    follows the text (at ``chars_per_s``), so the same text always
+    gives the same bytes and the voice path can be load-tested end to
+    end. ``ttfb_ms`` and ``realtime_factor`` make it arrive the way
+    streamed speech would.
+    """
+
+    name = "local"
+
+    def __init__(self, ttfb_ms: float = LOCAL_TTS_TTFB_MS, realtime_factor: float = LOCAL_TTS_REALTIME_FACTOR,
+                 chars_per_s: float = LOCAL_TTS_CHARS_PER_S):
+        self.ttfb_s = ttfb_ms / 1000
+        self.realtime_factor = realtime_factor
+        self.chars_per_s = chars_per_s
+
+    def duration_s(self, text: str) -> float:
+        return len(text) / self.chars_per_s
+
+    async def stream(self, text: str, voice_id: Optional[str], audio_format: AudioFormat,
+                     model_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        if self.ttfb_s > 0:
+            await asyncio.sleep(self.ttfb_s)
+        first = True
+        for chunk in _ENCODERS[audio_format.codec](audio_format, self.duration_s(text)):
+            if not first and self.realtime_factor > 0:
+                # Pace by the audio already sent
+                await asyncio.sleep(_CHUNK_S / self.realtime_factor)
+            first = False
+            yield chunk
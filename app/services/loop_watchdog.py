@@ -0,0 +1,161 @@
+"""
+Event-loop watchdog for NeuraFormAI
+Measures event-loop lag and captures the stack of whatever blocks the loop
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Seconds between event-loop lag samples
+LOOP_LAG_INTERVAL_S = float(os.getenv('EVENT_LOOP_LAG_INTERVAL_S', '0.5'))
+# Capture stacks of callbacks that hold the loop at least this long
+EVENT_LOOP_WATCHDOG = os.getenv('EVENT_LOOP_WATCHDOG', 'true').lower() == 'true'
+BLOCK_THRESHOLD_MS = int(os.getenv('EVENT_LOOP_BLOCK_THRESHOLD_MS', '200'))
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_REPO_DIR = os.path.dirname(_APP_DIR)
+
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'How late the event loop woke a timer, i.e. time it spent blocked',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+EVENT_LOOP_LAG_LAST = Gauge('event_loop_lag_last_seconds', 'Most recent event-loop lag sample')
+EVENT_LOOP_BLOCKED = Counter(
+    'event_loop_blocked_total',
+    'Times the event loop was blocked past the watchdog threshold',
+    ['site'],  # innermost app function on the stack when the block was caught
+)
+EVENT_LOOP_BLOCKED_DURATION = Histogram(
+    'event_loop_blocked_seconds',
+    'Length of each event-loop block caught by the watchdog',
+    buckets=(0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+)
+
+
+def _blocking_site(frame) -> str:
+    """Innermost frame inside app/, as "app/services/x.py:function" """
+    for summary in reversed(traceback.extract_stack(frame)):
+        filename = os.path.abspath(summary.filename)
+        if filename.startswith(_APP_DIR) and filename != os.path.abspath(__file__):
+            return f"{os.path.relpath(filename, _REPO_DIR)}:{summary.name}"
+    return 'unknown'
+
+
+class LoopWatchdog:
+    """Samples event-loop lag and reports callbacks that block the loop.
+
+    A task on the loop wakes every ``interval_s`` and records how late it
+    woke. With ``watch`` enabled, a daemon thread posts a probe callback
+    to the loop every few milliseconds (``call_soon_threadsafe``); once a
+    probe has waited ``threshold_ms`` without running it snapshots the
+    loop thread's stack, logs it and counts it by the innermost app
+    function. Probing on every poll means a block is caught whatever
+    its length relative to ``interval_s``. Each block is reported once,
+    with its total length logged when the probe finally runs. While the
+    loop is healthy the cost is one trivial callback per poll.
+    """
+
+    def __init__(self, interval_s: float = LOOP_LAG_INTERVAL_S, watch: bool = EVENT_LOOP_WATCHDOG,
+                 threshold_ms: int = BLOCK_THRESHOLD_MS):
+        self.interval_s = interval_s
+        self.watch = watch
+        self.threshold_s = threshold_ms / 1000
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        # (time.monotonic() the last probe was posted, time it ran), replaced as a whole
+        self._last_ack = (0.0, 0.0)
+
+    # === On the loop ===
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected_wake = loop.time() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            lag = max(0.0, loop.time() - expected_wake)
+            EVENT_LOOP_LAG.observe(lag)
+            EVENT_LOOP_LAG_LAST.set(lag)
+
+    def _ack_probe(self, posted_at: float):
+        self._last_ack = (posted_at, time.monotonic())
+
+    # === On the watchdog thread ===
+    def _watch(self):
+        poll_s = min(self.threshold_s / 4, 0.05)
+        # time.monotonic() at which the probe still waiting on the loop was posted
+        probe_posted = None
+        blocked = False
+        while not self._stop.wait(poll_s):
+            acked_probe, acked_at = self._last_ack
+            if probe_posted is not None and acked_probe == probe_posted:
+                if blocked:
+                    duration = acked_at - probe_posted
+                    EVENT_LOOP_BLOCKED_DURATION.observe(duration)
+                    logger.warning("⚠️ Event loop unblocked after %.0fms", duration * 1000)
+                    blocked = False
+                probe_posted = None
+
+            if probe_posted is None:
+                probe_posted = time.monotonic()
+                try:
+                    self._loop.call_soon_threadsafe(self._ack_probe, probe_posted)
+                except RuntimeError:
+                    # Loop closed underneath us
+                    return
+                continue
+
+            overdue = time.monotonic() - probe_posted
+            if blocked or overdue < self.threshold_s:
+                continue
+
+            blocked = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            site = _blocking_site(frame)
+            EVENT_LOOP_BLOCKED.labels(site=site).inc()
+            logger.warning(
+                "⚠️ Event loop blocked for %.0fms in %s:\n%s",
+                overdue * 1000, site, ''.join(traceback.format_stack(frame)),
+            )
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.create_task(self._heartbeat())
+        if self.watch:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+            self._thread.start()
+
+    async def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global event-loop watchdog
+loop_watchdog = LoopWatchdog()
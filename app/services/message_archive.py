@@ -0,0 +1,429 @@
+"""
+Message partitioning and cold-history archival for NeuraFormAI
+Keeps `messages` range-partitioned by month and moves old partitions to disk
+"""
+
+import os
+import re
+import json
+import zlib
+import gzip
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import asyncpg
+
+from app.config.database import db
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(os.getenv('MESSAGE_ARCHIVE_DIR', 'data/message_archive'))
+PARTITIONS_AHEAD = int(os.getenv('MESSAGE_PARTITIONS_AHEAD', '3'))
+# Partitions whose range ended more than this many months ago are archived (0 = never)
+ARCHIVE_AFTER_MONTHS = int(os.getenv('MESSAGE_ARCHIVE_AFTER_MONTHS', '0'))
+MAINTENANCE_INTERVAL_S = int(os.getenv('MESSAGE_PARTITION_MAINTENANCE_INTERVAL', '3600'))
+
+_PARTITION_NAME = re.compile(r'^messages_p(\d{4})(\d{2})$')
+
+
+# === Month arithmetic ===
+def _month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def _add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + (month.month - 1) + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"messages_p{month.year:04d}{month.month:02d}"
+
+
+def _partition_month(name: str) -> Optional[datetime]:
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+
+
+# === Partition management (connection-level so setup scripts can reuse it) ===
+async def is_partitioned(conn) -> bool:
+    """True when public.messages is a partitioned table"""
+    return await conn.fetchval("SELECT relkind = 'p' FROM pg_class WHERE oid = 'public.messages'::regclass")
+
+
+async def ensure_partitions(conn, start: datetime, end: datetime) -> List[str]:
+    """Create monthly partitions covering [start, end]; returns the ones created"""
+    created = []
+    month = _month_start(start)
+    while month <= end:
+        name = _partition_name(month)
+        exists = await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", f"public.{name}")
+        if not exists:
+            upper = _add_months(month, 1)
+            await conn.execute(
+                f"CREATE TABLE IF NOT EXISTS public.{name} PARTITION OF public.messages "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+            created.append(name)
+        month = _add_months(month, 1)
+
+    if created:
+        logger.info(f"Created message partitions: {', '.join(created)}")
+    return created
+
+
+async def ensure_future_partitions(conn, months_ahead: int = PARTITIONS_AHEAD) -> List[str]:
+    """Make sure the current month and the next ``months_ahead`` have partitions"""
+    this_month = _month_start(datetime.now(timezone.utc))
+    return await ensure_partitions(conn, this_month, _add_months(this_month, months_ahead))
+
+
+async def list_partitions(conn) -> List[Tuple[str, datetime]]:
+    """Attached monthly partitions of messages, oldest first"""
+    rows = await conn.fetch("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.messages'::regclass
+    """)
+    partitions = [(row['relname'], _partition_month(row['relname'])) for row in rows]
+    return sorted((p for p in partitions if p[1] is not None), key=lambda p: p[1])
+
+
+async def convert_messages_to_partitioned(conn, keep_legacy: bool = False) -> int:
+    """One-off migration of a plain messages table to monthly range partitions.
+
+    Runs in a single transaction holding an exclusive lock on messages, so
+    schedule it in a maintenance window. Returns the number of rows moved.
+    """
+    async with conn.transaction():
+        if await is_partitioned(conn):
+            logger.info("messages is already partitioned")
+            return 0
+
+        await conn.execute("LOCK TABLE public.messages IN ACCESS EXCLUSIVE MODE")
+        await conn.execute("ALTER TABLE public.messages RENAME TO messages_unpartitioned")
+
+        # Free the index and constraint names for the new table
+        for row in await conn.fetch(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = 'messages_unpartitioned'"
+        ):
+            await conn.execute(f'ALTER INDEX public."{row["indexname"]}" RENAME TO "{row["indexname"]}_unpartitioned"')
+
+        await conn.execute("UPDATE public.messages_unpartitioned SET created_at = NOW() WHERE created_at IS NULL")
+        await conn.execute("""
+            CREATE TABLE public.messages (
+                LIKE public.messages_unpartitioned INCLUDING DEFAULTS INCLUDING GENERATED
+            ) PARTITION BY RANGE (created_at)
+        """)
+        await conn.execute("ALTER TABLE public.messages ALTER COLUMN created_at SET NOT NULL")
+        await conn.execute("ALTER TABLE public.messages ADD PRIMARY KEY (id, created_at)")
+        await conn.execute("""
+            ALTER TABLE public.messages ADD CONSTRAINT messages_conversation_id_fkey
+            FOREIGN KEY (conversation_id) REFERENCES public.conversations(id) ON DELETE CASCADE
+        """)
+
+        bounds = await conn.fetchrow("SELECT MIN(created_at) AS lo FROM public.messages_unpartitioned")
+        now = datetime.now(timezone.utc)
+        await ensure_partitions(conn, bounds['lo'] or now, _add_months(_month_start(now), PARTITIONS_AHEAD))
+
+        columns = await conn.fetch("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = 'messages_unpartitioned'
+              AND is_generated = 'NEVER'
+            ORDER BY ordinal_position
+        """)
+        column_list = ', '.join(f'"{c["column_name"]}"' for c in columns)
+        moved = await conn.execute(
+            f"INSERT INTO public.messages ({column_list}) SELECT {column_list} FROM public.messages_unpartitioned"
+        )
+
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON public.messages(conversation_id, created_at)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_content_tsv ON public.messages USING GIN (content_tsv)")
+
+        if not keep_legacy:
+            await conn.execute("DROP TABLE public.messages_unpartitioned")
+
+    rows = int(moved.split()[-1])
+    logger.info(f"Converted messages to a partitioned table ({rows} rows moved)")
+    return rows
+
+
+# === Archival ===
+def _write_segments(path: Path, groups: List[Tuple[UUID, List[bytes]]]) -> List[Tuple[UUID, int, int, int]]:
+    """Append one gzip member per conversation; returns (id, offset, length, count)"""
+    segments = []
+    with open(path, 'ab') as f:
+        for conversation_id, lines in groups:
+            compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+            member = compressor.compress(b''.join(lines)) + compressor.flush()
+            offset = f.tell()
+            f.write(member)
+            segments.append((conversation_id, offset, len(member), len(lines)))
+        f.flush()
+        os.fsync(f.fileno())
+    return segments
+
+
+def _read_segment(path: str, offset: int, length: int) -> List[Dict[str, Any]]:
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = gzip.decompress(f.read(length))
+    return [json.loads(line) for line in data.splitlines() if line]
+
+
+def _scrub_segment(path: str, offset: int, length: int) -> None:
+    """Overwrite a segment with zeros; the other segments keep their offsets"""
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(bytes(length))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class MessageArchive:
+    """Moves old message partitions to compressed JSONL files and reads them back.
+
+    Each archive file holds one gzip member per conversation, and the
+    member's byte range is recorded in ``message_archive_segments``, so
+    rehydrating a conversation reads only its own bytes rather than the
+    whole month.
+    """
+
+    def __init__(self, database=db, archive_dir: Path = ARCHIVE_DIR, cache_size: int = 256):
+        self.db = database
+        self.archive_dir = Path(archive_dir)
+        # conversation_id -> (segments read, their messages)
+        self._cache: "OrderedDict[str, Tuple[tuple, List[Dict[str, Any]]]]" = OrderedDict()
+        self._cache_size = cache_size
+
+    async def archive_partition(self, name: str) -> int:
+        """Export one partition to disk, then detach and drop it"""
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = (self.archive_dir / f"{name}.jsonl.gz").resolve()
+        # A month can be archived again after imports or shard moves recreate
+        # its partition; new segments are then appended to the existing file
+        existing = await self.db.fetchrow(
+            "SELECT id, path FROM public.message_archives WHERE partition_name = $1", name
+        )
+        if existing:
+            path = Path(existing['path'])
+        elif path.exists():
+            # Left over from an interrupted run; its rows are still in the partition
+            path.unlink()
+
+        month = _partition_month(name)
+        total = 0
+        segments: List[Tuple[UUID, int, int, int]] = []
+
+        async with self.db.get_connection(statement_timeout_ms=0) as conn:
+            async with conn.transaction():
+                archive_id = existing['id'] if existing else await conn.fetchval("""
+                    INSERT INTO public.message_archives (partition_name, range_start, range_end, path)
+                    VALUES ($1, $2, $3, $4)
+                    RETURNING id
+                """, name, month, _add_months(month, 1), str(path))
+
+                query = f"""
+                    SELECT id, conversation_id, sender_type, content, user_id, ai_persona_id,
+                           tokens_used, processing_time_ms, metadata, created_at
+                    FROM public.{name}
+                    ORDER BY conversation_id, created_at, id
+                """
+                groups: List[Tuple[UUID, List[bytes]]] = []
+                current_id, current_lines, pending = None, [], 0
+                async for row in conn.cursor(query, prefetch=1000):
+                    if row['conversation_id'] != current_id:
+                        if current_lines:
+                            groups.append((current_id, current_lines))
+                        current_id, current_lines = row['conversation_id'], []
+                    metadata = row['metadata']
+                    current_lines.append(json.dumps({
+                        'id': str(row['id']),
+                        'conversation_id': str(row['conversation_id']),
+                        'sender_type': row['sender_type'],
+                        'content': row['content'],
+                        'user_id': str(row['user_id']) if row['user_id'] else None,
+                        'ai_persona_id': str(row['ai_persona_id']) if row['ai_persona_id'] else None,
+                        'tokens_used': row['tokens_used'],
+                        'processing_time_ms': row['processing_time_ms'],
+                        'metadata': json.loads(metadata) if isinstance(metadata, str) else (metadata or {}),
+                        'created_at': row['created_at'].isoformat(),
+                    }).encode('utf-8') + b'\n')
+                    total += 1
+                    pending += 1
+                    if pending >= 5000:
+                        segments += await asyncio.to_thread(_write_segments, path, groups)
+                        groups, pending = [], 0
+                if current_lines:
+                    groups.append((current_id, current_lines))
+                if groups:
+                    segments += await asyncio.to_thread(_write_segments, path, groups)
+
+                # A conversation may be split across writes; keep every piece
+                await conn.executemany("""
+                    INSERT INTO public.message_archive_segments
+                        (archive_id, conversation_id, byte_offset, byte_length, message_count)
+                    SELECT $1, $2, $3, $4, $5
+                    WHERE EXISTS (SELECT 1 FROM public.conversations WHERE id = $2)
+                """, [(archive_id, *segment) for segment in segments])
+                await conn.execute(
+                    "UPDATE public.message_archives SET row_count = COALESCE(row_count, 0) + $2 WHERE id = $1",
+                    archive_id, total
+                )
+                await conn.execute(f"ALTER TABLE public.messages DETACH PARTITION public.{name}")
+                await conn.execute(f"DROP TABLE public.{name}")
+
+        logger.info(f"Archived partition {name}: {total} messages -> {path}")
+        return total
+
+    async def archive_old_partitions(self, older_than_months: int = ARCHIVE_AFTER_MONTHS) -> List[str]:
+        """Archive every partition whose range ended ``older_than_months`` ago"""
+        if older_than_months <= 0:
+            return []
+        cutoff = _add_months(_month_start(datetime.now(timezone.utc)), -older_than_months)
+        async with self.db.get_connection() as conn:
+            partitions = await list_partitions(conn)
+
+        archived = []
+        for name, month in partitions:
+            if _add_months(month, 1) <= cutoff:
+                await self.archive_partition(name)
+                archived.append(name)
+        return archived
+
+    async def load_conversation(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Archived messages of a conversation, oldest first (empty if none)
+
+        The segment list is read on every call and decoded segments are
+        cached under it, so a month archived later (by any process)
+        shows up at once.
+        """
+        try:
+            rows = await self.db.fetch("""
+                SELECT a.path, s.byte_offset, s.byte_length
+                FROM public.message_archive_segments s
+                JOIN public.message_archives a ON a.id = s.archive_id
+                WHERE s.conversation_id = $1
+                ORDER BY a.range_start, s.byte_offset
+            """, UUID(conversation_id))
+        except asyncpg.UndefinedTableError:
+            # Archive tables not migrated yet: nothing has been archived
+            return []
+        if not rows:
+            return []
+
+        segments = tuple((row['path'], row['byte_offset'], row['byte_length']) for row in rows)
+        cached = self._cache.get(conversation_id)
+        if cached is not None and cached[0] == segments:
+            self._cache.move_to_end(conversation_id)
+            return cached[1]
+
+        messages: List[Dict[str, Any]] = []
+        for path, offset, length in segments:
+            messages += await asyncio.to_thread(_read_segment, path, offset, length)
+
+        self._cache[conversation_id] = (segments, messages)
+        self._cache.move_to_end(conversation_id)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return messages
+
+    async def scrub_conversation(self, conversation_id: str) -> int:
+        """Erase a conversation's archived messages from disk; returns segments erased
+
+        Its segment rows are left for the caller to delete with the
+        conversation. The space is not reclaimed: the bytes are zeroed
+        in place so other conversations' byte ranges stay valid.
+        """
+        try:
+            rows = await self.db.fetch("""
+                SELECT a.path, s.byte_offset, s.byte_length
+                FROM public.message_archive_segments s
+                JOIN public.message_archives a ON a.id = s.archive_id
+                WHERE s.conversation_id = $1
+            """, UUID(conversation_id))
+        except asyncpg.UndefinedTableError:
+            return 0
+        for row in rows:
+            try:
+                await asyncio.to_thread(_scrub_segment, row['path'], row['byte_offset'], row['byte_length'])
+            except FileNotFoundError:
+                logger.warning(f"Archive file {row['path']} is missing; nothing to erase")
+        self._cache.pop(conversation_id, None)
+        return len(rows)
+
+    async def segments_for_user(self, user_id: str) -> Dict[str, List[Tuple[str, int, int]]]:
+        """Archive byte ranges for every conversation of a user (used by exports)"""
+        try:
+            rows = await self.db.fetch("""
+                SELECT s.conversation_id, a.path, s.byte_offset, s.byte_length
+                FROM public.message_archive_segments s
+                JOIN public.message_archives a ON a.id = s.archive_id
+                JOIN public.conversations c ON c.id = s.conversation_id
+                WHERE c.user_id = $1
+                ORDER BY a.range_start, s.byte_offset
+            """, UUID(user_id))
+        except asyncpg.UndefinedTableError:
+            return {}
+        segments: Dict[str, List[Tuple[str, int, int]]] = {}
+        for row in rows:
+            segments.setdefault(str(row['conversation_id']), []).append(
+                (row['path'], row['byte_offset'], row['byte_length'])
+            )
+        return segments
+
+    async def counts_for_user(self, user_id: str) -> Dict[str, int]:
+        """Archived message count of every conversation of a user"""
+        try:
+            rows = await self.db.fetch("""
+                SELECT s.conversation_id, SUM(s.message_count) AS message_count
+                FROM public.message_archive_segments s
+                JOIN public.conversations c ON c.id = s.conversation_id
+                WHERE c.user_id = $1
+                GROUP BY s.conversation_id
+            """, UUID(user_id))
+        except asyncpg.UndefinedTableError:
+            return {}
+        return {str(row['conversation_id']): row['message_count'] for row in rows}
+
+    @staticmethod
+    async def read_segments(segments: List[Tuple[str, int, int]]) -> List[Dict[str, Any]]:
+        messages: List[Dict[str, Any]] = []
+        for path, offset, length in segments:
+            messages += await asyncio.to_thread(_read_segment, path, offset, length)
+        return messages
+
+
+# === Scheduled maintenance ===
+async def run_partition_maintenance(archives: List[MessageArchive]) -> Dict[str, Dict[str, List[str]]]:
+    """Create upcoming partitions and archive expired ones on each database"""
+    results = {}
+    for archive in archives:
+        async with archive.db.get_connection() as conn:
+            if not await is_partitioned(conn):
+                results[archive.db.name] = {'created': [], 'archived': []}
+                continue
+            created = await ensure_future_partitions(conn)
+        archived = await archive.archive_old_partitions()
+        results[archive.db.name] = {'created': created, 'archived': archived}
+    return results
+
+
+async def partition_maintenance_loop(archives: List[MessageArchive], interval_s: int = MAINTENANCE_INTERVAL_S):
+    """Background task run for the lifetime of the app"""
+    while True:
+        try:
+            await run_partition_maintenance(archives)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Message partition maintenance failed: {e}")
+        await asyncio.sleep(interval_s)
@@ -0,0 +1,82 @@
+"""
+Prometheus metrics for NeuraFormAI
+HTTP route latency and cache hit/miss counts; everything registered is served at /metrics
+"""
+
+import time
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# === HTTP ===
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Time from request start until the last response byte is sent',
+    ['method', 'route', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress',
+    'Requests currently being handled',
+    ['method'],
+)
+
+# === Caches ===
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'In-process cache lookups; hit ratio = hit / (hit + miss)',
+    ['cache', 'result'],  # result is "hit" or "miss"
+)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template.
+
+    The route path (``/api/personas/{name}``) is used instead of the raw
+    URL to keep label cardinality bounded. Streaming responses are timed
+    until their final body chunk, not just their headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        start = time.perf_counter()
+        status = {'code': 500}
+        observed = False
+
+        def observe():
+            nonlocal observed
+            if observed:
+                return
+            observed = True
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            HTTP_REQUEST_DURATION.labels(method=method, route=path, status=str(status['code'])).observe(
+                time.perf_counter() - start
+            )
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                observe()
+
+        HTTP_REQUESTS_IN_PROGRESS.labels(method=method).inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.labels(method=method).dec()
+            observe()
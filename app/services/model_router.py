@@ -0,0 +1,273 @@
+"""
+Model router for NeuraFormAI
+Picks the LLM for each turn from rolling per-model latency, error rate and price
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "openai/gpt-3.5-turbo")
+# Candidate models, e.g. "openai/gpt-4o-mini,anthropic/claude-3-haiku"; defaults to OPENAI_MODEL alone
+LLM_MODELS = [m.strip() for m in os.getenv("LLM_MODELS", "").split(",") if m.strip()] or [DEFAULT_MODEL]
+# fastest: lowest median reply latency; cheapest: lowest price among models meeting the latency SLO.
+# Completions are not streamed, so latency is the whole request, not the time to the first token
+LLM_ROUTING_POLICY = os.getenv("LLM_ROUTING_POLICY", "fastest").lower()
+LLM_LATENCY_SLO_S = float(os.getenv("LLM_LATENCY_SLO_S", "8.0"))
+# Models failing more than this share of recent requests are ranked last
+LLM_MAX_ERROR_RATE = float(os.getenv("LLM_MAX_ERROR_RATE", "0.3"))
+# Outcomes older than this no longer count, so a demoted model gets retried eventually
+LLM_ERROR_WINDOW_S = int(os.getenv("LLM_ERROR_WINDOW_S", "300"))
+# Share of turns sent to a random healthy candidate so every model keeps fresh stats
+LLM_EXPLORE_RATE = float(os.getenv("LLM_EXPLORE_RATE", "0.05"))
+LLM_CATALOG_URL = os.getenv("LLM_CATALOG_URL", "https://openrouter.ai/api/v1/models")
+LLM_CATALOG_REFRESH_S = int(os.getenv("LLM_CATALOG_REFRESH_S", "3600"))
+
+POLICIES = ("fastest", "cheapest")
+
+# Requests remembered per model
+_STATS_WINDOW = 100
+# Below this many samples a model's latency is unknown, not measured
+_MIN_SAMPLES = 5
+# Typical completion length used to estimate a reply's price
+_EXPECTED_COMPLETION_TOKENS = 150
+_EXPECTED_PROMPT_TOKENS = 1500
+
+MODEL_ROUTES = Counter(
+    'llm_model_routes_total',
+    'Turns routed to each model',
+    ['model', 'policy', 'reason'],  # reason is "persona", "policy" or "explore"
+)
+MODEL_HEALTHY = Gauge('llm_model_healthy', 'Whether the router considers a candidate model healthy', ['model'])
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class ModelStats:
+    """Rolling outcome window for one model plus its catalog price"""
+
+    def __init__(self, model: str):
+        self.model = model
+        # Seconds per successful request, sent to response read
+        self.latency: Deque[float] = deque(maxlen=_STATS_WINDOW)
+        # (time.monotonic(), ok)
+        self.outcomes: Deque[Tuple[float, bool]] = deque(maxlen=_STATS_WINDOW)
+        # USD per token, from the catalog
+        self.prompt_price: Optional[float] = None
+        self.completion_price: Optional[float] = None
+        self.in_catalog = True
+
+    def record(self, ok: bool, latency: Optional[float] = None):
+        self.outcomes.append((time.monotonic(), ok))
+        if ok and latency is not None:
+            self.latency.append(latency)
+
+    @property
+    def measured(self) -> bool:
+        return len(self.latency) >= _MIN_SAMPLES
+
+    def error_rate(self) -> float:
+        since = time.monotonic() - LLM_ERROR_WINDOW_S
+        recent = [ok for at, ok in self.outcomes if at >= since]
+        if len(recent) < _MIN_SAMPLES:
+            return 0.0
+        return recent.count(False) / len(recent)
+
+    def healthy(self) -> bool:
+        return self.in_catalog and self.error_rate() <= LLM_MAX_ERROR_RATE
+
+    def latency_p50(self) -> Optional[float]:
+        return _percentile(list(self.latency), 0.5) if self.latency else None
+
+    def latency_p95(self) -> Optional[float]:
+        return _percentile(list(self.latency), 0.95) if self.latency else None
+
+    def expected_reply_s(self) -> Optional[float]:
+        """Median reply latency, once enough replies were measured"""
+        return self.latency_p50() if self.measured else None
+
+    def expected_cost(self) -> Optional[float]:
+        if self.prompt_price is None or self.completion_price is None:
+            return None
+        return self.prompt_price * _EXPECTED_PROMPT_TOKENS + self.completion_price * _EXPECTED_COMPLETION_TOKENS
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.latency_p50(), self.latency_p95()
+        return {
+            "model": self.model,
+            "healthy": self.healthy(),
+            "in_catalog": self.in_catalog,
+            "requests": len(self.outcomes),
+            "error_rate": round(self.error_rate(), 3),
+            "latency_p50_s": round(p50, 3) if p50 is not None else None,
+            "latency_p95_s": round(p95, 3) if p95 is not None else None,
+            "prompt_price": self.prompt_price,
+            "completion_price": self.completion_price,
+        }
+
+
+class ModelRouter:
+    """Ranks candidate models for each turn.
+
+    ``rank`` returns every candidate, best first: the caller sends the
+    turn to the first one and keeps the rest as fallbacks. A persona
+    may name a preferred ``model`` (used while it is healthy) and a
+    ``model_policy``. Unhealthy models (high error rate over the last
+    ``LLM_ERROR_WINDOW_S``, or gone from the catalog) rank last until
+    their errors age out. Models without enough samples rank after
+    measured ones under ``fastest`` and are tried now and then via
+    ``explore_rate`` so their stats do not go stale.
+    """
+
+    def __init__(self, models: Optional[List[str]] = None, policy: str = LLM_ROUTING_POLICY,
+                 explore_rate: float = LLM_EXPLORE_RATE, latency_slo_s: float = LLM_LATENCY_SLO_S):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown routing policy '{policy}', expected one of {POLICIES}")
+        self.policy = policy
+        self.explore_rate = explore_rate
+        self.latency_slo_s = latency_slo_s
+        self._stats: Dict[str, ModelStats] = {}
+        self.candidates: List[str] = []
+        self.set_candidates(models or LLM_MODELS)
+        self._task: Optional[asyncio.Task] = None
+
+    def stats(self, model: str) -> ModelStats:
+        if model not in self._stats:
+            self._stats[model] = ModelStats(model)
+        return self._stats[model]
+
+    def set_candidates(self, models: List[str]):
+        self.candidates = list(dict.fromkeys(models))
+        for model in self.candidates:
+            self.stats(model)
+
+    # === Feedback from the OpenRouter client ===
+    def record(self, model: str, ok: bool, latency: Optional[float] = None):
+        stats = self.stats(model)
+        stats.record(ok, latency)
+        MODEL_HEALTHY.labels(model=model).set(1 if stats.healthy() else 0)
+
+    # === Policies ===
+    def _by_speed(self, models: List[str]) -> List[str]:
+        def key(model):
+            reply = self.stats(model).expected_reply_s()
+            return (reply is None, reply or 0.0)
+        return sorted(models, key=key)
+
+    def _by_price(self, models: List[str]) -> List[str]:
+        def key(model):
+            stats = self.stats(model)
+            p95 = stats.latency_p95() if stats.measured else None
+            meets_slo = p95 is None or p95 <= self.latency_slo_s
+            cost = stats.expected_cost()
+            return (not meets_slo, cost is None, cost or 0.0)
+        return sorted(models, key=key)
+
+    def _ordered(self, policy: str) -> Tuple[List[str], List[str]]:
+        """(healthy models in policy order, unhealthy models by speed)"""
+        healthy = [m for m in self.candidates if self.stats(m).healthy()]
+        unhealthy = [m for m in self.candidates if m not in healthy]
+        ordered = self._by_price(healthy) if policy == "cheapest" else self._by_speed(healthy)
+        return ordered, self._by_speed(unhealthy)
+
+    def ranking(self, policy: Optional[str] = None) -> List[str]:
+        """Candidates in policy order, for display: unlike rank() nothing is explored or counted"""
+        ordered, unhealthy = self._ordered(policy if policy in POLICIES else self.policy)
+        return ordered + unhealthy
+
+    def rank(self, preferred_model: Optional[str] = None, policy: Optional[str] = None) -> List[str]:
+        """Candidate models for one turn, best first"""
+        policy = policy if policy in POLICIES else self.policy
+        ordered, unhealthy = self._ordered(policy)
+
+        reason = "policy"
+        if preferred_model and self.stats(preferred_model).healthy():
+            ordered = [preferred_model] + [m for m in ordered if m != preferred_model]
+            reason = "persona"
+        elif len(ordered) > 1 and random.random() < self.explore_rate:
+            pick = random.choice(ordered[1:])
+            ordered = [pick] + [m for m in ordered if m != pick]
+            reason = "explore"
+        ordered += unhealthy
+        if preferred_model and preferred_model not in ordered:
+            ordered.append(preferred_model)
+
+        MODEL_ROUTES.labels(model=ordered[0], policy=policy, reason=reason).inc()
+        return ordered
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "latency_slo_s": self.latency_slo_s,
+            "models": [self.stats(m).snapshot() for m in self.candidates],
+        }
+
+    # === Catalog ===
+    async def refresh_catalog(self) -> int:
+        """Update prices and availability from the OpenRouter model list; returns candidates found"""
+        async with httpx.AsyncClient(timeout=15.0) as client:
+            response = await client.get(LLM_CATALOG_URL)
+            response.raise_for_status()
+            catalog = {entry["id"]: entry for entry in response.json().get("data", [])}
+
+        found = 0
+        for model in self.candidates:
+            stats = self.stats(model)
+            entry = catalog.get(model)
+            stats.in_catalog = entry is not None
+            if entry is None:
+                logger.warning("⚠️ Model %s is no longer in the OpenRouter catalog", model)
+                continue
+            found += 1
+            pricing = entry.get("pricing") or {}
+            try:
+                stats.prompt_price = float(pricing.get("prompt"))
+                stats.completion_price = float(pricing.get("completion"))
+            except (TypeError, ValueError):
+                stats.prompt_price = stats.completion_price = None
+            MODEL_HEALTHY.labels(model=model).set(1 if stats.healthy() else 0)
+        return found
+
+    # === Background task ===
+    async def _run(self) -> None:
+        while True:
+            try:
+                found = await self.refresh_catalog()
+                logger.info("Model catalog refreshed: %s/%s candidates listed", found, len(self.candidates))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("❌ Model catalog refresh failed: %s", e)
+            await asyncio.sleep(LLM_CATALOG_REFRESH_S)
+
+    async def start(self) -> None:
+        if self._task is None and LLM_CATALOG_REFRESH_S > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global model router
+model_router = ModelRouter()
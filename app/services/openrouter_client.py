@@ -0,0 +1,412 @@
+"""
+Resilient OpenRouter client for NeuraFormAI
+Retries, hedged requests, per-model circuit breakers and fallback models
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.helpers.turn_timing import current_turn
+from app.services.model_router import model_router
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+API_KEY = os.getenv("OPENAI_API_KEY")
+API_BASE = os.getenv("OPENAI_API_BASE", "https://openrouter.ai/api")
+
+HEADERS = {
+    "Authorization": f"Bearer {API_KEY}",
+    "Content-Type": "application/json",
+    "HTTP-Referer": "http://localhost",
+    "X-Title": "NeuraPalAI",
+}
+
+# Tried in order after the requested model, e.g. "anthropic/claude-3-haiku,mistralai/mistral-7b-instruct"
+LLM_FALLBACK_MODELS = [m.strip() for m in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+# Retries per model on 429 / 5xx / transport errors
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "8"))
+# Whole-call budget across retries and fallbacks
+LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "60"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "45"))
+# Send a second identical request if the first is slower than the model's p95
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() == "true"
+LLM_HEDGE_MIN_DELAY_S = float(os.getenv("LLM_HEDGE_MIN_DELAY_S", "1.0"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+
+# Latency samples kept per model for the hedge delay
+_LATENCY_WINDOW = 200
+_HEDGE_MIN_SAMPLES = 20
+_RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Client errors that mean "this model, not this request", e.g. a retired model
+_MODEL_UNAVAILABLE_STATUS = {404, 410}
+
+# === Instrumentation ===
+_LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0)
+OPENROUTER_TTFB = Histogram(
+    'openrouter_ttfb_seconds',
+    'Time until OpenRouter response headers arrive',
+    ['model'],
+    buckets=_LLM_BUCKETS,
+)
+OPENROUTER_DURATION = Histogram(
+    'openrouter_request_duration_seconds',
+    'Single OpenRouter HTTP request time',
+    ['model', 'outcome'],  # outcome is "ok" or "error"
+    buckets=_LLM_BUCKETS,
+)
+OPENROUTER_TOKENS = Counter(
+    'openrouter_tokens_total',
+    'Tokens reported by OpenRouter usage',
+    ['model', 'kind'],  # kind is "prompt" or "completion"
+)
+OPENROUTER_ERRORS = Counter(
+    'openrouter_errors_total',
+    'Failed OpenRouter HTTP requests',
+    ['model', 'reason'],  # HTTP status code, or the exception class for transport errors
+)
+OPENROUTER_RETRIES = Counter('openrouter_retries_total', 'Retried OpenRouter requests', ['model'])
+OPENROUTER_HEDGES = Counter(
+    'openrouter_hedges_total',
+    'Hedged OpenRouter requests',
+    ['model', 'winner'],  # winner is "primary" or "hedge"
+)
+OPENROUTER_FALLBACKS = Counter(
+    'openrouter_fallbacks_total',
+    'Completions served by a fallback model',
+    ['model'],
+)
+OPENROUTER_BREAKER_STATE = Gauge(
+    'openrouter_circuit_state',
+    'Per-model circuit breaker state (0 closed, 1 half-open, 2 open)',
+    ['model'],
+)
+
+
+class LLMUnavailableError(Exception):
+    """Raised when no model could produce a completion in time.
+
+    API layers translate this into a 503 with Retry-After.
+    """
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _RetryableError(Exception):
+    def __init__(self, reason: str, retry_after: Optional[float] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ModelUnavailableError(Exception):
+    """The model refused the request for its own reasons; try the next one"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _model_unavailable(response: httpx.Response) -> bool:
+    """404/410, or a 400 whose error names the model (e.g. "not a valid model ID")"""
+    if response.status_code in _MODEL_UNAVAILABLE_STATUS:
+        return True
+    if response.status_code != 400:
+        return False
+    try:
+        error = response.json().get("error") or {}
+        message = error.get("message", "") if isinstance(error, dict) else str(error)
+    except (ValueError, AttributeError):
+        return False
+    return "model" in message.lower()
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds; accepts delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, calls are refused for ``cooldown_s``; after that one
+    probe is let through (half-open). Its success closes the breaker,
+    its failure re-opens it for another cooldown.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, model: str, failure_threshold: int = LLM_BREAKER_FAILURES,
+                 cooldown_s: float = LLM_BREAKER_COOLDOWN_S):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = self.CLOSED
+        self._probing = False
+
+    def _set_state(self, state: int):
+        if state != self.state:
+            logger.warning("⚠️ Circuit for %s: %s -> %s (0 closed, 1 half-open, 2 open)", self.model, self.state, state)
+        self.state = state
+        OPENROUTER_BREAKER_STATE.labels(model=self.model).set(state)
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker will admit a probe"""
+        return max(0.0, self.opened_at + self.cooldown_s - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self.retry_in() == 0:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        """Let another caller probe a half-open breaker"""
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+
+class OpenRouterClient:
+    """Chat completions with retries, hedging, circuit breakers and fallbacks.
+
+    ``complete`` tries the payload's model and then each fallback model.
+    Per model, 429/5xx responses and transport errors are retried with
+    full-jitter exponential backoff, waiting at least the server's
+    Retry-After. A 404/410, or a 400 naming the model, moves straight on
+    to the next model; other 4xx responses are the request's fault and
+    are raised as is. With hedging on, a second identical request starts once
+    the first has taken longer than that model's recent p95; whichever
+    answers first wins and the other is cancelled. Models whose breaker
+    is open are skipped. Everything runs within ``deadline_s``.
+    """
+
+    def __init__(self, fallback_models: Optional[List[str]] = None, max_retries: int = LLM_MAX_RETRIES,
+                 deadline_s: float = LLM_DEADLINE_S, hedge: bool = LLM_HEDGE):
+        self.fallback_models = LLM_FALLBACK_MODELS if fallback_models is None else fallback_models
+        self.max_retries = max_retries
+        self.deadline_s = deadline_s
+        self.hedge = hedge
+        self._http: Optional[httpx.AsyncClient] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    # === Shared state ===
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=API_BASE,
+                headers=HEADERS,
+                timeout=httpx.Timeout(LLM_TIMEOUT_S, connect=5.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(model)
+        return self._breakers[model]
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        samples = self._latencies.get(model)
+        if not self.hedge or not samples or len(samples) < _HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return max(LLM_HEDGE_MIN_DELAY_S, ordered[int(len(ordered) * 0.95) - 1])
+
+    # === One HTTP request ===
+    async def _attempt(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        """POST once; returns (response json, seconds to headers)"""
+        model = payload["model"]
+        start = time.perf_counter()
+        try:
+            async with self._client().stream("POST", "/chat/completions", json=payload) as response:
+                ttfb = time.perf_counter() - start
+                OPENROUTER_TTFB.labels(model=model).observe(ttfb)
+                await response.aread()
+            if response.status_code in _RETRYABLE_STATUS:
+                raise _RetryableError(str(response.status_code),
+                                      _parse_retry_after(response.headers.get("retry-after")))
+            if _model_unavailable(response):
+                raise _ModelUnavailableError(str(response.status_code))
+            response.raise_for_status()
+            result = response.json()
+        except Exception as e:
+            if isinstance(e, (_RetryableError, _ModelUnavailableError)):
+                reason = e.reason
+            elif isinstance(e, httpx.HTTPStatusError):
+                reason = str(e.response.status_code)
+            else:
+                reason = type(e).__name__
+            OPENROUTER_ERRORS.labels(model=model, reason=reason).inc()
+            OPENROUTER_DURATION.labels(model=model, outcome="error").observe(time.perf_counter() - start)
+            # A bad request would fail on any model, so it says nothing about this one
+            if not isinstance(e, httpx.HTTPStatusError):
+                model_router.record(model, ok=False)
+            if isinstance(e, httpx.TransportError):
+                raise _RetryableError(reason) from e
+            raise
+
+        duration = time.perf_counter() - start
+        OPENROUTER_DURATION.labels(model=model, outcome="ok").observe(duration)
+        self._latencies.setdefault(model, deque(maxlen=_LATENCY_WINDOW)).append(duration)
+        model_router.record(model, ok=True, latency=duration)
+        return result, ttfb
+
+    async def _hedged_attempt(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        """_attempt, plus a second copy if the first runs past the hedge delay"""
+        delay = self._hedge_delay(payload["model"])
+        if delay is None:
+            return await self._attempt(payload)
+
+        primary = asyncio.create_task(self._attempt(payload))
+        pending = {primary}
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                hedged = True
+                pending.add(asyncio.create_task(self._attempt(payload)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            winner = "primary" if task is primary else "hedge"
+                            OPENROUTER_HEDGES.labels(model=payload["model"], winner=winner).inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    # === Retries for one model ===
+    async def _complete_with_model(self, payload: Dict[str, Any], deadline: float) -> Tuple[Dict[str, Any], float]:
+        model = payload["model"]
+        breaker = self.breaker(model)
+        attempt = 0
+        while True:
+            try:
+                result = await asyncio.wait_for(self._hedged_attempt(payload), timeout=deadline - time.monotonic())
+            except (_RetryableError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                retry_after = getattr(e, "retry_after", None)
+                backoff = random.uniform(0, min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_BASE_S * 2 ** attempt))
+                wait = max(backoff, retry_after or 0)
+                if attempt >= self.max_retries or breaker.state == breaker.OPEN or time.monotonic() + wait >= deadline:
+                    raise
+                attempt += 1
+                OPENROUTER_RETRIES.labels(model=model).inc()
+                logger.warning("⚠️ %s failed (%s); retry %s/%s in %.2fs", model, str(e) or "timeout", attempt, self.max_retries, wait)
+                await asyncio.sleep(wait)
+                continue
+            except _ModelUnavailableError:
+                # Retrying will not bring the model back
+                breaker.record_failure()
+                raise
+            except BaseException:
+                # Bad request or cancelled caller: not a provider failure
+                breaker.release_probe()
+                raise
+            breaker.record_success()
+            return result
+
+    # === Public API ===
+    async def complete(self, payload: Dict[str, Any], models: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Chat completion for ``payload``, falling back to other models on failure.
+
+        ``models`` is the order to try, e.g. from the model router; the
+        configured fallback models are appended to it.
+        """
+        timings = current_turn()
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.deadline_s
+        models = list(dict.fromkeys((models or [payload["model"]]) + self.fallback_models))
+        last_error: Optional[BaseException] = None
+
+        try:
+            for model in models:
+                if time.monotonic() >= deadline:
+                    break
+                breaker = self.breaker(model)
+                if not breaker.allow():
+                    logger.warning("⚠️ Skipping %s: circuit open for another %.0fs", model, breaker.retry_in())
+                    continue
+                try:
+                    result, ttfb = await self._complete_with_model({**payload, "model": model}, deadline)
+                except (_RetryableError, _ModelUnavailableError, asyncio.TimeoutError) as e:
+                    last_error = e
+                    logger.error("❌ %s unavailable: %s", model, str(e) or "timeout")
+                    continue
+
+                # Time to headers of the request that produced the answer
+                timings.add("llm_ttfb", ttfb * 1000)
+                if model != models[0]:
+                    OPENROUTER_FALLBACKS.labels(model=model).inc()
+                usage = result.get("usage") or {}
+                OPENROUTER_TOKENS.labels(model=model, kind="prompt").inc(usage.get("prompt_tokens", 0))
+                OPENROUTER_TOKENS.labels(model=model, kind="completion").inc(usage.get("completion_tokens", 0))
+                result.setdefault("model", model)
+                return result
+        finally:
+            timings.add("llm_total", (time.perf_counter() - start) * 1000)
+
+        retry_after = min((self.breaker(m).retry_in() for m in models), default=0)
+        reason = "all circuits open" if last_error is None else str(last_error) or "deadline exceeded"
+        raise LLMUnavailableError(
+            f"No model available for completion ({reason})",
+            retry_after=max(1, int(retry_after + 0.999)),
+        )
+
+
+# Global OpenRouter client
+openrouter_client = OpenRouterClient()
@@ -1,6 +1,9 @@
+import logging
 from pathlib import Path
 from app.helpers.persona_loader import load_persona_metadata
 
+logger = logging.getLogger(__name__)
+
 class PersonaManager:
     """
     Handles listing personas and managing the active persona per user.
@@ -47,7 +50,7 @@ class PersonaManager:
 
         selected_file = matches[0]["file"]
         cls._active_personas[user_id] = selected_file
-        print(f"🔄 Persona for user {user_id} switched to {selected_file}")
+        logger.info("🔄 Persona for user %s switched to %s", user_id, selected_file)
 
     # === Get the active persona file path for a user ===
     @classmethod
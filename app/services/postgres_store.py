@@ -0,0 +1,600 @@
+"""
+Postgres conversation store for NeuraFormAI
+Conversations and messages in Postgres, sharded by user, with archived partitions
+"""
+
+import json
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional, AsyncIterator
+from uuid import UUID, uuid4
+from dotenv import load_dotenv
+from app.config.sharding import shard_router
+from app.services.conversation_store import ConversationStore
+from app.services.conversation_purger import purge_loop
+from app.services.message_archive import partition_maintenance_loop
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class PostgresConversationStore(ConversationStore):
+    """Conversations and messages in Postgres
+    
+    Every query runs on a pooled connection of the shard that owns the
+    user (see app/config/sharding.py). Calls that only know a
+    conversation id accept an optional ``user_id`` to avoid looking the
+    owning shard up.
+    """
+    
+    uses_postgres = True
+    
+    def __init__(self):
+        self.router = shard_router
+        self._tasks: List[asyncio.Task] = []
+    
+    async def initialize(self):
+        """Open shard pools and start background maintenance (the primary pool comes from init_database)"""
+        await self.router.initialize()
+        self._tasks = [
+            asyncio.create_task(partition_maintenance_loop(list(self.router.archives.values()))),
+            asyncio.create_task(purge_loop(self)),
+        ]
+    
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await self.router.close()
+    
+    async def _conversation_shard(self, conversation_id: str, user_id: Optional[str] = None) -> Optional[str]:
+        """Shard that stores a conversation, or None if it doesn't exist"""
+        return await self.router.shard_for_conversation(conversation_id, user_id)
+    
+    async def get_or_create_conversation(self, user_id: str, persona_name: str) -> str:
+        """Get existing conversation or create new one for user-persona pair"""
+        shard = await self.router.shard_for_user(user_id)
+        async with self.router.database(shard).get_connection() as conn:
+            # First try to find existing active conversation
+            query = """
+                SELECT c.id 
+                FROM conversations c
+                JOIN personas p ON c.persona_id = p.id
+                WHERE c.user_id = $1 AND LOWER(p.name) = LOWER($2) AND c.is_active = true
+                  AND c.deleted_at IS NULL
+                LIMIT 1
+            """
+            result = await conn.fetchrow(query, UUID(user_id), persona_name)
+            
+            if result:
+                self.router.remember_conversation(str(result['id']), shard)
+                return str(result['id'])
+            
+            # No existing conversation, create new one
+            # First get persona_id
+            persona_query = "SELECT id FROM personas WHERE LOWER(name) = LOWER($1) LIMIT 1"
+            persona_result = await conn.fetchrow(persona_query, persona_name)
+            
+            if not persona_result:
+                # Create persona record if it doesn't exist
+                persona_id = uuid4()
+                insert_persona_query = """
+                    INSERT INTO personas (id, name, display_name, description, personality_config)
+                    VALUES ($1, $2, $3, $4, $5)
+                    RETURNING id
+                """
+                persona_result = await conn.fetchrow(
+                    insert_persona_query, 
+                    persona_id, 
+                    persona_name, 
+                    persona_name.title(), 
+                    f"AI persona named {persona_name}",
+                    json.dumps({})  # Convert dict to JSON string
+                )
+            
+            # Create new conversation
+            conversation_id = uuid4()
+            insert_query = """
+                INSERT INTO conversations (id, user_id, persona_id, title, is_active)
+                VALUES ($1, $2, $3, $4, true)
+                RETURNING id
+            """
+            title = f"Chat with {persona_name.title()}"
+            result = await conn.fetchrow(
+                insert_query, 
+                conversation_id, 
+                UUID(user_id), 
+                persona_result['id'], 
+                title
+            )
+            
+        # Pin the user so adding shards later doesn't strand this conversation
+        await self.router.pin_user(user_id, shard)
+        self.router.remember_conversation(str(result['id']), shard)
+        return str(result['id'])
+
+    async def get_conversation_for_persona(self, user_id: str, persona_name: str) -> Optional[str]:
+        """Get existing conversation ID for user-persona pair (without creating)"""
+        async with self.router.connection_for_user(user_id) as conn:
+            query = """
+                SELECT c.id 
+                FROM conversations c
+                JOIN personas p ON c.persona_id = p.id
+                WHERE c.user_id = $1 AND LOWER(p.name) = LOWER($2) AND c.is_active = true
+                  AND c.deleted_at IS NULL
+                LIMIT 1
+            """
+            result = await conn.fetchrow(query, UUID(user_id), persona_name)
+            
+            return str(result['id']) if result else None
+    
+    async def save_message(self, conversation_id: str, sender_type: str, content: str, 
+                          user_id: str = None, persona_id: str = None, tokens_used: int = None,
+                          processing_time_ms: int = None, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Save a message to the database"""
+        shard = await self._conversation_shard(conversation_id)
+        if shard is None:
+            raise ValueError(f"Conversation {conversation_id} not found")
+        async with self.router.database(shard).get_connection() as conn:
+            message_id = uuid4()
+            query = """
+                INSERT INTO messages (
+                    id, conversation_id, sender_type, content, 
+                    user_id, ai_persona_id, tokens_used, processing_time_ms, metadata
+                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                RETURNING id
+            """
+            
+            result = await conn.fetchrow(
+                query,
+                message_id,
+                UUID(conversation_id),
+                sender_type,
+                content,
+                UUID(user_id) if user_id else None,
+                UUID(persona_id) if persona_id else None,
+                tokens_used,
+                processing_time_ms,
+                json.dumps(metadata) if metadata else None
+            )
+            
+            # Update conversation's updated_at timestamp
+            update_query = """
+                UPDATE conversations 
+                SET updated_at = NOW() 
+                WHERE id = $1
+            """
+            await conn.execute(update_query, UUID(conversation_id))
+            
+            return str(result['id'])
+
+    async def add_message_timings(self, conversation_id: str, message_id: str,
+                                  timings: Dict[str, float]) -> bool:
+        """Merge stage timings into a message's metadata['timings']"""
+        shard = await self._conversation_shard(conversation_id)
+        if shard is None:
+            return False
+        result = await self.router.database(shard).execute("""
+            UPDATE messages
+            SET metadata = jsonb_set(
+                COALESCE(metadata, '{}'::jsonb), '{timings}',
+                COALESCE(metadata->'timings', '{}'::jsonb) || $3::jsonb
+            )
+            WHERE conversation_id = $1 AND id = $2
+        """, UUID(conversation_id), UUID(message_id), json.dumps(timings))
+        return result.split()[-1] != '0'
+
+    async def get_message(self, conversation_id: str, message_id: str,
+                          user_id: str) -> Optional[Dict[str, Any]]:
+        """One message of a user's (not deleted) conversation"""
+        shard = await self._conversation_shard(conversation_id, user_id)
+        if shard is None:
+            return None
+        row = await self.router.database(shard).fetchrow("""
+            SELECT m.id, m.sender_type, m.content, m.metadata
+            FROM messages m
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE m.conversation_id = $1 AND m.id = $2
+              AND c.user_id = $3 AND c.deleted_at IS NULL
+        """, UUID(conversation_id), UUID(message_id), UUID(user_id))
+        if row is None:
+            return None
+        metadata = row['metadata']
+        return {
+            'id': str(row['id']),
+            'sender_type': row['sender_type'],
+            'content': row['content'],
+            'metadata': json.loads(metadata) if isinstance(metadata, str) else (metadata or {}),
+        }
+
+    async def delete_message(self, conversation_id: str, message_id: str) -> bool:
+        """Remove one message from a conversation"""
+        shard = await self._conversation_shard(conversation_id)
+        if shard is None:
+            return False
+        result = await self.router.database(shard).execute(
+            "DELETE FROM messages WHERE conversation_id = $1 AND id = $2",
+            UUID(conversation_id), UUID(message_id),
+        )
+        return result.split()[-1] != '0'
+    
+    @staticmethod
+    def _archived_to_message(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape an archived message like a live row"""
+        return {
+            'id': record['id'],
+            'sender_type': record['sender_type'],
+            'content': record['content'],
+            'created_at': record['created_at'],
+            'tokens_used': record['tokens_used'],
+            'processing_time_ms': record['processing_time_ms'],
+            'metadata': record.get('metadata') or {},
+        }
+
+    async def get_conversation_messages(self, conversation_id: str, limit: int = 100,
+                                        user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get messages for a conversation, rehydrating archived history first"""
+        shard = await self._conversation_shard(conversation_id, user_id)
+        if shard is None:
+            return []
+
+        async with self.router.database(shard).get_connection() as conn:
+            # Deleted conversations stay hidden until the purger removes them
+            visible = await conn.fetchval(
+                "SELECT deleted_at IS NULL FROM conversations WHERE id = $1", UUID(conversation_id)
+            )
+            if not visible:
+                return []
+
+            archived = [
+                self._archived_to_message(record)
+                for record in (await self.router.archive(shard).load_conversation(conversation_id))[:limit]
+            ]
+            limit -= len(archived)
+            if limit <= 0:
+                return archived
+
+            query = """
+                SELECT 
+                    id,
+                    sender_type,
+                    content,
+                    created_at,
+                    tokens_used,
+                    processing_time_ms,
+                    metadata
+                FROM messages 
+                WHERE conversation_id = $1
+                ORDER BY created_at ASC
+                LIMIT $2
+            """
+            
+            results = await conn.fetch(query, UUID(conversation_id), limit)
+            
+            return archived + [
+                {
+                    'id': str(row['id']),
+                    'sender_type': row['sender_type'],
+                    'content': row['content'],
+                    'created_at': row['created_at'].isoformat(),
+                    'tokens_used': row['tokens_used'],
+                    'processing_time_ms': row['processing_time_ms'],
+                    'metadata': json.loads(row['metadata']) if isinstance(row['metadata'], str) else (row['metadata'] or {})
+                }
+                for row in results
+            ]
+
+    async def search_messages(self, user_id: str, query_text: str, persona_name: Optional[str] = None,
+                              limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Full-text search over a user's messages, best matches first.
+
+        Uses the generated ``content_tsv`` column and its GIN index. Results
+        are paged with a keyset cursor on (rank, id) so later pages cost the
+        same as the first.
+        """
+        after_rank, after_id = self._decode_search_cursor(cursor) if cursor else (None, None)
+        async with self.router.connection_for_user(user_id) as conn:
+            # Snippets are only built for the rows of the requested page (and the
+            # one extra row fetched to tell whether another page follows)
+            query = """
+                WITH q AS (
+                    SELECT websearch_to_tsquery('english', $2) AS tsq
+                ),
+                page AS (
+                    SELECT * FROM (
+                        SELECT
+                            m.id,
+                            m.conversation_id,
+                            m.sender_type,
+                            m.content,
+                            m.created_at,
+                            p.name AS persona_name,
+                            ts_rank(m.content_tsv, q.tsq) AS rank
+                        FROM messages m
+                        JOIN conversations c ON c.id = m.conversation_id
+                        LEFT JOIN personas p ON p.id = c.persona_id
+                        CROSS JOIN q
+                        WHERE c.user_id = $1
+                          AND c.deleted_at IS NULL
+                          AND m.content_tsv @@ q.tsq
+                          AND ($3::text IS NULL OR LOWER(p.name) = LOWER($3))
+                    ) hits
+                    WHERE $4::real IS NULL OR (hits.rank, hits.id) < ($4::real, $5::uuid)
+                    ORDER BY hits.rank DESC, hits.id DESC
+                    LIMIT $6
+                )
+                SELECT
+                    page.id,
+                    page.conversation_id,
+                    page.sender_type,
+                    page.created_at,
+                    page.persona_name,
+                    page.rank,
+                    ts_headline(
+                        'english', page.content, q.tsq,
+                        'StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2'
+                    ) AS snippet
+                FROM page CROSS JOIN q
+                ORDER BY page.rank DESC, page.id DESC
+            """
+
+            results = await conn.fetch(
+                query, UUID(user_id), query_text, persona_name, after_rank, after_id, limit + 1
+            )
+
+            next_cursor = None
+            if len(results) > limit:
+                results = results[:limit]
+                last = results[-1]
+                next_cursor = self._encode_search_cursor(last['rank'], str(last['id']))
+
+            return {
+                'results': [
+                    {
+                        'id': str(row['id']),
+                        'conversation_id': str(row['conversation_id']),
+                        'sender_type': row['sender_type'],
+                        'persona_name': row['persona_name'],
+                        'created_at': row['created_at'].isoformat(),
+                        'rank': row['rank'],
+                        'snippet': row['snippet'],
+                    }
+                    for row in results
+                ],
+                'next_cursor': next_cursor,
+            }
+
+
+    async def get_user_conversations(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get all conversations for a user with their titles and metadata"""
+        shard = await self.router.shard_for_user(user_id)
+        archived_counts = await self.router.archive(shard).counts_for_user(user_id)
+        async with self.router.database(shard).get_connection() as conn:
+            query = """
+                SELECT 
+                    c.id,
+                    c.title,
+                    c.created_at,
+                    c.updated_at,
+                    c.is_active,
+                    p.name as persona_name,
+                    COUNT(m.id) as message_count,
+                    MAX(m.created_at) as last_message_at
+                FROM conversations c
+                LEFT JOIN personas p ON c.persona_id = p.id
+                LEFT JOIN messages m ON c.id = m.conversation_id
+                WHERE c.user_id = $1 AND c.deleted_at IS NULL
+                GROUP BY c.id, c.title, c.created_at, c.updated_at, c.is_active, p.name
+                ORDER BY c.updated_at DESC
+            """
+            
+            results = await conn.fetch(query, UUID(user_id))
+            
+            return [
+                {
+                    'id': str(row['id']),
+                    'title': row['title'],
+                    'persona_name': row['persona_name'],
+                    'created_at': row['created_at'].isoformat(),
+                    'updated_at': row['updated_at'].isoformat(),
+                    'is_active': row['is_active'],
+                    'message_count': row['message_count'] + archived_counts.get(str(row['id']), 0),
+                    'last_message_at': row['last_message_at'].isoformat() if row['last_message_at'] else None
+                }
+                for row in results
+            ]
+
+    async def iter_user_history(self, user_id: str, batch_size: int = 500,
+                                shard: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a user's entire history as flat export records.
+
+        Yields a ``{"type": "conversation", ...}`` record before the
+        ``{"type": "message", ...}`` records belonging to it. Rows are read
+        in keyset-paginated batches of ``batch_size``, each on a pooled
+        connection held only for that query, so a slow reader never pins a
+        connection or an open transaction and memory stays bounded however
+        large the history is. ``shard`` reads a specific shard instead of
+        the user's current one (used when moving users).
+        """
+        conversation_query = """
+            SELECT
+                c.id,
+                c.title,
+                c.created_at,
+                c.updated_at,
+                c.is_active,
+                p.name AS persona_name
+            FROM conversations c
+            LEFT JOIN personas p ON c.persona_id = p.id
+            WHERE c.user_id = $1 AND c.deleted_at IS NULL
+              AND ($2::timestamptz IS NULL OR (c.created_at, c.id) > ($2, $3))
+            ORDER BY c.created_at, c.id
+            LIMIT $4
+        """
+        # Messages of one page of conversations, in page order; position 0 starts the page
+        message_query = """
+            SELECT
+                page.position,
+                m.id,
+                m.conversation_id,
+                m.sender_type,
+                m.content,
+                m.created_at,
+                m.tokens_used,
+                m.processing_time_ms,
+                m.metadata
+            FROM unnest($1::uuid[]) WITH ORDINALITY AS page(id, position)
+            JOIN messages m ON m.conversation_id = page.id
+            WHERE (page.position, m.created_at, m.id) > ($2, $3, $4)
+            ORDER BY page.position, m.created_at, m.id
+            LIMIT $5
+        """
+
+        shard = shard or await self.router.shard_for_user(user_id)
+        database = self.router.database(shard)
+        archive = self.router.archive(shard)
+        archived_segments = await archive.segments_for_user(user_id)
+
+        async def conversation_records(conversation) -> AsyncIterator[Dict[str, Any]]:
+            yield {
+                'type': 'conversation',
+                'id': str(conversation['id']),
+                'title': conversation['title'],
+                'persona_name': conversation['persona_name'],
+                'created_at': conversation['created_at'].isoformat(),
+                'updated_at': conversation['updated_at'].isoformat(),
+                'is_active': conversation['is_active'],
+            }
+            # Cold history precedes everything still in the database
+            for segment in archived_segments.get(str(conversation['id']), []):
+                for record in await archive.read_segments([segment]):
+                    yield {
+                        'type': 'message',
+                        'conversation_id': record['conversation_id'],
+                        **self._archived_to_message(record),
+                    }
+
+        after_created, after_id = None, None
+        while True:
+            async with database.get_connection() as conn:
+                conversations = await conn.fetch(
+                    conversation_query, UUID(user_id), after_created, after_id, batch_size
+                )
+            if not conversations:
+                return
+            after_created, after_id = conversations[-1]['created_at'], conversations[-1]['id']
+            page = [row['id'] for row in conversations]
+
+            # Conversations before ``started`` have had their record yielded
+            started = 0
+            position, message_created, message_id = 0, None, None
+            while True:
+                async with database.get_connection() as conn:
+                    messages = await conn.fetch(
+                        message_query, page, position, message_created, message_id, batch_size
+                    )
+                for row in messages:
+                    while started < row['position']:
+                        async for record in conversation_records(conversations[started]):
+                            yield record
+                        started += 1
+
+                    metadata = row['metadata']
+                    yield {
+                        'type': 'message',
+                        'id': str(row['id']),
+                        'conversation_id': str(row['conversation_id']),
+                        'sender_type': row['sender_type'],
+                        'content': row['content'],
+                        'created_at': row['created_at'].isoformat(),
+                        'tokens_used': row['tokens_used'],
+                        'processing_time_ms': row['processing_time_ms'],
+                        'metadata': json.loads(metadata) if isinstance(metadata, str) else (metadata or {}),
+                    }
+                if len(messages) < batch_size:
+                    break
+                position, message_created, message_id = (
+                    messages[-1]['position'], messages[-1]['created_at'], messages[-1]['id']
+                )
+
+            # Conversations after the last one with messages
+            for conversation in conversations[started:]:
+                async for record in conversation_records(conversation):
+                    yield record
+
+    async def update_conversation_title(self, conversation_id: str, title: str,
+                                        user_id: Optional[str] = None) -> bool:
+        """Update conversation title"""
+        shard = await self._conversation_shard(conversation_id, user_id)
+        if shard is None:
+            return False
+        async with self.router.database(shard).get_connection() as conn:
+            query = """
+                UPDATE conversations 
+                SET title = $1, updated_at = $2
+                WHERE id = $3 AND deleted_at IS NULL
+            """
+            
+            result = await conn.execute(query, title, datetime.utcnow(), UUID(conversation_id))
+            
+            # Check if any rows were affected
+            return result == "UPDATE 1"
+
+    async def delete_conversation(self, conversation_id: str, user_id: Optional[str] = None) -> bool:
+        """Soft-delete a conversation; its messages are purged in the background"""
+        shard = await self._conversation_shard(conversation_id, user_id)
+        if shard is None:
+            return False
+        async with self.router.database(shard).get_connection() as conn:
+            query = """
+                UPDATE conversations
+                SET deleted_at = NOW(), is_active = false
+                WHERE id = $1 AND deleted_at IS NULL
+            """
+            result = await conn.execute(query, UUID(conversation_id))
+            
+            # Check if any rows were affected
+            return result == "UPDATE 1"
+
+    async def purge_deleted(self, chunk_size: int, pause_s: float) -> int:
+        """Remove soft-deleted conversations shard by shard, ``chunk_size`` messages per statement
+
+        Messages already archived to disk are zeroed out of their archive
+        files as well, so purged content does not survive in cold storage.
+        """
+        purged = 0
+        for name, database in self.router.shards.items():
+            conversation_ids = await database.fetch("""
+                SELECT id FROM conversations
+                WHERE deleted_at IS NOT NULL
+                ORDER BY deleted_at
+                LIMIT 100
+            """)
+            for row in conversation_ids:
+                while True:
+                    # Each chunk commits on its own, so locks are held briefly
+                    result = await database.execute("""
+                        DELETE FROM messages m
+                        USING (
+                            SELECT id, created_at FROM messages
+                            WHERE conversation_id = $1
+                            LIMIT $2
+                        ) chunk
+                        WHERE m.id = chunk.id AND m.created_at = chunk.created_at
+                    """, row['id'], chunk_size)
+                    deleted = int(result.split()[-1])
+                    if deleted:
+                        await asyncio.sleep(pause_s)
+                    if deleted < chunk_size:
+                        break
+                # Erase archived copies first; their segment rows go with the
+                # conversation (ON DELETE CASCADE)
+                await self.router.archive(name).scrub_conversation(str(row['id']))
+                await database.execute(
+                    "DELETE FROM conversations WHERE id = $1 AND deleted_at IS NOT NULL", row['id']
+                )
+                purged += 1
+                logger.info(f"[{name}] purged deleted conversation {row['id']}")
+        return purged
+                
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+On-demand sampling profiler for NeuraFormAI
+Samples live thread stacks for a fixed window; nothing runs between requests
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import threading
+import traceback
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+def _short_path(filename: str) -> str:
+    filename = os.path.abspath(filename)
+    if filename.startswith(_REPO_DIR):
+        return os.path.relpath(filename, _REPO_DIR)
+    # Library frames: keep the path short but recognisable
+    return os.path.join(*filename.split(os.sep)[-2:])
+
+
+def _frame_label(frame) -> str:
+    return f"{frame.f_code.co_name} ({_short_path(frame.f_code.co_filename)})"
+
+
+def _collapse(frame) -> str:
+    """Root-to-leaf stack as semicolon-separated labels"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Collects thread stacks every ``interval_s`` for ``duration_s`` seconds.
+
+    Sampling happens on a short-lived daemon thread that reads
+    ``sys._current_frames()``; the event loop only awaits the window.
+    Results are aggregated as collapsed stacks (``a;b;c count`` lines),
+    the input format of flamegraph.pl and speedscope. Only one profile
+    runs at a time.
+    """
+
+    def __init__(self):
+        self._running = False
+
+    @staticmethod
+    def _sample(stop: threading.Event, interval_s: float, thread_ids: Optional[set], stacks: Counter,
+                names: Dict[int, str]) -> int:
+        own_id = threading.get_ident()
+        samples = 0
+        while not stop.wait(interval_s):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (thread_ids is not None and thread_id not in thread_ids):
+                    continue
+                stacks[f"{names.get(thread_id, thread_id)};{_collapse(frame)}"] += 1
+            samples += 1
+        return samples
+
+    async def profile(self, duration_s: float, interval_ms: int = 10, all_threads: bool = False) -> Dict[str, Any]:
+        if self._running:
+            raise ProfilerBusyError("A profile is already running")
+        self._running = True
+        try:
+            loop_thread = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            names[loop_thread] = 'event-loop'
+            stacks: Counter = Counter()
+            stop = threading.Event()
+            result: Dict[str, int] = {}
+
+            def run():
+                result['samples'] = self._sample(
+                    stop, interval_ms / 1000, None if all_threads else {loop_thread}, stacks, names
+                )
+
+            sampler = threading.Thread(target=run, name='sampling-profiler', daemon=True)
+            logger.info(f"Profiling for {duration_s}s every {interval_ms}ms (all_threads={all_threads})")
+            sampler.start()
+            try:
+                await asyncio.sleep(duration_s)
+            finally:
+                stop.set()
+                await asyncio.to_thread(sampler.join)
+
+            collapsed = '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common())
+            return {
+                'duration_s': duration_s,
+                'interval_ms': interval_ms,
+                'samples': result.get('samples', 0),
+                'collapsed': collapsed,
+            }
+        finally:
+            self._running = False
+
+
+def dump_tasks(stack_limit: int = 20) -> List[Dict[str, Any]]:
+    """Every pending asyncio task with the coroutine stack it is suspended in"""
+    tasks = []
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        frames = traceback.StackSummary.extract(
+            ((frame, frame.f_lineno) for frame in task.get_stack(limit=stack_limit)), lookup_lines=False
+        )
+        tasks.append({
+            'name': task.get_name(),
+            'coroutine': getattr(coro, '__qualname__', repr(coro)),
+            'stack': [f"{_short_path(f.filename)}:{f.lineno} in {f.name}" for f in frames],
+        })
+    return sorted(tasks, key=lambda task: task['coroutine'])
+
+
+# Global profiler
+sampling_profiler = SamplingProfiler()
@@ -0,0 +1,214 @@
+"""
+Shard rebalancing for NeuraFormAI
+Moves users' conversations between shards while the app keeps serving them
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+from uuid import UUID
+
+import asyncpg
+
+from app.config.database import db
+from app.config.sharding import PRIMARY_SHARD, SHARD_MAP_TTL, shard_router
+from app.services.conversation_import import ConversationImporter
+from app.services.postgres_store import PostgresConversationStore
+
+logger = logging.getLogger(__name__)
+
+
+class ShardRebalancer:
+    """Copies users to a new shard, re-pins them, then removes the old copy.
+
+    A move copies the user's full history (archived messages included),
+    switches the pin in ``user_shards`` and waits out the shard-map
+    cache TTL so every app process has picked up the new placement.
+    The move is then finished under a per-user write lock on the old
+    shard: the user's conversation and message rows there are locked
+    ``FOR UPDATE``, which holds back late writes (new messages, title
+    changes, soft-deletes, message deletes). Under that lock it copies
+    new rows, applies title and deletion changes to the new copy,
+    removes messages the old shard no longer has, and deletes the old
+    rows in the same transaction. A write that was held back fails
+    instead of landing on rows that are gone. Copies skip rows that
+    already exist, so an interrupted move can simply be run again.
+    """
+
+    def __init__(self, router=shard_router, batch_size: int = 5000):
+        self.router = router
+        self.batch_size = batch_size
+        self.conversations = PostgresConversationStore()
+
+    # === Setup ===
+    async def prepare_shards(self) -> Dict[str, int]:
+        """Make an existing deployment shard-ready.
+
+        Users live on the primary only, so foreign keys to ``users`` are
+        dropped on the other shards. Every user who already has
+        conversations is pinned to the shard holding them, so the hash
+        ring only places users who are new.
+        """
+        pinned = {}
+        for name, database in self.router.shards.items():
+            async with database.get_connection(statement_timeout_ms=0) as conn:
+                if name != PRIMARY_SHARD:
+                    constraints = await conn.fetch("""
+                        SELECT conname, conrelid::regclass::text AS table_name
+                        FROM pg_constraint
+                        WHERE contype = 'f'
+                          AND confrelid = 'public.users'::regclass
+                          AND conparentid = 0
+                    """)
+                    for row in constraints:
+                        await conn.execute(
+                            f'ALTER TABLE {row["table_name"]} DROP CONSTRAINT "{row["conname"]}"'
+                        )
+                        logger.info(f"[{name}] dropped {row['table_name']}.{row['conname']}")
+                user_ids = [row['user_id'] for row in await conn.fetch("SELECT DISTINCT user_id FROM conversations")]
+
+            result = await db.execute("""
+                INSERT INTO public.user_shards (user_id, shard_id)
+                SELECT u, $2 FROM unnest($1::uuid[]) AS u
+                ON CONFLICT (user_id) DO NOTHING
+            """, user_ids, name)
+            pinned[name] = int(result.split()[-1])
+        return pinned
+
+    # === Planning ===
+    async def plan(self, limit: int = 0) -> List[Tuple[str, str, str]]:
+        """(user_id, current shard, ring shard) for pinned users the ring places elsewhere"""
+        rows = await db.fetch("SELECT user_id, shard_id FROM public.user_shards ORDER BY user_id")
+        moves = []
+        for row in rows:
+            user_id = str(row['user_id'])
+            target = self.router.ring_shard(user_id)
+            if row['shard_id'] != target:
+                moves.append((user_id, row['shard_id'], target))
+                if limit and len(moves) >= limit:
+                    break
+        return moves
+
+    # === Moves ===
+    async def _copy(self, user_id: str, source: str, target: str,
+                    seen: Dict[str, Set[UUID]]) -> Dict[str, int]:
+        """Copy the user's history to ``target``, adding every copied id to ``seen``"""
+        async def tracked() -> AsyncIterator[Dict[str, Any]]:
+            async for record in self.conversations.iter_user_history(user_id, shard=source):
+                seen[record['type']].add(UUID(record['id']))
+                yield record
+
+        importer = ConversationImporter(batch_size=self.batch_size)
+        return await importer.import_records(tracked(), user_id=user_id, shard=target)
+
+    async def _sync(self, target: str, conversations: List[asyncpg.Record],
+                    gone_conversations: Set[UUID], gone_messages: Set[UUID]) -> None:
+        """Apply changes the copies cannot carry: titles, soft-deletes and deleted rows.
+
+        A conversation takes the old shard's title and state only when the
+        old shard changed it last, so edits made on ``target`` since the
+        pin switched are kept. A soft-delete on either side wins.
+        """
+        async with self.router.database(target).get_connection(statement_timeout_ms=0) as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    UPDATE conversations c
+                    SET title = CASE WHEN s.updated_at > c.updated_at THEN s.title ELSE c.title END,
+                        is_active = CASE
+                            WHEN s.deleted_at IS NOT NULL THEN false
+                            WHEN s.updated_at > c.updated_at THEN s.is_active
+                            ELSE c.is_active
+                        END,
+                        deleted_at = COALESCE(c.deleted_at, s.deleted_at)
+                    FROM unnest($1::uuid[], $2::text[], $3::boolean[], $4::timestamptz[], $5::timestamptz[])
+                        AS s(id, title, is_active, updated_at, deleted_at)
+                    WHERE c.id = s.id
+                      AND (s.updated_at > c.updated_at OR (s.deleted_at IS NOT NULL AND c.deleted_at IS NULL))
+                """,
+                    [row['id'] for row in conversations],
+                    [row['title'] for row in conversations],
+                    [row['is_active'] for row in conversations],
+                    [row['updated_at'] for row in conversations],
+                    [row['deleted_at'] for row in conversations],
+                )
+                # Purged from the old shard after the first copy
+                await conn.execute("""
+                    UPDATE conversations
+                    SET deleted_at = NOW(), is_active = false
+                    WHERE id = ANY($1::uuid[]) AND deleted_at IS NULL
+                """, list(gone_conversations))
+                # E.g. turns dropped by the abandoned-turn policy
+                await conn.execute("DELETE FROM messages WHERE id = ANY($1::uuid[])", list(gone_messages))
+
+    async def _finish(self, user_id: str, source: str, target: str,
+                      first: Dict[str, Set[UUID]]) -> Dict[str, int]:
+        """Copy the delta to ``target`` and delete the user from ``source`` under the write lock"""
+        async with self.router.database(source).get_connection(statement_timeout_ms=0) as conn:
+            async with conn.transaction():
+                conversations = await conn.fetch("""
+                    SELECT id, title, is_active, updated_at, deleted_at
+                    FROM conversations
+                    WHERE user_id = $1
+                    ORDER BY id
+                    FOR UPDATE
+                """, UUID(user_id))
+                conversation_ids = [row['id'] for row in conversations]
+                await conn.execute("""
+                    SELECT id FROM messages
+                    WHERE conversation_id = ANY($1::uuid[])
+                    FOR UPDATE
+                """, conversation_ids)
+
+                # Nothing the user owns on the source can change from here on
+                final: Dict[str, Set[UUID]] = {'conversation': set(), 'message': set()}
+                copied = await self._copy(user_id, source, target, final)
+                await self._sync(
+                    target, conversations,
+                    first['conversation'] - final['conversation'],
+                    first['message'] - final['message'],
+                )
+
+                await conn.execute("DELETE FROM messages WHERE conversation_id = ANY($1::uuid[])", conversation_ids)
+                # Archive segment rows go with their conversations (ON DELETE CASCADE)
+                result = await conn.execute("DELETE FROM conversations WHERE id = ANY($1::uuid[])", conversation_ids)
+                stragglers = await conn.fetchval(
+                    "SELECT COUNT(*) FROM conversations WHERE user_id = $1", UUID(user_id)
+                )
+
+        if stragglers:
+            # Created through a pin cached past the TTL; left in place rather than lost
+            logger.warning(f"User {user_id} still has {stragglers} conversations on {source}; move them again")
+        return {**copied, 'removed': int(result.split()[-1])}
+
+    async def move_users(self, moves: Dict[str, str]) -> Dict[str, Dict[str, int]]:
+        """Move each user_id in ``moves`` to its target shard"""
+        for target in moves.values():
+            if target not in self.router.shards:
+                raise ValueError(f"Unknown shard '{target}'")
+
+        sources = {user_id: await self.router.shard_for_user(user_id) for user_id in moves}
+        pending = {user_id: target for user_id, target in moves.items() if sources[user_id] != target}
+        results = {user_id: {'conversations': 0, 'messages': 0, 'removed': 0} for user_id in pending}
+        if not pending:
+            return results
+
+        first_copies: Dict[str, Dict[str, Set[UUID]]] = {}
+        for user_id, target in pending.items():
+            first_copies[user_id] = {'conversation': set(), 'message': set()}
+            copied = await self._copy(user_id, sources[user_id], target, first_copies[user_id])
+            results[user_id]['conversations'] += copied['conversations']
+            results[user_id]['messages'] += copied['messages']
+            await self.router.pin_user(user_id, target, replace=True)
+            logger.info(f"Copied user {user_id} {sources[user_id]} -> {target}: {copied}")
+
+        # Other processes may route to the old shard until their cached pin expires
+        logger.info(f"Waiting {SHARD_MAP_TTL:.0f}s for shard map caches to expire")
+        await asyncio.sleep(SHARD_MAP_TTL + 1)
+
+        for user_id, target in pending.items():
+            finished = await self._finish(user_id, sources[user_id], target, first_copies.pop(user_id))
+            results[user_id]['conversations'] += finished['conversations']
+            results[user_id]['messages'] += finished['messages']
+            results[user_id]['removed'] = finished['removed']
+            logger.info(f"Moved user {user_id} to {target}: {results[user_id]}")
+        return results
@@ -0,0 +1,126 @@
+"""
+Request coalescing for NeuraFormAI
+Identical in-flight calls share one execution; finished results are replayed for a short TTL
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+# How long a finished /chat/ turn is replayed to an identical message without an Idempotency-Key
+CHAT_COALESCE_TTL_S = float(os.getenv("CHAT_COALESCE_TTL_S", "10"))
+# How long a finished turn is replayed to a retry carrying the same Idempotency-Key
+IDEMPOTENCY_TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", "600"))
+# Finished results kept at most (oldest dropped first)
+SINGLE_FLIGHT_MAX_RESULTS = int(os.getenv("SINGLE_FLIGHT_MAX_RESULTS", "10000"))
+
+COALESCED_REQUESTS = Counter(
+    'coalesced_requests_total',
+    'Requests served by single-flight coalescing',
+    ['name', 'outcome'],  # outcome is "leader", "joined" or "replayed"
+)
+
+
+class IdempotencyKeyConflictError(Exception):
+    """Raised when an Idempotency-Key is reused with a different request body"""
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of request fields, for keys and conflict checks"""
+    return hashlib.sha256('\0'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task, request_fingerprint: str, ttl_s: float):
+        self.task = task
+        self.fingerprint = request_fingerprint
+        self.ttl_s = ttl_s
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs one call per key at a time and remembers its result briefly.
+
+    The first caller for a key (the leader) starts the work as a task;
+    callers arriving while it runs await the same task, and callers
+    within ``ttl_s`` after it succeeded get the stored result. Failures
+    are not stored, so the next caller retries. Each caller awaits the
+    task through ``asyncio.shield``: one caller going away does not
+    cancel it, but once every caller has gone away it is cancelled, so
+    abandoned work still stops upstream. State is per process.
+    """
+
+    def __init__(self, name: str, max_results: int = SINGLE_FLIGHT_MAX_RESULTS):
+        self.name = name
+        self.max_results = max_results
+        self._inflight: Dict[str, _Flight] = {}
+        # key -> (expires at, fingerprint, result), oldest first
+        self._results: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+
+    def _evict(self, now: float):
+        while self._results:
+            key, (expires, _, _) = next(iter(self._results.items()))
+            if expires > now and len(self._results) <= self.max_results:
+                break
+            del self._results[key]
+
+    def _finish(self, key: str, flight: _Flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        task = flight.task
+        if task.cancelled() or task.exception() is not None or flight.ttl_s <= 0:
+            return
+        self._results[key] = (time.monotonic() + flight.ttl_s, flight.fingerprint, task.result())
+        self._results.move_to_end(key)
+
+    async def run(self, key: str, work: Callable[[], Awaitable[Any]], request_fingerprint: str = '',
+                  ttl_s: float = CHAT_COALESCE_TTL_S) -> Tuple[Any, str]:
+        """Result of ``work()`` for ``key`` and how it was obtained ("leader", "joined" or "replayed").
+
+        Raises IdempotencyKeyConflictError if ``key`` is running or was
+        stored for a different ``request_fingerprint``.
+        """
+        now = time.monotonic()
+        self._evict(now)
+
+        stored = self._results.get(key)
+        if stored is not None:
+            _, stored_fingerprint, result = stored
+            if stored_fingerprint != request_fingerprint:
+                raise IdempotencyKeyConflictError("Idempotency-Key was already used for a different request")
+            COALESCED_REQUESTS.labels(name=self.name, outcome='replayed').inc()
+            return result, 'replayed'
+
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(work()), request_fingerprint, ttl_s)
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda _, key=key, flight=flight: self._finish(key, flight))
+            outcome = 'leader'
+        elif flight.fingerprint != request_fingerprint:
+            raise IdempotencyKeyConflictError("Idempotency-Key is in use by a different request")
+        else:
+            outcome = 'joined'
+            logger.debug("🔁 Joined in-flight %s call %s", self.name, key[:16])
+        COALESCED_REQUESTS.labels(name=self.name, outcome=outcome).inc()
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), outcome
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller has gone away: stop the work instead of finishing it for nobody
+                flight.task.cancel()
+
+
+# Coalesces duplicate /chat/ turns
+chat_single_flight = SingleFlight('chat')
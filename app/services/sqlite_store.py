@@ -0,0 +1,600 @@
+"""
+Embedded SQLite conversation store for NeuraFormAI
+Single-file storage in WAL mode for single-node deployments, tests and benchmarks
+"""
+
+import os
+import re
+import json
+import sqlite3
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from uuid import UUID, uuid4
+
+from app.services.conversation_purger import purge_loop
+from app.services.conversation_store import ConversationStore
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'data/conversations.db')
+# Reader threads; WAL lets them run alongside the single writer
+SQLITE_READERS = int(os.getenv('SQLITE_READERS', '4'))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS personas (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    display_name TEXT NOT NULL,
+    description TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    persona_id TEXT NOT NULL REFERENCES personas(id),
+    title TEXT,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    deleted_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_deleted ON conversations(deleted_at) WHERE deleted_at IS NOT NULL;
+
+-- seq is the rowid shared with messages_fts; id is the public message id
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    sender_type TEXT NOT NULL,
+    content TEXT NOT NULL,
+    user_id TEXT,
+    ai_persona_id TEXT,
+    tokens_used INTEGER,
+    processing_time_ms INTEGER,
+    metadata TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON messages(conversation_id, created_at);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='seq', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.seq, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.seq, old.content);
+END;
+"""
+
+_SEARCH_TERM = re.compile(r'(-?)"([^"]*)"|(-?)(\S+)')
+
+
+def _now() -> str:
+    """UTC timestamp in a fixed-width ISO format, so text order is time order"""
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+
+def _uuid(value: str) -> str:
+    """Canonical form of a UUID string (raises ValueError like the Postgres store)"""
+    return str(UUID(str(value)))
+
+
+def _fts_query(query_text: str) -> Optional[str]:
+    """Translate web-search style input into an FTS5 query.
+
+    Mirrors websearch_to_tsquery: words and "quoted phrases" must all
+    match, ``or`` between terms means either, and a leading ``-``
+    excludes a term. Returns None when nothing searchable is left.
+    """
+    required: List[str] = []
+    excluded: List[str] = []
+    pending_or = False
+    for match in _SEARCH_TERM.finditer(query_text):
+        negate = match.group(1) or match.group(3)
+        text = match.group(2) if match.group(2) is not None else match.group(4)
+        if not negate and text.lower() == 'or' and match.group(2) is None:
+            pending_or = bool(required)
+            continue
+        words = re.findall(r'\w+', text)
+        if not words:
+            continue
+        term = '"' + ' '.join(words) + '"'
+        if negate:
+            excluded.append(term)
+        elif pending_or:
+            required[-1] = f"({required[-1]} OR {term})"
+        else:
+            required.append(term)
+        pending_or = False
+
+    if not required:
+        return None
+    query = ' AND '.join(required)
+    for term in excluded:
+        query = f"({query}) NOT {term}"
+    return query
+
+
+def _message_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        'id': row['id'],
+        'sender_type': row['sender_type'],
+        'content': row['content'],
+        'created_at': row['created_at'],
+        'tokens_used': row['tokens_used'],
+        'processing_time_ms': row['processing_time_ms'],
+        'metadata': json.loads(row['metadata']) if row['metadata'] else {},
+    }
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Conversations and messages in a local SQLite file.
+
+    One writer thread owns all writes (SQLite allows a single writer), a
+    small pool of reader threads serves queries concurrently thanks to
+    WAL mode, and every thread keeps its own connection. Nothing leaves
+    the process, so there are no network round trips. ``:memory:`` runs
+    reads on the writer's connection since it can't be shared.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH, readers: int = SQLITE_READERS):
+        self.path = str(path)
+        self.readers = readers
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._reader_pool: Optional[ThreadPoolExecutor] = None
+        self._init_lock = asyncio.Lock()
+        self._purger: Optional[asyncio.Task] = None
+
+    # === Connections ===
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _create_schema(self):
+        conn = self._connection()
+        if self.path != ':memory:':
+            mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            if mode.lower() != 'wal':
+                logger.warning(f"SQLite store {self.path} is using journal_mode={mode}, not WAL")
+        # Files created before soft delete existed
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(conversations)")}
+        if columns and 'deleted_at' not in columns:
+            conn.execute("ALTER TABLE conversations ADD COLUMN deleted_at TEXT")
+        conn.executescript(SCHEMA)
+
+    async def initialize(self):
+        """Create the database file and schema"""
+        async with self._init_lock:
+            if self._writer is not None:
+                return
+            if self.path != ':memory:':
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-writer')
+            if self.path == ':memory:':
+                self._reader_pool = self._writer
+            else:
+                self._reader_pool = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix='sqlite-reader')
+            await asyncio.get_running_loop().run_in_executor(self._writer, self._create_schema)
+            self._purger = asyncio.create_task(purge_loop(self))
+            logger.info(f"SQLite conversation store ready at {self.path}")
+
+    async def close(self):
+        async with self._init_lock:
+            if self._writer is None:
+                return
+            self._purger.cancel()
+            for executor in {self._writer, self._reader_pool}:
+                executor.shutdown(wait=True)
+            with self._connections_lock:
+                for conn in self._connections:
+                    conn.close()
+                self._connections.clear()
+            self._local = threading.local()
+            self._writer = self._reader_pool = None
+
+    def _transaction(self, fn: Callable, args: tuple):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, *args)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    async def _write(self, fn: Callable, *args):
+        """Run fn(conn, *args) in a write transaction on the writer thread"""
+        if self._writer is None:
+            await self.initialize()
+        return await asyncio.get_running_loop().run_in_executor(self._writer, self._transaction, fn, args)
+
+    async def _read(self, fn: Callable, *args):
+        """Run fn(conn, *args) on a reader thread"""
+        if self._writer is None:
+            await self.initialize()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._reader_pool, lambda: fn(self._connection(), *args)
+        )
+
+    # === Conversations ===
+    @staticmethod
+    def _find_conversation(conn, user_id: str, persona_name: str) -> Optional[str]:
+        row = conn.execute("""
+            SELECT c.id
+            FROM conversations c
+            JOIN personas p ON c.persona_id = p.id
+            WHERE c.user_id = ? AND p.name = ? AND c.is_active = 1 AND c.deleted_at IS NULL
+            LIMIT 1
+        """, (user_id, persona_name)).fetchone()
+        return row['id'] if row else None
+
+    async def get_or_create_conversation(self, user_id: str, persona_name: str) -> str:
+        user_id = _uuid(user_id)
+        existing = await self._read(self._find_conversation, user_id, persona_name)
+        if existing:
+            return existing
+
+        def create(conn) -> str:
+            # Re-check under the write lock in case a concurrent call created it
+            existing = self._find_conversation(conn, user_id, persona_name)
+            if existing:
+                return existing
+            now = _now()
+            persona = conn.execute("SELECT id FROM personas WHERE name = ?", (persona_name,)).fetchone()
+            if persona:
+                persona_id = persona['id']
+            else:
+                persona_id = str(uuid4())
+                conn.execute("""
+                    INSERT INTO personas (id, name, display_name, description, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (persona_id, persona_name, persona_name.title(), f"AI persona named {persona_name}", now))
+            conversation_id = str(uuid4())
+            conn.execute("""
+                INSERT INTO conversations (id, user_id, persona_id, title, is_active, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 1, ?, ?)
+            """, (conversation_id, user_id, persona_id, f"Chat with {persona_name.title()}", now, now))
+            return conversation_id
+
+        return await self._write(create)
+
+    async def get_conversation_for_persona(self, user_id: str, persona_name: str) -> Optional[str]:
+        return await self._read(self._find_conversation, _uuid(user_id), persona_name)
+
+    async def get_user_conversations(self, user_id: str) -> List[Dict[str, Any]]:
+        def query(conn) -> List[Dict[str, Any]]:
+            rows = conn.execute("""
+                SELECT
+                    c.id, c.title, c.created_at, c.updated_at, c.is_active,
+                    p.name AS persona_name,
+                    COUNT(m.seq) AS message_count,
+                    MAX(m.created_at) AS last_message_at
+                FROM conversations c
+                LEFT JOIN personas p ON c.persona_id = p.id
+                LEFT JOIN messages m ON c.id = m.conversation_id
+                WHERE c.user_id = ? AND c.deleted_at IS NULL
+                GROUP BY c.id
+                ORDER BY c.updated_at DESC
+            """, (_uuid(user_id),)).fetchall()
+            return [
+                {
+                    'id': row['id'],
+                    'title': row['title'],
+                    'persona_name': row['persona_name'],
+                    'created_at': row['created_at'],
+                    'updated_at': row['updated_at'],
+                    'is_active': bool(row['is_active']),
+                    'message_count': row['message_count'],
+                    'last_message_at': row['last_message_at'],
+                }
+                for row in rows
+            ]
+
+        return await self._read(query)
+
+    async def update_conversation_title(self, conversation_id: str, title: str,
+                                        user_id: Optional[str] = None) -> bool:
+        def update(conn) -> bool:
+            cursor = conn.execute(
+                "UPDATE conversations SET title = ?, updated_at = ? WHERE id = ? AND deleted_at IS NULL",
+                (title, _now(), _uuid(conversation_id)),
+            )
+            return cursor.rowcount == 1
+
+        return await self._write(update)
+
+    async def delete_conversation(self, conversation_id: str, user_id: Optional[str] = None) -> bool:
+        def delete(conn) -> bool:
+            cursor = conn.execute("""
+                UPDATE conversations SET deleted_at = ?, is_active = 0
+                WHERE id = ? AND deleted_at IS NULL
+            """, (_now(), _uuid(conversation_id)))
+            return cursor.rowcount == 1
+
+        return await self._write(delete)
+
+    async def purge_deleted(self, chunk_size: int, pause_s: float) -> int:
+        """Remove deleted conversations, one message chunk per write transaction"""
+        def next_chunk(conn) -> Optional[bool]:
+            row = conn.execute(
+                "SELECT id FROM conversations WHERE deleted_at IS NOT NULL ORDER BY deleted_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            deleted = conn.execute("""
+                DELETE FROM messages WHERE seq IN (
+                    SELECT seq FROM messages WHERE conversation_id = ? LIMIT ?
+                )
+            """, (row['id'], chunk_size)).rowcount
+            if deleted < chunk_size:
+                conn.execute("DELETE FROM conversations WHERE id = ?", (row['id'],))
+                return True
+            return False
+
+        purged = 0
+        while True:
+            # Short transactions keep the single writer free for chat requests
+            finished = await self._write(next_chunk)
+            if finished is None:
+                return purged
+            purged += finished
+            await asyncio.sleep(pause_s)
+
+    # === Messages ===
+    async def save_message(self, conversation_id: str, sender_type: str, content: str,
+                           user_id: str = None, persona_id: str = None, tokens_used: int = None,
+                           processing_time_ms: int = None, metadata: Optional[Dict[str, Any]] = None) -> str:
+        message_id = str(uuid4())
+
+        def insert(conn) -> str:
+            now = _now()
+            conn.execute("""
+                INSERT INTO messages (
+                    id, conversation_id, sender_type, content,
+                    user_id, ai_persona_id, tokens_used, processing_time_ms, metadata, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                message_id,
+                _uuid(conversation_id),
+                sender_type,
+                content,
+                _uuid(user_id) if user_id else None,
+                _uuid(persona_id) if persona_id else None,
+                tokens_used,
+                processing_time_ms,
+                json.dumps(metadata) if metadata else None,
+                now,
+            ))
+            conn.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, _uuid(conversation_id)))
+            return message_id
+
+        try:
+            return await self._write(insert)
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Conversation {conversation_id} not found")
+
+    async def add_message_timings(self, conversation_id: str, message_id: str,
+                                  timings: Dict[str, float]) -> bool:
+        def update(conn) -> bool:
+            cursor = conn.execute("""
+                UPDATE messages SET metadata = json_patch(COALESCE(metadata, '{}'), ?)
+                WHERE conversation_id = ? AND id = ?
+            """, (json.dumps({'timings': timings}), _uuid(conversation_id), _uuid(message_id)))
+            return cursor.rowcount == 1
+
+        return await self._write(update)
+
+    async def get_message(self, conversation_id: str, message_id: str,
+                          user_id: str) -> Optional[Dict[str, Any]]:
+        def query(conn) -> Optional[Dict[str, Any]]:
+            row = conn.execute("""
+                SELECT m.id, m.sender_type, m.content, m.created_at, m.tokens_used,
+                       m.processing_time_ms, m.metadata
+                FROM messages m
+                JOIN conversations c ON c.id = m.conversation_id
+                WHERE m.conversation_id = ? AND m.id = ? AND c.user_id = ? AND c.deleted_at IS NULL
+            """, (_uuid(conversation_id), _uuid(message_id), _uuid(user_id))).fetchone()
+            return _message_dict(row) if row else None
+
+        return await self._read(query)
+
+    async def delete_message(self, conversation_id: str, message_id: str) -> bool:
+        def delete(conn) -> bool:
+            cursor = conn.execute(
+                "DELETE FROM messages WHERE conversation_id = ? AND id = ?",
+                (_uuid(conversation_id), _uuid(message_id)),
+            )
+            return cursor.rowcount == 1
+
+        return await self._write(delete)
+
+    async def get_conversation_messages(self, conversation_id: str, limit: int = 100,
+                                        user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        def query(conn) -> List[Dict[str, Any]]:
+            rows = conn.execute("""
+                SELECT id, sender_type, content, created_at, tokens_used, processing_time_ms, metadata
+                FROM messages
+                WHERE conversation_id = ?
+                  AND EXISTS (SELECT 1 FROM conversations WHERE id = ? AND deleted_at IS NULL)
+                ORDER BY created_at ASC
+                LIMIT ?
+            """, (_uuid(conversation_id), _uuid(conversation_id), limit)).fetchall()
+            return [_message_dict(row) for row in rows]
+
+        return await self._read(query)
+
+    async def search_messages(self, user_id: str, query_text: str, persona_name: Optional[str] = None,
+                              limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Full-text search backed by an FTS5 index, paged like the Postgres store.
+
+        Rank is the negated bm25 score so larger means better, matching the
+        (rank, id) keyset cursor used by the Postgres store.
+        """
+        after_rank, after_id = self._decode_search_cursor(cursor) if cursor else (None, None)
+        match = _fts_query(query_text)
+        if match is None:
+            return {'results': [], 'next_cursor': None}
+
+        def query(conn) -> List[sqlite3.Row]:
+            page = conn.execute("""
+                SELECT * FROM (
+                    SELECT
+                        m.seq,
+                        m.id,
+                        m.conversation_id,
+                        m.sender_type,
+                        m.created_at,
+                        p.name AS persona_name,
+                        -bm25(messages_fts) AS rank
+                    FROM messages_fts
+                    JOIN messages m ON m.seq = messages_fts.rowid
+                    JOIN conversations c ON c.id = m.conversation_id
+                    LEFT JOIN personas p ON p.id = c.persona_id
+                    WHERE messages_fts MATCH ?
+                      AND c.user_id = ?
+                      AND c.deleted_at IS NULL
+                      AND (? IS NULL OR p.name = ?)
+                ) hits
+                WHERE ? IS NULL OR (hits.rank, hits.id) < (?, ?)
+                ORDER BY hits.rank DESC, hits.id DESC
+                LIMIT ?
+            """, (
+                match, _uuid(user_id), persona_name, persona_name,
+                after_rank, after_rank, str(after_id) if after_id else None, limit + 1,
+            )).fetchall()
+            if not page:
+                return []
+
+            # Snippets are only built for the rows of the requested page (and the
+            # one extra row fetched to tell whether another page follows)
+            seqs = [row['seq'] for row in page]
+            snippets = dict(conn.execute(f"""
+                SELECT rowid, snippet(messages_fts, 0, '<mark>', '</mark>', '…', 30)
+                FROM messages_fts
+                WHERE messages_fts MATCH ? AND rowid IN ({','.join('?' * len(seqs))})
+            """, (match, *seqs)).fetchall())
+            return [(row, snippets.get(row['seq'])) for row in page]
+
+        try:
+            results = await self._read(query)
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search query: {e}")
+
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            last = results[-1][0]
+            next_cursor = self._encode_search_cursor(last['rank'], last['id'])
+
+        return {
+            'results': [
+                {
+                    'id': row['id'],
+                    'conversation_id': row['conversation_id'],
+                    'sender_type': row['sender_type'],
+                    'persona_name': row['persona_name'],
+                    'created_at': row['created_at'],
+                    'rank': row['rank'],
+                    'snippet': snippet,
+                }
+                for row, snippet in results
+            ],
+            'next_cursor': next_cursor,
+        }
+
+    async def iter_user_history(self, user_id: str, batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a user's history from a read snapshot, ``batch_size`` rows at a time"""
+        if self._writer is None:
+            await self.initialize()
+        user_id = _uuid(user_id)
+        # A dedicated connection holds the snapshot for the whole export
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False) \
+            if self.path != ':memory:' else None
+        loop = asyncio.get_running_loop()
+        executor = self._reader_pool if conn else self._writer
+
+        def open_cursor():
+            db = conn or self._connection()
+            db.row_factory = sqlite3.Row
+            if conn:
+                db.execute("BEGIN")
+            return db.execute("""
+                SELECT
+                    c.id AS conversation_id,
+                    c.title,
+                    c.created_at AS conversation_created_at,
+                    c.updated_at AS conversation_updated_at,
+                    c.is_active,
+                    p.name AS persona_name,
+                    m.id AS message_id,
+                    m.sender_type,
+                    m.content,
+                    m.created_at,
+                    m.tokens_used,
+                    m.processing_time_ms,
+                    m.metadata
+                FROM conversations c
+                LEFT JOIN personas p ON c.persona_id = p.id
+                LEFT JOIN messages m ON m.conversation_id = c.id
+                WHERE c.user_id = ? AND c.deleted_at IS NULL
+                ORDER BY c.created_at, c.id, m.created_at, m.id
+            """, (user_id,))
+
+        try:
+            cursor = await loop.run_in_executor(executor, open_cursor)
+            current_conversation = None
+            while True:
+                rows = await loop.run_in_executor(executor, cursor.fetchmany, batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if row['conversation_id'] != current_conversation:
+                        current_conversation = row['conversation_id']
+                        yield {
+                            'type': 'conversation',
+                            'id': row['conversation_id'],
+                            'title': row['title'],
+                            'persona_name': row['persona_name'],
+                            'created_at': row['conversation_created_at'],
+                            'updated_at': row['conversation_updated_at'],
+                            'is_active': bool(row['is_active']),
+                        }
+                    if row['message_id'] is None:
+                        continue
+                    yield {
+                        'type': 'message',
+                        'id': row['message_id'],
+                        'conversation_id': row['conversation_id'],
+                        'sender_type': row['sender_type'],
+                        'content': row['content'],
+                        'created_at': row['created_at'],
+                        'tokens_used': row['tokens_used'],
+                        'processing_time_ms': row['processing_time_ms'],
+                        'metadata': json.loads(row['metadata']) if row['metadata'] else {},
+                    }
+        finally:
+            if conn:
+                await loop.run_in_executor(executor, conn.close)
@@ -0,0 +1,139 @@
+"""
+TTS backends for NeuraFormAI
+synthesize_reply_as_stream talks to one of these; TTS_BACKEND picks which, a persona may override it
+"""
+
+import os
+import time
+import logging
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Optional
+
+from prometheus_client import Counter
+
+from app.services.chat_engine import ChatEngine
+from app.services.audio_format import AudioFormat, default_format
+from app.helpers.text_cleaner import sanitize_for_speech
+from app.config.logging_config import redact
+
+logger = logging.getLogger(__name__)
+
+# elevenlabs (default) or local
+TTS_BACKEND = os.getenv("TTS_BACKEND", "elevenlabs").lower()
+# Backend used when the selected one fails before producing audio (e.g. quota exhausted); empty disables
+TTS_FALLBACK_BACKEND = os.getenv("TTS_FALLBACK_BACKEND", "").lower()
+# After failing over, send new streams straight to the fallback for this long
+TTS_FAILOVER_COOLDOWN_S = float(os.getenv("TTS_FAILOVER_COOLDOWN_S", "60"))
+
+TTS_FAILOVERS = Counter(
+    'tts_failovers_total',
+    'TTS streams moved to the fallback backend before any audio',
+    ['backend', 'fallback'],
+)
+
+
+class TTSBackend(ABC):
+    """Speech synthesis interface behind synthesize_reply_as_stream.
+
+    ``stream`` returns audio chunks in the requested format as they are
+    produced. Nothing is synthesized until the iterator is iterated,
+    and closing it early stops the synthesis.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def stream(self, text: str, voice_id: Optional[str], audio_format: AudioFormat,
+               model_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Audio of ``text`` in ``voice_id``; ``model_id`` overrides the backend's default model"""
+
+    async def close(self):
+        """Release connections opened by stream()"""
+
+
+_backends: Dict[str, TTSBackend] = {}
+# backend name -> time.monotonic() until which it is skipped in favour of the fallback
+_down_until: Dict[str, float] = {}
+
+
+def get_tts_backend(name: str) -> TTSBackend:
+    """The process-wide backend called ``name``"""
+    if name not in _backends:
+        if name == 'elevenlabs':
+            from app.services.elevenlabs_tts import ElevenLabsBackend
+            _backends[name] = ElevenLabsBackend()
+        elif name == 'local':
+            from app.services.local_tts import LocalTTSBackend
+            _backends[name] = LocalTTSBackend()
+        else:
+            raise ValueError(f"Unknown TTS backend '{name}'; use elevenlabs or local")
+    return _backends[name]
+
+
+async def close_tts_backends():
+    for backend in _backends.values():
+        await backend.close()
+    _backends.clear()
+
+
+async def _with_failover(text: str, voice_id: Optional[str], audio_format: AudioFormat, backend: str,
+                         model_id: Optional[str]) -> AsyncIterator[bytes]:
+    """Stream from ``backend``, switching to the fallback if it fails before its first chunk.
+
+    Audio cannot be spliced, so once a backend has produced a chunk its
+    errors are raised as they are.
+    """
+    chain = [backend]
+    if TTS_FALLBACK_BACKEND and TTS_FALLBACK_BACKEND != backend:
+        chain.append(TTS_FALLBACK_BACKEND)
+    now = time.monotonic()
+    chain = [name for name in chain if _down_until.get(name, 0) <= now] or chain[-1:]
+
+    for index, name in enumerate(chain):
+        stream = get_tts_backend(name).stream(text, voice_id, audio_format, model_id if name == backend else None)
+        started = False
+        try:
+            async for chunk in stream:
+                if not started:
+                    started = True
+                    _down_until.pop(name, None)
+                yield chunk
+            return
+        except Exception as e:
+            if started or index == len(chain) - 1:
+                raise
+            fallback = chain[index + 1]
+            _down_until[name] = time.monotonic() + TTS_FAILOVER_COOLDOWN_S
+            TTS_FAILOVERS.labels(backend=name, fallback=fallback).inc()
+            logger.warning("⚠️ TTS backend %s failed (%s); using %s for the next %.0fs",
+                           name, e, fallback, TTS_FAILOVER_COOLDOWN_S)
+        finally:
+            await stream.aclose()
+
+
+# === Synthesize text to speech ===
+def synthesize_reply_as_stream(text: str, voice_id: Optional[str] = None, user_id: Optional[str] = None,
+                               audio_format: Optional[AudioFormat] = None) -> AsyncIterator[bytes]:
+    """
+    Stream TTS audio for a given text, in ``audio_format`` (default
+    TTS_DEFAULT_FORMAT). With a user_id, the user's active persona
+    supplies the voice (unless voice_id is given), the backend and the
+    model; otherwise TTS_BACKEND is used.
+
+    Returns an async iterator; nothing is synthesized until it is
+    iterated.
+    """
+    backend, model_id = TTS_BACKEND, None
+    if user_id:
+        tts = ChatEngine.get_tts_config(user_id)
+        backend = tts["backend"] or TTS_BACKEND
+        model_id = tts["model"]
+        if not voice_id:
+            voice_id = ChatEngine.get_voice_id(user_id)
+            logger.debug("🎙️ No voice_id provided. Using persona voice: %s", voice_id)
+
+    cleaned_text = sanitize_for_speech(text)
+    audio_format = audio_format or default_format()
+    logger.debug("🎙️ [TTS] %s | voice_id=%s | backend=%s | format=%s",
+                 redact(cleaned_text), voice_id, backend, audio_format.name)
+    return _with_failover(cleaned_text, voice_id, audio_format, backend, model_id)
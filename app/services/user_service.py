@@ -279,16 +279,35 @@ class UserService:
             raise
     
     async def get_user_analytics(self, user_id: str, days: int = 30) -> Dict[str, Any]:
-        """Get user analytics for the specified period"""
+        """Get user analytics for the specified period
+
+        Complete days come from the daily rollups; days the rollup job
+        hasn't reached yet (normally just today) are counted from the raw
+        events.
+        """
         query = """
-            SELECT 
+            WITH bounds AS (
+                SELECT
+                    (NOW() AT TIME ZONE 'UTC')::date - $2::int AS since,
+                    COALESCE(
+                        (SELECT rolled_up_to FROM public.analytics_rollup_state WHERE id = 1),
+                        '-infinity'::date
+                    ) AS rolled_up_to
+            )
+            SELECT event_type, event_count::bigint AS event_count, day AS event_date
+            FROM public.user_analytics_daily, bounds
+            WHERE user_id = $1
+            AND day >= bounds.since
+            AND day < bounds.rolled_up_to
+            UNION ALL
+            SELECT
                 event_type,
                 COUNT(*) as event_count,
-                DATE(created_at) as event_date
-            FROM public.user_analytics
-            WHERE user_id = $1 
-            AND created_at >= NOW() - INTERVAL '$2 days'
-            GROUP BY event_type, DATE(created_at)
+                (created_at AT TIME ZONE 'UTC')::date as event_date
+            FROM public.user_analytics, bounds
+            WHERE user_id = $1
+            AND created_at >= GREATEST(bounds.since, bounds.rolled_up_to)::timestamp AT TIME ZONE 'UTC'
+            GROUP BY event_type, (created_at AT TIME ZONE 'UTC')::date
             ORDER BY event_date DESC, event_count DESC
         """
         
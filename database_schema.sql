@@ -57,18 +57,28 @@ CREATE TABLE IF NOT EXISTS public.conversations (
     persona_id UUID,
     is_active BOOLEAN DEFAULT true,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    -- Set by delete; messages and the row itself are purged in the background
+    deleted_at TIMESTAMP WITH TIME ZONE
 );
+ALTER TABLE public.conversations ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE;
 
--- Messages table
+-- Messages table, range-partitioned by month on created_at.
+-- Monthly partitions are created by app/services/message_archive.py;
+-- existing unpartitioned installs migrate with scripts/partition_messages.py
 CREATE TABLE IF NOT EXISTS public.messages (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     conversation_id UUID NOT NULL REFERENCES public.conversations(id) ON DELETE CASCADE,
-    role VARCHAR(20) NOT NULL, -- 'user' or 'assistant'
+    sender_type VARCHAR(20) NOT NULL, -- 'user' or 'ai'
     content TEXT NOT NULL,
+    user_id UUID,
+    ai_persona_id UUID,
     tokens_used INTEGER,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-);
+    processing_time_ms INTEGER,
+    metadata JSONB,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
 
 -- Personas table
 CREATE TABLE IF NOT EXISTS public.personas (
@@ -91,14 +101,72 @@ CREATE TABLE IF NOT EXISTS public.user_analytics (
     user_id UUID NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
     event_type VARCHAR(100) NOT NULL,
     event_data JSONB,
+    session_id VARCHAR(255),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
+ALTER TABLE public.user_analytics ADD COLUMN IF NOT EXISTS session_id VARCHAR(255);
+
+-- Daily rollups of user_analytics, maintained by app/services/analytics_rollup.py
+CREATE TABLE IF NOT EXISTS public.user_analytics_daily (
+    user_id UUID NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+    event_type VARCHAR(100) NOT NULL,
+    day DATE NOT NULL,
+    event_count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, event_type, day)
+);
+
+-- Days before rolled_up_to are complete in user_analytics_daily
+CREATE TABLE IF NOT EXISTS public.analytics_rollup_state (
+    id SMALLINT PRIMARY KEY CHECK (id = 1),
+    rolled_up_to DATE NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
 
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON public.conversations(user_id);
+CREATE INDEX IF NOT EXISTS idx_conversations_deleted_at ON public.conversations(deleted_at) WHERE deleted_at IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON public.messages(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON public.messages(conversation_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_user_analytics_user_id ON public.user_analytics(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_analytics_event_type ON public.user_analytics(event_type);
+CREATE INDEX IF NOT EXISTS idx_user_analytics_user_created ON public.user_analytics(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_user_analytics_created_at ON public.user_analytics(created_at);
+
+-- Full-text search over message content (generated column + GIN index)
+ALTER TABLE public.messages
+    ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED;
+CREATE INDEX IF NOT EXISTS idx_messages_content_tsv ON public.messages USING GIN (content_tsv);
+
+-- Archived message partitions (compressed JSONL on local disk)
+CREATE TABLE IF NOT EXISTS public.message_archives (
+    id SERIAL PRIMARY KEY,
+    partition_name VARCHAR(63) UNIQUE NOT NULL,
+    range_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    range_end TIMESTAMP WITH TIME ZONE NOT NULL,
+    path TEXT NOT NULL,
+    row_count BIGINT,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Byte range of each conversation inside an archive file (one gzip member each)
+CREATE TABLE IF NOT EXISTS public.message_archive_segments (
+    archive_id INTEGER NOT NULL REFERENCES public.message_archives(id) ON DELETE CASCADE,
+    conversation_id UUID NOT NULL REFERENCES public.conversations(id) ON DELETE CASCADE,
+    byte_offset BIGINT NOT NULL,
+    byte_length BIGINT NOT NULL,
+    message_count INTEGER NOT NULL,
+    PRIMARY KEY (archive_id, conversation_id, byte_offset)
+);
+CREATE INDEX IF NOT EXISTS idx_message_archive_segments_conversation ON public.message_archive_segments(conversation_id);
+
+-- Users pinned to a conversation shard (only used when DB_SHARDS is set; lives on the primary)
+CREATE TABLE IF NOT EXISTS public.user_shards (
+    user_id UUID PRIMARY KEY REFERENCES public.users(id) ON DELETE CASCADE,
+    shard_id VARCHAR(64) NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_user_shards_shard ON public.user_shards(shard_id);
 
 -- Update triggers for updated_at timestamps
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -0,0 +1,92 @@
+"""
+Bulk-load conversation history with COPY, or generate synthetic history for load tests.
+
+Input is JSON lines: either one conversation per line with a nested
+"messages" list, or the flat record stream produced by /chat/export.
+Files ending in .gz are decompressed on the fly.
+
+Usage:
+  python scripts/import_conversations.py history.jsonl.gz --user-id <uuid>
+  python scripts/import_conversations.py --generate-users 1000 --conversations 5 --messages 200
+"""
+
+from __future__ import annotations
+
+import sys
+import gzip
+import time
+import uuid
+import asyncio
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Allow `python scripts/import_conversations.py` from the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config.database import init_database, cleanup_database  # noqa: E402
+from app.config.sharding import shard_router  # noqa: E402
+from app.services.conversation_import import (  # noqa: E402
+    ConversationImporter,
+    generate_synthetic_history,
+    iter_jsonl_file,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="JSONL file to import ('-' for stdin)")
+    parser.add_argument("--user-id", help="Assign every imported conversation to this user")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Messages per COPY batch")
+    parser.add_argument("--generate-users", type=int, default=0, help="Generate history for N synthetic users")
+    parser.add_argument("--conversations", type=int, default=3, help="Synthetic conversations per user")
+    parser.add_argument("--messages", type=int, default=50, help="Synthetic messages per conversation")
+    parser.add_argument("--personas", default="fuka,gwen,kenji,koan,nika", help="Comma-separated persona names")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible data")
+    args = parser.parse_args()
+    if not args.path and not args.generate_users:
+        parser.error("provide a file to import or --generate-users")
+    return args
+
+
+async def main() -> None:
+    load_dotenv()
+    args = parse_args()
+    await init_database()
+    await shard_router.initialize()
+    importer = ConversationImporter(batch_size=args.batch_size)
+    started = time.perf_counter()
+
+    try:
+        if args.generate_users:
+            user_ids = [uuid.uuid4() for _ in range(args.generate_users)]
+            await importer.ensure_users(user_ids)
+            records = generate_synthetic_history(
+                user_ids,
+                args.conversations,
+                args.messages,
+                [p.strip() for p in args.personas.split(",") if p.strip()],
+                seed=args.seed,
+            )
+            stats = await importer.import_records(records)
+        elif args.path == "-":
+            stats = await importer.import_records(iter_jsonl_file(sys.stdin), user_id=args.user_id)
+        else:
+            opener = gzip.open if args.path.endswith(".gz") else open
+            with opener(args.path, "rt", encoding="utf-8") as f:
+                stats = await importer.import_records(iter_jsonl_file(f), user_id=args.user_id)
+    finally:
+        await shard_router.close()
+        await cleanup_database()
+
+    elapsed = time.perf_counter() - started
+    rate = stats["messages"] / elapsed if elapsed else 0
+    print(
+        f"Imported {stats['conversations']} conversations and {stats['messages']} messages "
+        f"in {stats['batches']} batches ({elapsed:.1f}s, {rate:,.0f} messages/s)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
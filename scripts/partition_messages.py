@@ -0,0 +1,52 @@
+"""
+One-off migration: convert public.messages into a table range-partitioned by month.
+
+Takes an exclusive lock on messages for the duration of the copy, so run it
+in a maintenance window. Afterwards the app creates upcoming partitions
+and archives old ones on its own (see MESSAGE_ARCHIVE_AFTER_MONTHS).
+
+Usage:
+  1) Activate venv
+  2) python scripts/partition_messages.py [--keep-legacy]
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+import asyncpg
+from dotenv import load_dotenv
+
+# Allow `python scripts/partition_messages.py` from the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.message_archive import convert_messages_to_partitioned  # noqa: E402
+
+
+async def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Partition public.messages by month")
+    parser.add_argument("--keep-legacy", action="store_true",
+                        help="Keep the old table as messages_unpartitioned instead of dropping it")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=int(os.getenv("DB_PORT", "5432")),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", ""),
+        database=os.getenv("DB_NAME", "neuraformai"),
+    )
+    try:
+        moved = await convert_messages_to_partitioned(conn, keep_legacy=args.keep_legacy)
+        print(f"Done. {moved} messages now live in monthly partitions.")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""
+Move users' conversations between database shards (see DB_SHARDS).
+
+Commands:
+  init                      Pin existing users to the shard holding their data and
+                            drop foreign keys to users on non-primary shards.
+                            Run once after adding the first shard.
+  move --user-id U --to S   Move one user to shard S.
+  rebalance [--limit N]     Move pinned users to the shard the hash ring picks for them.
+            [--dry-run]
+
+Moves wait DB_SHARD_MAP_TTL seconds so running app servers drop their
+cached placement before the old rows are deleted.
+
+Usage:
+  python scripts/rebalance_shards.py init
+  python scripts/rebalance_shards.py move --user-id <uuid> --to shard1
+  python scripts/rebalance_shards.py rebalance --limit 500 --dry-run
+"""
+
+from __future__ import annotations
+
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Allow `python scripts/rebalance_shards.py` from the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config.database import init_database, cleanup_database  # noqa: E402
+from app.config.sharding import shard_router  # noqa: E402
+from app.services.shard_rebalance import ShardRebalancer  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("init", help="Prepare shards and pin existing users")
+
+    move = commands.add_parser("move", help="Move one user to another shard")
+    move.add_argument("--user-id", required=True)
+    move.add_argument("--to", required=True, help="Target shard name")
+
+    rebalance = commands.add_parser("rebalance", help="Move users to their hash-ring shard")
+    rebalance.add_argument("--limit", type=int, default=0, help="Move at most N users")
+    rebalance.add_argument("--dry-run", action="store_true", help="Only print the planned moves")
+
+    parser.add_argument("--batch-size", type=int, default=5000, help="Messages per COPY batch")
+    return parser.parse_args()
+
+
+async def main() -> None:
+    load_dotenv()
+    args = parse_args()
+    if not shard_router.is_sharded:
+        print("DB_SHARDS is not set; nothing to do.")
+        return
+
+    await init_database()
+    await shard_router.initialize()
+    rebalancer = ShardRebalancer(batch_size=args.batch_size)
+
+    try:
+        if args.command == "init":
+            pinned = await rebalancer.prepare_shards()
+            for shard, count in pinned.items():
+                print(f"{shard}: pinned {count} users")
+        elif args.command == "move":
+            results = await rebalancer.move_users({args.user_id: args.to})
+            if not results:
+                print(f"User {args.user_id} is already on {args.to}")
+            for user_id, stats in results.items():
+                print(f"{user_id}: {stats}")
+        else:
+            moves = await rebalancer.plan(limit=args.limit)
+            for user_id, source, target in moves:
+                print(f"{user_id}: {source} -> {target}")
+            if moves and not args.dry_run:
+                results = await rebalancer.move_users({user_id: target for user_id, _, target in moves})
+                messages = sum(stats["messages"] for stats in results.values())
+                print(f"Moved {len(results)} users ({messages} messages)")
+            elif not moves:
+                print("All users are on their hash-ring shard")
+    finally:
+        await shard_router.close()
+        await cleanup_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -66,6 +66,11 @@ async def run_migrations():
             
             await conn.execute(schema)
             logger.info("Database schema created successfully")
+            
+            # Create the current and upcoming monthly message partitions
+            from app.services.message_archive import is_partitioned, ensure_future_partitions
+            if await is_partitioned(conn):
+                await ensure_future_partitions(conn)
         else:
             logger.error("Schema file not found: database_schema.sql")
             return False
@@ -211,6 +216,19 @@ DB_PASSWORD=your_password_here
 DB_MIN_SIZE=5
 DB_MAX_SIZE=20
 DB_SSL=false
+DB_ACQUIRE_TIMEOUT=5
+DB_MAX_WAITERS=0
+DB_STATEMENT_TIMEOUT_MS=15000
+DB_SLOW_QUERY_MS=500
+
+# Conversation shards (optional): name=dsn pairs, comma-separated
+# After adding the first shard run: python scripts/rebalance_shards.py init
+DB_SHARDS=
+DB_SHARD_MAP_TTL=60
+
+# Conversation storage: postgres, or sqlite for a single node without a database server
+CONVERSATION_STORE=postgres
+SQLITE_PATH=data/conversations.db
 
 # Supabase Configuration (for OAuth and real-time features)
 SUPABASE_URL=https://your-project.supabase.co
@@ -228,6 +246,64 @@ APPLE_PRIVATE_KEY=your_apple_private_key_here
 # Application Configuration
 APP_SECRET_KEY=your_secret_key_here
 APP_ENVIRONMENT=development
+# Enables /api/admin endpoints (sent as the X-Admin-Token header)
+ADMIN_API_TOKEN=
+
+# Logging: LOG_FORMAT=text|json; LOG_SAMPLE keeps a fraction of a logger's info/debug lines
+LOG_LEVEL=INFO
+LOG_FORMAT=text
+LOG_SAMPLE=
+LOG_MESSAGE_CONTENT=false
+
+# LLM routing: candidate models ranked per turn by LLM_ROUTING_POLICY (fastest|cheapest)
+LLM_MODELS=
+LLM_ROUTING_POLICY=fastest
+LLM_LATENCY_SLO_S=8.0
+
+# Admission control: concurrent LLM turns, their wait queue, and per-user turns per minute
+LLM_MAX_CONCURRENCY=32
+LLM_QUEUE_SIZE=64
+LLM_QUEUE_TIMEOUT_S=10
+USER_TURNS_PER_MIN=20
+USER_TURN_BURST=5
+
+# Client disconnects before the reply: discard (drop the user message), keep, or complete (finish and save)
+ABANDONED_TURN_POLICY=discard
+
+# Duplicate /chat/ turns share one reply; finished replies are replayed for these many seconds
+CHAT_COALESCE_TTL_S=10
+IDEMPOTENCY_TTL_S=600
+
+# TTS backend: elevenlabs, or local (silent stand-in audio, no network); personas may set tts_backend
+TTS_BACKEND=elevenlabs
+# Used when the backend fails before any audio, e.g. quota exhausted (empty disables)
+TTS_FALLBACK_BACKEND=
+TTS_FAILOVER_COOLDOWN_S=60
+LOCAL_TTS_TTFB_MS=0
+LOCAL_TTS_REALTIME_FACTOR=0
+# Audio format when a client asks for none (format parameter or Accept header), e.g. mp3_44100_128, opus_48000_64, pcm_24000
+TTS_DEFAULT_FORMAT=mp3_44100_128
+
+# ElevenLabs TTS: pooled connections, per-chunk read timeout, retries while opening a stream
+ELEVENLABS_API_KEY=your_elevenlabs_api_key_here
+ELEVENLABS_MODEL_ID=eleven_monolingual_v1
+TTS_MAX_CONNECTIONS=100
+TTS_READ_TIMEOUT_S=15
+TTS_CONNECT_RETRIES=2
+
+# Start TTS for voice-enabled /chat/ replies right away; buffers kept this long / within this size
+TTS_PREFETCH=true
+TTS_PREFETCH_TTL_S=300
+TTS_PREFETCH_MAX_MB=64
+
+# LLM resilience: comma-separated models tried after the routed candidates fail
+LLM_FALLBACK_MODELS=
+LLM_MAX_RETRIES=2
+LLM_DEADLINE_S=60
+LLM_HEDGE=false
+
+# Analytics: raw events are rolled up per day and pruned after this many days (0 = keep)
+ANALYTICS_RAW_RETENTION_DAYS=90
 """
     
     env_file = Path(__file__).parent / '.env'
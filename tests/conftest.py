@@ -1,6 +1,70 @@
+import os
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
 
+import pytest
+
 # Add root dir to sys.path so imports like `chat_ui.x` work
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+
+# === Postgres-backed tests ===
+# Point TEST_DATABASE_URL (and TEST_SHARD_DATABASE_URL for shard moves) at
+# throwaway databases loaded with database_schema.sql; otherwise these tests
+# are skipped. Pools belong to one event loop, so fixtures hand out an async
+# context manager to enter inside the test's asyncio.run().
+async def _ensure_partitions(database):
+    from app.services.message_archive import ensure_future_partitions, is_partitioned
+
+    async with database.get_connection() as conn:
+        if await is_partitioned(conn):
+            await ensure_future_partitions(conn)
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    url = os.getenv('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    from app.config.database import db
+
+    monkeypatch.setattr(db, 'dsn', url)
+    monkeypatch.setattr(db, 'pool', None)
+
+    @asynccontextmanager
+    async def connected():
+        await db.initialize()
+        await _ensure_partitions(db)
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    return connected
+
+
+@pytest.fixture
+def sharded_postgres(postgres, monkeypatch):
+    shard_url = os.getenv('TEST_SHARD_DATABASE_URL')
+    if not shard_url:
+        pytest.skip('TEST_SHARD_DATABASE_URL is not set')
+    from app.config.sharding import ShardRouter, shard_router
+
+    # Rebuild the global router in place, since modules hold references to it
+    monkeypatch.setenv('DB_SHARDS', f'shard1={shard_url}')
+    for name, value in vars(ShardRouter()).items():
+        monkeypatch.setattr(shard_router, name, value)
+
+    @asynccontextmanager
+    async def connected():
+        async with postgres():
+            await shard_router.initialize()
+            for database in shard_router.shards.values():
+                await _ensure_partitions(database)
+            try:
+                yield shard_router
+            finally:
+                await shard_router.close()
+
+    return connected
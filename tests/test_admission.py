@@ -0,0 +1,209 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.services.admission import AdmissionController, AdmissionRejectedError
+
+
+def _controller(**kwargs):
+    options = dict(max_concurrency=1, queue_size=8, queue_timeout_s=30, user_rate_per_min=0, user_burst=0)
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+async def _turn(controller, user_id, order, release):
+    async with controller.admit(user_id):
+        order.append(user_id)
+        await release.wait()
+
+
+# === Test: queued turns are admitted in arrival order ===
+def test_queue_is_fifo():
+    controller = _controller()
+
+    async def scenario():
+        order = []
+        release = asyncio.Event()
+        turns = []
+        for user_id in ("a", "b", "c", "d"):
+            turns.append(asyncio.create_task(_turn(controller, user_id, order, release)))
+            await asyncio.sleep(0)
+        assert order == ["a"]
+        assert controller.snapshot()["queued"] == 3
+
+        release.set()
+        await asyncio.gather(*turns)
+        return order
+
+    assert asyncio.run(scenario()) == ["a", "b", "c", "d"]
+    assert controller.active == 0
+    assert controller.snapshot()["queued"] == 0
+
+
+# === Test: a full queue rejects immediately ===
+def test_queue_full_rejects():
+    controller = _controller(queue_size=1)
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.create_task(_turn(controller, "a", [], release))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(_turn(controller, "b", [], release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejectedError) as excinfo:
+            async with controller.admit("c"):
+                pass
+        release.set()
+        await asyncio.gather(holder, queued)
+        return excinfo.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "queue_full"
+    assert rejected.retry_after >= 1
+
+
+# === Test: turns expected to wait past the timeout are rejected up front ===
+def test_expected_wait_rejects_up_front():
+    # Two queued turns ahead at 3 s each would wait ~9 s
+    controller = _controller(queue_timeout_s=7)
+
+    async def scenario():
+        release = asyncio.Event()
+        turns = [asyncio.create_task(_turn(controller, user_id, [], release)) for user_id in ("a", "b", "c")]
+        await asyncio.sleep(0)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(AdmissionRejectedError) as excinfo:
+            async with controller.admit("d"):
+                pass
+        rejected_after = loop.time() - started
+        release.set()
+        await asyncio.gather(*turns)
+        return excinfo.value, rejected_after
+
+    rejected, rejected_after = asyncio.run(scenario())
+    assert rejected.reason == "overloaded"
+    assert rejected.retry_after == 9
+    assert rejected_after < 0.1
+
+
+# === Test: a queued turn gives up after queue_timeout_s and leaves the queue ===
+def test_queue_timeout():
+    controller = _controller(queue_timeout_s=0.05)
+    controller._avg_hold_s = 0.01
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.create_task(_turn(controller, "a", [], release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejectedError) as excinfo:
+            async with controller.admit("b"):
+                pass
+        queued = controller.snapshot()["queued"]
+        release.set()
+        await holder
+        return excinfo.value, queued
+
+    rejected, queued = asyncio.run(scenario())
+    assert rejected.reason == "queue_timeout"
+    assert queued == 0
+    assert controller.active == 0
+
+
+# === Test: a cancelled waiter does not take the next free slot ===
+def test_cancelled_waiter_is_skipped():
+    controller = _controller()
+
+    async def scenario():
+        order = []
+        release = asyncio.Event()
+        holder = asyncio.create_task(_turn(controller, "a", order, release))
+        await asyncio.sleep(0)
+        gone = asyncio.create_task(_turn(controller, "b", order, release))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_turn(controller, "c", order, release))
+        await asyncio.sleep(0)
+
+        gone.cancel()
+        await asyncio.gather(gone, return_exceptions=True)
+        release.set()
+        await asyncio.gather(holder, waiting)
+        return order
+
+    assert asyncio.run(scenario()) == ["a", "c"]
+    assert controller.active == 0
+
+
+# === Test: each user gets a burst, then is limited to their rate ===
+def test_user_rate_limit():
+    controller = _controller(max_concurrency=4, user_rate_per_min=60, user_burst=2)
+
+    async def scenario():
+        for _ in range(2):
+            async with controller.admit("a"):
+                pass
+        with pytest.raises(AdmissionRejectedError) as excinfo:
+            async with controller.admit("a"):
+                pass
+        # Other users have their own bucket
+        async with controller.admit("b"):
+            pass
+        return excinfo.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "user_rate"
+    assert rejected.retry_after == 1
+
+
+# === Test: a turn refused for capacity gives the user's token back ===
+def test_rejected_turn_refunds_token():
+    controller = _controller(queue_size=0, user_rate_per_min=1, user_burst=2)
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.create_task(_turn(controller, "a", [], release))
+        await asyncio.sleep(0)
+
+        for _ in range(3):
+            with pytest.raises(AdmissionRejectedError) as excinfo:
+                async with controller.admit("b"):
+                    pass
+            assert excinfo.value.reason == "queue_full"
+        release.set()
+        await holder
+
+        # Still a full burst left for "b"
+        for _ in range(2):
+            async with controller.admit("b"):
+                pass
+
+    asyncio.run(scenario())
+    assert controller._buckets["b"][0] < 1
+
+
+# === Test: the API answers a rejection with 429, its reason and Retry-After ===
+def test_rejection_is_429_with_retry_after():
+    from app.main import admission_rejected_handler
+
+    app = FastAPI()
+    app.add_exception_handler(AdmissionRejectedError, admission_rejected_handler)
+
+    @app.get("/turn")
+    async def turn():
+        raise AdmissionRejectedError("Chat is overloaded", "overloaded", retry_after=4)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/turn")
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "4"
+    assert response.json()["reason"] == "overloaded"
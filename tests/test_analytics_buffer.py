@@ -0,0 +1,151 @@
+import asyncio
+import uuid
+
+from app.services.analytics_buffer import AnalyticsBuffer
+
+
+USER = str(uuid.uuid4())
+
+
+def _buffer(tmp_path, fail=0, **kwargs):
+    """Buffer whose writes are recorded; the first ``fail`` writes raise"""
+    buffer = AnalyticsBuffer(database=None, spill_path=tmp_path / 'spill.jsonl', **kwargs)
+    buffer.batches = []
+
+    async def write(events):
+        if len(buffer.batches) < fail:
+            buffer.batches.append(None)
+            raise ConnectionError("database down")
+        buffer.batches.append([event[2] for event in events])
+
+    buffer._write = write
+    return buffer
+
+
+# === Test: flush writes the queue in batch_size chunks ===
+def test_flush_in_batches(tmp_path):
+    buffer = _buffer(tmp_path, batch_size=2)
+    for i in range(5):
+        buffer.track(USER, f"event{i}")
+
+    assert asyncio.run(buffer.flush()) == 5
+    assert buffer.batches == [["event0", "event1"], ["event2", "event3"], ["event4"]]
+
+
+# === Test: a failed batch is spilled and replayed once writes succeed ===
+def test_failed_batch_is_spilled_and_replayed(tmp_path):
+    buffer = _buffer(tmp_path, fail=1, batch_size=10)
+    buffer.track(USER, "first", {"n": 1})
+    buffer.track(USER, "second")
+
+    assert asyncio.run(buffer.flush()) == 0
+    assert len(buffer.spill_path.read_text().splitlines()) == 2
+
+    buffer.track(USER, "third")
+    assert asyncio.run(buffer.flush()) == 3
+    assert buffer.batches[1:] == [["third"], ["first", "second"]]
+    assert not buffer.spill_path.exists()
+    assert not buffer.spill_path.with_suffix('.replay').exists()
+
+
+# === Test: a failed replay keeps the unwritten events for next time ===
+def test_failed_replay_is_kept(tmp_path):
+    buffer = _buffer(tmp_path, fail=1, batch_size=1)
+    buffer.track(USER, "first")
+    asyncio.run(buffer.flush())
+
+    write = buffer._write
+
+    async def write_fails(events):
+        raise ConnectionError("database down")
+
+    buffer._write = write_fails
+    assert asyncio.run(buffer._replay_spill()) == 0
+    assert buffer.spill_path.with_suffix('.replay').exists()
+
+    buffer._write = write
+    assert asyncio.run(buffer.flush()) == 1
+    assert buffer.batches[-1] == ["first"]
+
+
+# === Test: events past max_buffer go through the spill file, not lost ===
+def test_full_buffer_spills(tmp_path):
+    buffer = _buffer(tmp_path, batch_size=10, max_buffer=2)
+    for i in range(3):
+        buffer.track(USER, f"event{i}")
+
+    assert len(buffer._events) == 2
+    assert asyncio.run(buffer.flush()) == 3
+    assert buffer.batches == [["event0", "event1"], ["event2"]]
+
+
+# === Test: a full spill file drops events instead of growing ===
+def test_spill_file_is_bounded(tmp_path):
+    buffer = _buffer(tmp_path, fail=2, batch_size=10, spill_max_bytes=1)
+    buffer.track(USER, "first")
+    asyncio.run(buffer.flush())
+    size = buffer.spill_path.stat().st_size
+
+    buffer.track(USER, "second")
+    asyncio.run(buffer.flush())
+    assert buffer.spill_path.stat().st_size == size
+
+
+# === Test: events with a malformed user id are discarded ===
+def test_bad_user_id_is_dropped(tmp_path):
+    buffer = _buffer(tmp_path)
+    buffer.track("not-a-uuid", "event")
+    assert len(buffer._events) == 0
+
+
+# === Test: batch_size events wake the background task early ===
+def test_full_batch_flushes_before_interval(tmp_path):
+    buffer = _buffer(tmp_path, batch_size=2, flush_interval_s=60)
+
+    async def scenario():
+        await buffer.start()
+        buffer.track(USER, "first")
+        buffer.track(USER, "second")
+        for _ in range(100):
+            if buffer.batches:
+                break
+            await asyncio.sleep(0.01)
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    assert buffer.batches == [["first", "second"]]
+
+
+# === Test: COPY batches land in user_analytics; unknown users are skipped ===
+def test_copy_into_user_analytics(postgres, tmp_path):
+    from app.services.conversation_import import ConversationImporter
+
+    async def scenario():
+        async with postgres() as database:
+            user_id = uuid.uuid4()
+            await ConversationImporter().ensure_users([user_id])
+            buffer = AnalyticsBuffer(database=database, spill_path=tmp_path / 'spill.jsonl')
+            buffer.track(str(user_id), "message_sent", {"persona": "fuka"})
+            buffer.track(str(uuid.uuid4()), "message_sent")
+            await buffer.flush()
+            return await database.fetch(
+                "SELECT event_type, event_data FROM user_analytics WHERE user_id = $1", user_id
+            )
+
+    rows = asyncio.run(scenario())
+    assert [row['event_type'] for row in rows] == ["message_sent"]
+    assert not (tmp_path / 'spill.jsonl').exists()
+
+
+# === Test: track() never touches the disk, and the overflow queue is bounded ===
+def test_track_does_not_block_on_disk(tmp_path):
+    buffer = _buffer(tmp_path, batch_size=10, max_buffer=2)
+    for i in range(6):
+        buffer.track(USER, f"event{i}")
+
+    assert not buffer.spill_path.exists()
+    assert len(buffer._events) == 2
+    assert len(buffer._overflow) == 2
+
+    asyncio.run(buffer.flush())
+    assert buffer.batches == [["event0", "event1"], ["event2", "event3"]]
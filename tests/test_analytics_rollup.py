@@ -0,0 +1,126 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.services.analytics_rollup import AnalyticsRollup
+from app.services.conversation_import import ConversationImporter
+from app.services.user_service import UserService
+
+
+async def _reset(database):
+    # The rollup watermark is global, so every test starts from empty tables
+    await database.execute(
+        "TRUNCATE public.user_analytics, public.user_analytics_daily, public.analytics_rollup_state"
+    )
+
+
+async def _events(database, user_id, event_type, days_ago, count=1):
+    created_at = datetime.now(timezone.utc).replace(hour=12, minute=0) - timedelta(days=days_ago)
+    async with database.get_connection() as conn:
+        await conn.executemany(
+            "INSERT INTO public.user_analytics (user_id, event_type, event_data, created_at) VALUES ($1, $2, '{}', $3)",
+            [(user_id, event_type, created_at)] * count,
+        )
+
+
+async def _daily(database, user_id):
+    rows = await database.fetch(
+        "SELECT event_type, day, event_count FROM public.user_analytics_daily WHERE user_id = $1 ORDER BY day, event_type",
+        user_id,
+    )
+    today = datetime.now(timezone.utc).date()
+    return [(row['event_type'], (today - row['day']).days, row['event_count']) for row in rows]
+
+
+# === Test: complete days are rolled up; today stays raw but is still reported ===
+def test_roll_up_and_report(postgres):
+    async def scenario():
+        async with postgres() as database:
+            await _reset(database)
+            user_id = uuid.uuid4()
+            await ConversationImporter().ensure_users([user_id])
+            await _events(database, user_id, 'message_sent', days_ago=3, count=2)
+            await _events(database, user_id, 'message_sent', days_ago=1)
+            await _events(database, user_id, 'login', days_ago=1)
+            await _events(database, user_id, 'message_sent', days_ago=0)
+
+            written = await AnalyticsRollup(database=database).roll_up()
+            watermark = await database.fetchval("SELECT rolled_up_to FROM public.analytics_rollup_state")
+            return (
+                written,
+                watermark,
+                await _daily(database, user_id),
+                await UserService().get_user_analytics(str(user_id), days=30),
+            )
+
+    written, watermark, daily, analytics = asyncio.run(scenario())
+
+    assert written == 3
+    assert watermark == datetime.now(timezone.utc).date()
+    assert daily == [('message_sent', 3, 2), ('login', 1, 1), ('message_sent', 1, 1)]
+    assert analytics['total_events'] == 5
+    assert analytics['events_by_type'] == {'message_sent': 4, 'login': 1}
+
+
+# === Test: reruns recount the lookback window, picking up late events once ===
+def test_rerun_picks_up_late_events(postgres):
+    async def scenario():
+        async with postgres() as database:
+            await _reset(database)
+            user_id = uuid.uuid4()
+            await ConversationImporter().ensure_users([user_id])
+            await _events(database, user_id, 'message_sent', days_ago=1)
+            rollup = AnalyticsRollup(database=database, lookback_days=2)
+            await rollup.roll_up()
+
+            # E.g. replayed from the analytics spill file
+            await _events(database, user_id, 'message_sent', days_ago=1, count=2)
+            await rollup.roll_up()
+            await rollup.roll_up()
+            return await _daily(database, user_id)
+
+    assert asyncio.run(scenario()) == [('message_sent', 1, 3)]
+
+
+# === Test: raw events past retention are pruned only once rolled up ===
+def test_prune_keeps_counts(postgres):
+    async def scenario():
+        async with postgres() as database:
+            await _reset(database)
+            user_id = uuid.uuid4()
+            await ConversationImporter().ensure_users([user_id])
+            await _events(database, user_id, 'message_sent', days_ago=10, count=3)
+            await _events(database, user_id, 'message_sent', days_ago=1)
+            rollup = AnalyticsRollup(database=database, lookback_days=2, retention_days=5)
+
+            # Nothing is rolled up yet, so nothing may go
+            before = await rollup.prune_raw(chunk_size=2, pause_s=0)
+            result = await rollup.run()
+            raw = await database.fetchval("SELECT COUNT(*) FROM public.user_analytics WHERE user_id = $1", user_id)
+            analytics = await UserService().get_user_analytics(str(user_id), days=30)
+            return before, result, raw, analytics['total_events']
+
+    before, result, raw, total = asyncio.run(scenario())
+
+    assert before == 0
+    assert result == {'rolled_up': 2, 'pruned': 3}
+    assert raw == 1
+    assert total == 4
+
+
+# === Test: only one process rolls up at a time ===
+def test_roll_up_skips_when_locked(postgres):
+    async def scenario():
+        async with postgres() as database:
+            await _reset(database)
+            user_id = uuid.uuid4()
+            await ConversationImporter().ensure_users([user_id])
+            await _events(database, user_id, 'message_sent', days_ago=1)
+            async with database.get_connection() as conn:
+                await conn.execute("SELECT pg_advisory_lock($1)", 0x616E6C79)
+                try:
+                    return await AnalyticsRollup(database=database).roll_up()
+                finally:
+                    await conn.execute("SELECT pg_advisory_unlock($1)", 0x616E6C79)
+
+    assert asyncio.run(scenario()) == 0
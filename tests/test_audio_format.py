@@ -0,0 +1,79 @@
+import pytest
+from fastapi import HTTPException
+
+from app.api.chat import _negotiate_format, _parse_range
+from app.services.audio_format import FORMATS, default_format, negotiate
+
+
+# === Test: explicit format names and bare codecs ===
+def test_requested_format_wins_over_accept():
+    assert negotiate("mp3_44100_64", "audio/ogg").name == "mp3_44100_64"
+    assert negotiate(" OPUS ").name == "opus_48000_64"
+    assert negotiate("pcm").name == "pcm_24000"
+
+
+# === Test: Accept media ranges are tried in q-value order ===
+def test_accept_q_value_ordering():
+    assert negotiate(accept="audio/mpeg;q=0.5, audio/ogg;q=0.9").codec == "opus"
+    assert negotiate(accept="audio/ogg;q=0.2, audio/mpeg").codec == "mp3"
+    # Equal q: earlier entry wins
+    assert negotiate(accept="audio/ogg, audio/mpeg").codec == "opus"
+    # q=0 means "not acceptable"
+    assert negotiate(accept="audio/ogg;q=0, audio/mpeg;q=0.1").codec == "mp3"
+
+
+# === Test: unsupported types are skipped, wildcards get the default ===
+def test_accept_fallbacks():
+    assert negotiate(accept="video/mp4, audio/pcm;q=0.5").codec == "pcm"
+    assert negotiate(accept="audio/*") == default_format()
+    assert negotiate(accept="application/json") == default_format()
+
+
+# === Test: audio/pcm picks its sample rate from the rate parameter ===
+def test_pcm_rate_parameter():
+    assert negotiate(accept="audio/pcm;rate=16000").name == "pcm_16000"
+    assert negotiate(accept='audio/L16; rate="44100"').name == "pcm_44100"
+    # A rate we cannot produce falls back to the codec default
+    assert negotiate(accept="audio/pcm;rate=8000").name == "pcm_24000"
+
+
+# === Test: every advertised format negotiates to itself ===
+def test_every_format_round_trips():
+    for name, fmt in FORMATS.items():
+        assert negotiate(name) == fmt
+
+
+# === Test: unknown formats are refused with 406 ===
+def test_unknown_format_is_406():
+    with pytest.raises(ValueError):
+        negotiate("flac_44100")
+    with pytest.raises(HTTPException) as excinfo:
+        _negotiate_format("mp3_44100_999")
+    assert excinfo.value.status_code == 406
+
+
+# === Test: byte ranges ===
+def test_parse_range():
+    assert _parse_range("bytes=0-99", 1000) == (0, 99)
+    assert _parse_range("bytes=900-", 1000) == (900, 999)
+    # End past the last byte is clamped
+    assert _parse_range("bytes=500-5000", 1000) == (500, 999)
+    # Only the first of several ranges is served
+    assert _parse_range("bytes=0-9, 20-29", 1000) == (0, 9)
+
+
+# === Test: suffix ranges count from the end ===
+def test_parse_suffix_range():
+    assert _parse_range("bytes=-100", 1000) == (900, 999)
+    # A suffix longer than the file is the whole file
+    assert _parse_range("bytes=-5000", 1000) == (0, 999)
+
+
+# === Test: unsatisfiable and malformed ranges ===
+def test_parse_unsatisfiable_range():
+    assert _parse_range("bytes=1000-", 1000) is None
+    assert _parse_range("bytes=500-100", 1000) is None
+    assert _parse_range("bytes=-0", 1000) is None
+    assert _parse_range("bytes=0-10", 0) is None
+    assert _parse_range("items=0-10", 1000) is None
+    assert _parse_range("bytes=abc-", 1000) is None
@@ -0,0 +1,173 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.config.database import DatabaseConfig, DatabaseUnavailableError
+
+
+class _BusyPool:
+    """Pool whose connections are all checked out"""
+
+    def __init__(self, max_size=2):
+        self.max_size = max_size
+        self.released = []
+
+    def get_size(self):
+        return self.max_size
+
+    def get_idle_size(self):
+        return 0
+
+    def get_min_size(self):
+        return 1
+
+    def get_max_size(self):
+        return self.max_size
+
+    async def acquire(self, timeout=None):
+        await asyncio.sleep(timeout if timeout is not None else 3600)
+        raise asyncio.TimeoutError()
+
+    async def release(self, connection):
+        self.released.append(connection)
+
+
+def _busy_database(acquire_timeout=0.05, max_waiters=0):
+    database = DatabaseConfig()
+    database._config.update(acquire_timeout=acquire_timeout, max_waiters=max_waiters)
+    database.pool = _BusyPool()
+    return database
+
+
+async def _acquire(database, **kwargs):
+    async with database.get_connection(**kwargs):
+        pass
+
+
+# === Test: waiting past DB_ACQUIRE_TIMEOUT fails with DatabaseUnavailableError ===
+def test_acquire_timeout_fails_fast():
+    database = _busy_database(acquire_timeout=0.05)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(DatabaseUnavailableError):
+            await _acquire(database)
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) < 1
+    assert database._waiters == 0
+
+
+# === Test: a per-call timeout overrides the configured one ===
+def test_per_call_timeout():
+    database = _busy_database(acquire_timeout=30)
+
+    async def scenario():
+        with pytest.raises(DatabaseUnavailableError):
+            await asyncio.wait_for(_acquire(database, timeout=0.05), timeout=1)
+
+    asyncio.run(scenario())
+
+
+# === Test: past DB_MAX_WAITERS new callers are rejected without queueing ===
+def test_saturated_pool_rejects_immediately():
+    database = _busy_database(acquire_timeout=0.5, max_waiters=2)
+
+    async def scenario():
+        waiting = [asyncio.create_task(_acquire(database)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        assert database._waiters == 2
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(DatabaseUnavailableError):
+            await _acquire(database)
+        rejected_after = loop.time() - started
+
+        await asyncio.gather(*waiting, return_exceptions=True)
+        return rejected_after
+
+    assert asyncio.run(scenario()) < 0.1
+    assert database._waiters == 0
+
+
+# === Test: the API answers DatabaseUnavailableError with 503 and Retry-After ===
+def test_unavailable_is_503_with_retry_after():
+    from app.main import database_unavailable_handler
+
+    app = FastAPI()
+    app.add_exception_handler(DatabaseUnavailableError, database_unavailable_handler)
+
+    @app.get("/busy")
+    async def busy():
+        raise DatabaseUnavailableError("Database is busy, please retry shortly", retry_after=3)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/busy")
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+    assert response.json()["success"] is False
+
+
+async def _unavailable(*args, **kwargs):
+    raise DatabaseUnavailableError("Database is busy, please retry shortly", retry_after=2)
+
+
+# === Test: chat routes pass DatabaseUnavailableError through to the 503 handler ===
+@pytest.mark.parametrize("method, path, body", [
+    ("GET", "/chat/history?user_id=u&persona_name=fuka", None),
+    ("GET", "/chat/search?user_id=u&q=hello", None),
+    ("GET", "/chat/conversations?user_id=u", None),
+    ("GET", "/chat/conversation-for-persona?user_id=u&persona_name=fuka", None),
+    ("PUT", "/chat/conversations/c", {"title": "renamed"}),
+    ("DELETE", "/chat/conversations/c", None),
+])
+def test_chat_routes_answer_503(monkeypatch, method, path, body):
+    from app.api import chat
+    from app.main import database_unavailable_handler
+
+    for name in ("get_or_create_conversation", "search_messages", "get_user_conversations",
+                 "get_conversation_for_persona", "update_conversation_title", "delete_conversation"):
+        monkeypatch.setattr(chat.ConversationService, name, _unavailable)
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/chat")
+    app.add_exception_handler(DatabaseUnavailableError, database_unavailable_handler)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, json=body)
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+
+
+# === Test: a turn fails with 503 instead of calling the LLM without its history ===
+def test_turn_does_not_call_llm_when_database_is_busy(monkeypatch, tmp_path):
+    from app.services import chat_engine
+    from app.services.persona_manager import PersonaManager
+
+    (tmp_path / "default_persona.yml").write_text("name: Fuka\ndescription: test\nvoice_id: v1\n")
+    monkeypatch.setattr(PersonaManager, "_characters_dir", tmp_path)
+    monkeypatch.setattr(chat_engine.ConversationService, "get_or_create_conversation", _unavailable)
+    calls = []
+
+    async def complete(payload, models=None):
+        calls.append(payload)
+        return {"choices": [{"message": {"content": "hi"}}], "usage": {}}
+
+    monkeypatch.setattr(chat_engine.openrouter_client, "complete", complete)
+
+    with pytest.raises(DatabaseUnavailableError):
+        asyncio.run(chat_engine.ChatEngine.generate_reply("00000000-0000-0000-0000-000000000002", "hello", "safe"))
+    assert calls == []
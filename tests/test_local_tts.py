@@ -0,0 +1,100 @@
+import asyncio
+import struct
+
+import pytest
+
+from app.services.audio_format import FORMATS
+from app.services.local_tts import LocalTTSBackend, silent_mp3_frame
+
+
+def _collect(backend, text, format_name):
+    async def scenario():
+        return [chunk async for chunk in backend.stream(text, None, FORMATS[format_name])]
+    return asyncio.run(scenario())
+
+
+def _ogg_crc(page: bytes) -> int:
+    """Bit-by-bit CRC-32 (poly 0x04C11DB7, no reflection) as the Ogg spec defines it"""
+    crc = 0
+    for byte in page:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+def _ogg_pages(data: bytes):
+    offset = 0
+    while offset < len(data):
+        assert data[offset:offset + 4] == b'OggS'
+        segments = data[offset + 26]
+        body = sum(data[offset + 27:offset + 27 + segments])
+        end = offset + 27 + segments + body
+        yield data[offset:end]
+        offset = end
+
+
+# === Test: MP3 frame headers decode to the requested format ===
+@pytest.mark.parametrize("sample_rate, bitrate, version_bits, bitrate_index, length", [
+    (44100, 128, 0b11, 9, 417),
+    (44100, 32, 0b11, 1, 104),
+    (22050, 32, 0b10, 4, 104),
+])
+def test_silent_mp3_frame(sample_rate, bitrate, version_bits, bitrate_index, length):
+    frame = silent_mp3_frame(sample_rate, bitrate)
+    header = int.from_bytes(frame[:4], 'big')
+
+    assert len(frame) == length
+    assert header >> 21 == 0x7FF                 # frame sync
+    assert (header >> 19) & 0b11 == version_bits  # MPEG-1 / MPEG-2
+    assert (header >> 17) & 0b11 == 0b01         # Layer III
+    assert (header >> 16) & 1 == 1               # no CRC
+    assert (header >> 12) & 0xF == bitrate_index
+    assert (header >> 10) & 0b11 == 0            # 44.1 kHz (MPEG-1) or 22.05 kHz (MPEG-2)
+    assert (header >> 9) & 1 == 0                # no padding
+    assert (header >> 6) & 0b11 == 0b11          # mono
+    assert frame[4:] == bytes(length - 4)
+
+
+# === Test: MP3 stream is whole frames covering the text ===
+def test_mp3_stream_is_whole_frames():
+    backend = LocalTTSBackend(chars_per_s=10)
+    data = b''.join(_collect(backend, "x" * 30, "mp3_44100_128"))
+    frame = silent_mp3_frame(44100, 128)
+
+    assert len(data) % len(frame) == 0
+    frames = len(data) // len(frame)
+    assert frames * 1152 / 44100 == pytest.approx(3.0, abs=1152 / 44100)
+
+
+# === Test: PCM length matches the sample rate ===
+def test_pcm_length():
+    backend = LocalTTSBackend(chars_per_s=10)
+    data = b''.join(_collect(backend, "x" * 20, "pcm_16000"))
+    assert len(data) == 2 * 16000 * 2
+
+
+# === Test: every Ogg page carries a CRC that verifies ===
+def test_ogg_pages_crc():
+    backend = LocalTTSBackend(chars_per_s=10)
+    data = b''.join(_collect(backend, "x" * 25, "opus_48000_64"))
+    pages = list(_ogg_pages(data))
+
+    assert pages[0][28:36] == b'OpusHead'
+    assert pages[1][28:36] == b'OpusTags'
+    for sequence, page in enumerate(pages):
+        stored = struct.unpack('<I', page[22:26])[0]
+        assert stored == _ogg_crc(page[:22] + b'\0\0\0\0' + page[26:])
+        assert struct.unpack('<I', page[18:22])[0] == sequence
+
+    # Beginning and end of stream flags; the last granule is the audio length at 48 kHz
+    assert pages[0][5] == 0x02
+    assert pages[-1][5] == 0x04
+    assert struct.unpack('<q', pages[-1][6:14])[0] == 125 * 960
+
+
+# === Test: the same text always gives the same audio ===
+def test_output_is_deterministic():
+    backend = LocalTTSBackend()
+    assert _collect(backend, "hello there", "opus_48000_64") == _collect(backend, "hello there", "opus_48000_64")
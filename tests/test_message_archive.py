@@ -0,0 +1,83 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+from app.services.conversation_import import ConversationImporter
+from app.services.message_archive import MessageArchive, ensure_partitions
+
+
+MONTH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+PARTITION = 'messages_p202001'
+
+
+async def _conversation_with_old_message(database):
+    user_id = uuid.uuid4()
+    await ConversationImporter().ensure_users([user_id])
+    async with database.get_connection() as conn:
+        # Start from an unarchived month
+        await conn.execute("DELETE FROM public.message_archives WHERE partition_name = $1", PARTITION)
+        await ensure_partitions(conn, MONTH, MONTH)
+        persona_id = await conn.fetchval("""
+            INSERT INTO personas (name, display_name, description, personality_config)
+            VALUES ($1, 'Archive', 'test', '{}') RETURNING id
+        """, f"archive-{uuid.uuid4()}")
+        conversation_id = await conn.fetchval("""
+            INSERT INTO conversations (user_id, persona_id, title) VALUES ($1, $2, 'old') RETURNING id
+        """, user_id, persona_id)
+        await conn.execute("""
+            INSERT INTO messages (conversation_id, sender_type, content, user_id, created_at)
+            VALUES ($1, 'user', 'from 2020', $2, $3)
+        """, conversation_id, user_id, MONTH.replace(day=15))
+    return str(conversation_id)
+
+
+# === Test: a month archived after a lookup is not hidden by the cache ===
+def test_archived_later_is_visible(postgres, tmp_path):
+    async def scenario():
+        async with postgres() as database:
+            conversation_id = await _conversation_with_old_message(database)
+            archive = MessageArchive(database, tmp_path)
+
+            before = await archive.load_conversation(conversation_id)
+            # Another process archives the month
+            await MessageArchive(database, tmp_path).archive_partition(PARTITION)
+            after = await archive.load_conversation(conversation_id)
+            again = await archive.load_conversation(conversation_id)
+            return before, after, again
+
+    before, after, again = asyncio.run(scenario())
+
+    assert before == []
+    assert [m['content'] for m in after] == ['from 2020']
+    assert again is after
+
+
+# === Test: purging a conversation erases its archived messages, and only those ===
+def test_purge_erases_archived_messages(postgres, tmp_path):
+    from app.services.postgres_store import PostgresConversationStore
+
+    async def scenario():
+        async with postgres() as database:
+            purged_id = await _conversation_with_old_message(database)
+            kept_id = await _conversation_with_old_message(database)
+            archive = MessageArchive(database, tmp_path)
+            await archive.archive_partition(PARTITION)
+            path, offset, length = (await database.fetchrow("""
+                SELECT a.path, s.byte_offset, s.byte_length
+                FROM public.message_archive_segments s
+                JOIN public.message_archives a ON a.id = s.archive_id
+                WHERE s.conversation_id = $1
+            """, uuid.UUID(purged_id))).values()
+
+            await database.execute("UPDATE conversations SET deleted_at = NOW() WHERE id = $1", uuid.UUID(purged_id))
+            await PostgresConversationStore().purge_deleted(chunk_size=100, pause_s=0)
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                erased = f.read(length)
+            return erased, await archive.load_conversation(purged_id), await archive.load_conversation(kept_id)
+
+    erased, purged, kept = asyncio.run(scenario())
+
+    assert erased == bytes(len(erased))
+    assert purged == []
+    assert [m['content'] for m in kept] == ['from 2020']
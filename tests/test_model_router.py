@@ -0,0 +1,37 @@
+from app.services.model_router import ModelRouter
+
+
+def _router(**kwargs):
+    options = dict(models=["slow/model", "fast/model"], explore_rate=0)
+    options.update(kwargs)
+    return ModelRouter(**options)
+
+
+def _record(router, model, latency, count=5):
+    for _ in range(count):
+        router.record(model, ok=True, latency=latency)
+
+
+# === Test: fastest ranks by median reply latency, unmeasured models last ===
+def test_fastest_ranks_by_latency():
+    router = _router(models=["slow/model", "new/model", "fast/model"])
+    _record(router, "slow/model", 4.0)
+    _record(router, "fast/model", 1.0)
+
+    assert router.rank() == ["fast/model", "slow/model", "new/model"]
+    snapshot = {m["model"]: m for m in router.snapshot()["models"]}
+    assert snapshot["fast/model"]["latency_p50_s"] == 1.0
+    assert snapshot["new/model"]["latency_p50_s"] is None
+
+
+# === Test: cheapest skips models over the latency SLO ===
+def test_cheapest_respects_latency_slo():
+    router = _router(policy="cheapest", latency_slo_s=3.0)
+    for model, price in (("slow/model", 1e-7), ("fast/model", 1e-6)):
+        stats = router.stats(model)
+        stats.prompt_price = stats.completion_price = price
+    _record(router, "slow/model", 4.0)
+    _record(router, "fast/model", 1.0)
+
+    assert router.rank() == ["fast/model", "slow/model"]
+
@@ -0,0 +1,250 @@
+import asyncio
+import json
+from collections import deque
+
+import httpx
+import pytest
+
+from app.services import openrouter_client
+from app.services.openrouter_client import CircuitBreaker, LLMUnavailableError, OpenRouterClient
+
+
+def _reply(model, text="hi"):
+    return {
+        "model": model,
+        "choices": [{"message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": 3, "completion_tokens": 2},
+    }
+
+
+def _client(monkeypatch, handler, **kwargs):
+    """Client talking to ``handler(model, attempt)`` instead of OpenRouter"""
+    monkeypatch.setattr(openrouter_client, "LLM_BACKOFF_BASE_S", 0.001)
+    monkeypatch.setattr(openrouter_client, "LLM_BACKOFF_MAX_S", 0.001)
+    calls = []
+
+    async def respond(request):
+        model = json.loads(request.content)["model"]
+        calls.append(model)
+        return await handler(model, calls.count(model))
+
+    options = dict(fallback_models=[], max_retries=2, deadline_s=5, hedge=False)
+    options.update(kwargs)
+    client = OpenRouterClient(**options)
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(respond), base_url="http://openrouter.test")
+    client.calls = calls
+    return client
+
+
+def _complete(client, model="primary/model"):
+    async def scenario():
+        try:
+            return await client.complete({"model": model, "messages": []})
+        finally:
+            await client.close()
+    return asyncio.run(scenario())
+
+
+# === Test: 5xx and 429 are retried on the same model ===
+def test_retries_then_succeeds(monkeypatch):
+    async def handler(model, attempt):
+        if attempt == 1:
+            return httpx.Response(503)
+        if attempt == 2:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json=_reply(model))
+
+    client = _client(monkeypatch, handler)
+    result = _complete(client)
+
+    assert result["choices"][0]["message"]["content"] == "hi"
+    assert client.calls == ["primary/model"] * 3
+    assert client.breaker("primary/model").state == CircuitBreaker.CLOSED
+
+
+# === Test: transport errors count as retryable ===
+def test_transport_error_is_retried(monkeypatch):
+    async def handler(model, attempt):
+        if attempt == 1:
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(200, json=_reply(model))
+
+    client = _client(monkeypatch, handler)
+    assert _complete(client)["model"] == "primary/model"
+    assert len(client.calls) == 2
+
+
+# === Test: once retries run out the next model answers ===
+def test_falls_back_to_next_model(monkeypatch):
+    async def handler(model, attempt):
+        if model == "primary/model":
+            return httpx.Response(502)
+        return httpx.Response(200, json=_reply(model, "from fallback"))
+
+    client = _client(monkeypatch, handler, fallback_models=["fallback/model"], max_retries=1)
+    result = _complete(client)
+
+    assert result["choices"][0]["message"]["content"] == "from fallback"
+    assert client.calls == ["primary/model", "primary/model", "fallback/model"]
+
+
+# === Test: every model failing raises LLMUnavailableError ===
+def test_all_models_down(monkeypatch):
+    async def handler(model, attempt):
+        return httpx.Response(500)
+
+    client = _client(monkeypatch, handler, fallback_models=["fallback/model"], max_retries=1)
+    with pytest.raises(LLMUnavailableError) as excinfo:
+        _complete(client)
+    assert excinfo.value.retry_after >= 1
+    assert client.calls == ["primary/model"] * 2 + ["fallback/model"] * 2
+
+
+# === Test: a retired model fails over at once, without retries ===
+@pytest.mark.parametrize("response", [
+    httpx.Response(404, json={"error": {"message": "No endpoints found for primary/model"}}),
+    httpx.Response(400, json={"error": {"message": "primary/model is not a valid model ID"}}),
+])
+def test_unavailable_model_falls_back(monkeypatch, response):
+    async def handler(model, attempt):
+        if model == "primary/model":
+            return response
+        return httpx.Response(200, json=_reply(model, "from fallback"))
+
+    recorded = []
+    monkeypatch.setattr(openrouter_client.model_router, "record", lambda model, ok, **kw: recorded.append((model, ok)))
+    client = _client(monkeypatch, handler, fallback_models=["fallback/model"])
+    result = _complete(client)
+
+    assert result["choices"][0]["message"]["content"] == "from fallback"
+    assert client.calls == ["primary/model", "fallback/model"]
+    assert recorded == [("primary/model", False), ("fallback/model", True)]
+
+
+# === Test: every model retired raises LLMUnavailableError ===
+def test_all_models_unavailable(monkeypatch):
+    async def handler(model, attempt):
+        return httpx.Response(404)
+
+    client = _client(monkeypatch, handler, fallback_models=["fallback/model"])
+    with pytest.raises(LLMUnavailableError):
+        _complete(client)
+    assert client.calls == ["primary/model", "fallback/model"]
+
+
+# === Test: a bad request is raised as is and not held against the model ===
+def test_bad_request_is_not_a_model_failure(monkeypatch):
+    async def handler(model, attempt):
+        return httpx.Response(400, json={"error": {"message": "messages must not be empty"}})
+
+    recorded = []
+    monkeypatch.setattr(openrouter_client.model_router, "record", lambda model, ok, **kw: recorded.append((model, ok)))
+    client = _client(monkeypatch, handler, fallback_models=["fallback/model"])
+    with pytest.raises(httpx.HTTPStatusError):
+        _complete(client)
+    assert client.calls == ["primary/model"]
+    assert recorded == []
+    assert client.breaker("primary/model").failures == 0
+
+
+# === Test: the client reports the whole request time as latency ===
+def test_client_records_request_latency(monkeypatch):
+    recorded = []
+
+    async def handler(model, attempt):
+        return httpx.Response(200, json=_reply(model))
+
+    monkeypatch.setattr(openrouter_client.model_router, "record",
+                        lambda model, ok, latency=None: recorded.append((model, ok, latency)))
+    _complete(_client(monkeypatch, handler))
+
+    (model, ok, latency), = recorded
+    assert (model, ok) == ("primary/model", True)
+    assert latency > 0
+
+# === Test: the deadline bounds the whole call ===
+def test_deadline(monkeypatch):
+    async def handler(model, attempt):
+        await asyncio.sleep(1)
+        return httpx.Response(200, json=_reply(model))
+
+    client = _client(monkeypatch, handler, deadline_s=0.05)
+    with pytest.raises(LLMUnavailableError):
+        _complete(client)
+
+
+# === Test: breaker opens, admits one probe after the cooldown, then closes or re-opens ===
+def test_circuit_breaker_states():
+    breaker = CircuitBreaker("m", failure_threshold=2, cooldown_s=10)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert 9 < breaker.retry_in() <= 10
+
+    # Cooldown over
+    breaker.opened_at -= 10
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    breaker.opened_at -= 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+    assert breaker.allow()
+
+
+# === Test: a model whose breaker is open is skipped without a request ===
+def test_open_breaker_is_skipped(monkeypatch):
+    async def handler(model, attempt):
+        return httpx.Response(200, json=_reply(model))
+
+    client = _client(monkeypatch, handler, fallback_models=["fallback/model"])
+    breaker = client.breaker("primary/model")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    assert _complete(client)["model"] == "fallback/model"
+    assert client.calls == ["fallback/model"]
+
+
+# === Test: a slow request is hedged and the faster copy wins ===
+def test_hedge_wins_over_slow_primary(monkeypatch):
+    monkeypatch.setattr(openrouter_client, "LLM_HEDGE_MIN_DELAY_S", 0.01)
+
+    async def handler(model, attempt):
+        if attempt == 1:
+            await asyncio.sleep(2)
+        return httpx.Response(200, json=_reply(model, f"attempt {attempt}"))
+
+    client = _client(monkeypatch, handler, hedge=True)
+    client._latencies["primary/model"] = deque([0.01] * 20)
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        result = await client.complete({"model": "primary/model", "messages": []})
+        await client.close()
+        return result, asyncio.get_running_loop().time() - started
+
+    result, elapsed = asyncio.run(scenario())
+
+    assert result["choices"][0]["message"]["content"] == "attempt 2"
+    assert elapsed < 1
+
+
+# === Test: no hedging until enough latencies are known ===
+def test_no_hedge_without_samples():
+    client = OpenRouterClient(hedge=True)
+    assert client._hedge_delay("primary/model") is None
+    client._latencies["primary/model"] = deque([0.5] * 19)
+    assert client._hedge_delay("primary/model") is None
+    client._latencies["primary/model"].append(0.5)
+    assert client._hedge_delay("primary/model") == max(openrouter_client.LLM_HEDGE_MIN_DELAY_S, 0.5)
@@ -0,0 +1,25 @@
+import asyncio
+import uuid
+
+from app.services.conversation_import import ConversationImporter
+from app.services.postgres_store import PostgresConversationStore
+
+
+# === Test: message metadata comes back as a dict, not the JSONB text ===
+def test_messages_have_parsed_metadata(postgres):
+    async def scenario():
+        async with postgres():
+            store = PostgresConversationStore()
+            user_id = uuid.uuid4()
+            await ConversationImporter().ensure_users([user_id])
+            conversation_id = await store.get_or_create_conversation(str(user_id), 'fuka')
+            message_id = await store.save_message(conversation_id, 'ai', 'hi', metadata={'voice_id': 'v1'})
+            return (
+                await store.get_conversation_messages(conversation_id),
+                await store.get_message(conversation_id, message_id, str(user_id)),
+            )
+
+    messages, message = asyncio.run(scenario())
+
+    assert [m['metadata'] for m in messages] == [{'voice_id': 'v1'}]
+    assert message['metadata'] == {'voice_id': 'v1'}
@@ -0,0 +1,115 @@
+import asyncio
+import uuid
+
+from app.config.sharding import PRIMARY_SHARD
+from app.services import shard_rebalance
+from app.services.conversation_import import ConversationImporter
+from app.services.conversation_service import ConversationService
+from app.services.shard_rebalance import ShardRebalancer
+
+
+async def _user_on(router, shard):
+    user_id = uuid.uuid4()
+    await ConversationImporter().ensure_users([user_id])
+    await router.pin_user(str(user_id), shard)
+    return str(user_id)
+
+
+def _forget(router):
+    router._user_cache.clear()
+    router._conversation_cache.clear()
+
+
+async def _rows_on(router, shard, user_id):
+    return await router.database(shard).fetchval(
+        "SELECT COUNT(*) FROM conversations WHERE user_id = $1", uuid.UUID(user_id)
+    )
+
+
+# === Test: a move copies the history, re-pins the user and empties the old shard ===
+def test_move_user_to_new_shard(sharded_postgres, monkeypatch):
+    monkeypatch.setattr(shard_rebalance, 'SHARD_MAP_TTL', 0)
+
+    async def scenario():
+        async with sharded_postgres() as router:
+            await ShardRebalancer().prepare_shards()
+            service = ConversationService()
+            user_id = await _user_on(router, PRIMARY_SHARD)
+            fuka = await service.get_or_create_conversation(user_id, 'fuka')
+            gwen = await service.get_or_create_conversation(user_id, 'gwen')
+            await service.save_message(fuka, 'user', 'hello', user_id=user_id)
+            await service.save_message(fuka, 'ai', 'hi there')
+            await service.save_message(gwen, 'user', 'hey', user_id=user_id)
+
+            results = await ShardRebalancer().move_users({user_id: 'shard1'})
+            _forget(router)
+
+            return (
+                results[user_id],
+                await router.shard_for_user(user_id),
+                await _rows_on(router, PRIMARY_SHARD, user_id),
+                await _rows_on(router, 'shard1', user_id),
+                [m['content'] for m in await service.get_conversation_messages(fuka)],
+            )
+
+    result, shard, left, moved, messages = asyncio.run(scenario())
+
+    assert result == {'conversations': 2, 'messages': 3, 'removed': 2}
+    assert shard == 'shard1'
+    assert left == 0
+    assert moved == 2
+    assert messages == ['hello', 'hi there']
+
+
+# === Test: moving a user to the shard they are on is a no-op ===
+def test_move_to_current_shard_is_noop(sharded_postgres, monkeypatch):
+    monkeypatch.setattr(shard_rebalance, 'SHARD_MAP_TTL', 0)
+
+    async def scenario():
+        async with sharded_postgres() as router:
+            await ShardRebalancer().prepare_shards()
+            user_id = await _user_on(router, 'shard1')
+            await ConversationService().get_or_create_conversation(user_id, 'fuka')
+            return await ShardRebalancer().move_users({user_id: 'shard1'})
+
+    assert asyncio.run(scenario()) == {}
+
+
+# === Test: writes to the old shard during a move reach the new shard ===
+def test_late_writes_follow_the_move(sharded_postgres):
+    async def scenario():
+        async with sharded_postgres() as router:
+            rebalancer = ShardRebalancer()
+            await rebalancer.prepare_shards()
+            service = ConversationService()
+            user_id = await _user_on(router, PRIMARY_SHARD)
+            fuka = await service.get_or_create_conversation(user_id, 'fuka')
+            gwen = await service.get_or_create_conversation(user_id, 'gwen')
+            await service.save_message(fuka, 'user', 'one', user_id=user_id)
+            dropped = await service.save_message(fuka, 'ai', 'two')
+            await service.save_message(gwen, 'user', 'hey', user_id=user_id)
+
+            first = {'conversation': set(), 'message': set()}
+            await rebalancer._copy(user_id, PRIMARY_SHARD, 'shard1', first)
+
+            # Still routed to the old shard until the pin switches
+            await service.update_conversation_title(fuka, 'renamed', user_id=user_id)
+            await service.delete_message(fuka, dropped)
+            await service.save_message(fuka, 'ai', 'three')
+            await service.delete_conversation(gwen, user_id=user_id)
+
+            await router.pin_user(user_id, 'shard1', replace=True)
+            await rebalancer._finish(user_id, PRIMARY_SHARD, 'shard1', first)
+            _forget(router)
+
+            return (
+                [(c['title'], c['message_count']) for c in await service.get_user_conversations(user_id)],
+                [m['content'] for m in await service.get_conversation_messages(fuka)],
+                await _rows_on(router, PRIMARY_SHARD, user_id),
+            )
+
+    conversations, messages, left = asyncio.run(scenario())
+
+    assert conversations == [('renamed', 2)]
+    assert messages == ['one', 'three']
+    assert left == 0
@@ -0,0 +1,137 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.services.single_flight import IdempotencyKeyConflictError, SingleFlight
+
+
+# === Test: first caller leads, concurrent callers join, later ones replay ===
+def test_leader_joined_and_replayed():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def scenario():
+        flight = SingleFlight("test")
+        first, second = await asyncio.gather(
+            flight.run("k", work, "fp", ttl_s=60),
+            flight.run("k", work, "fp", ttl_s=60),
+        )
+        third = await flight.run("k", work, "fp", ttl_s=60)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+
+    assert first == ("reply", "leader")
+    assert second == ("reply", "joined")
+    assert third == ("reply", "replayed")
+    assert len(calls) == 1
+
+
+# === Test: failures are not stored ===
+def test_failure_is_retried():
+    attempts = []
+
+    async def work():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("upstream down")
+        return "reply"
+
+    async def scenario():
+        flight = SingleFlight("test")
+        with pytest.raises(RuntimeError):
+            await flight.run("k", work, "fp", ttl_s=60)
+        return await flight.run("k", work, "fp", ttl_s=60)
+
+    assert asyncio.run(scenario()) == ("reply", "leader")
+
+
+# === Test: a key reused for a different request conflicts ===
+def test_key_reused_with_different_request():
+    async def work():
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def scenario():
+        flight = SingleFlight("test")
+        leader = asyncio.create_task(flight.run("k", work, "fp-a", ttl_s=60))
+        await asyncio.sleep(0)
+        # In flight
+        with pytest.raises(IdempotencyKeyConflictError):
+            await flight.run("k", work, "fp-b", ttl_s=60)
+        await leader
+        # Stored
+        with pytest.raises(IdempotencyKeyConflictError):
+            await flight.run("k", work, "fp-b", ttl_s=60)
+
+    asyncio.run(scenario())
+
+
+# === Test: /chat/ answers a reused Idempotency-Key with 422 ===
+def test_chat_idempotency_conflict_is_422(monkeypatch):
+    from app.api import chat
+
+    async def generate_reply(user_id, message, mode, save_to_history):
+        return {"reply": f"echo {message}", "prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+
+    monkeypatch.setattr(chat.ChatEngine, "generate_reply", staticmethod(generate_reply))
+    monkeypatch.setattr(chat, "chat_single_flight", SingleFlight("test"))
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/chat")
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"Idempotency-Key": "retry-1"}
+            turn = {"user_id": "00000000-0000-0000-0000-000000000001", "mode": "safe", "voice_enabled": False}
+            first = await client.post("/chat/", json={**turn, "message": "hi"}, headers=headers)
+            retry = await client.post("/chat/", json={**turn, "message": "hi"}, headers=headers)
+            other = await client.post("/chat/", json={**turn, "message": "bye"}, headers=headers)
+        return first, retry, other
+
+    first, retry, other = asyncio.run(scenario())
+
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    assert retry.headers["X-Coalesced"] == "replayed"
+    assert other.status_code == 422
+
+
+# === Test: the work is cancelled only once its last caller has gone ===
+def test_cancelled_only_after_last_waiter_leaves():
+    state = {"cancelled": False}
+
+    async def scenario():
+        running = asyncio.Event()
+
+        async def work():
+            running.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        flight = SingleFlight("test")
+        first = asyncio.create_task(flight.run("k", work, "fp", ttl_s=60))
+        second = asyncio.create_task(flight.run("k", work, "fp", ttl_s=60))
+        await running.wait()
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.sleep(0)
+        still_running = not state["cancelled"]
+
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        await asyncio.sleep(0)
+        return still_running
+
+    assert asyncio.run(scenario()) is True
+    assert state["cancelled"] is True
@@ -0,0 +1,108 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.services import tts_backend
+
+
+class _FailingBackend:
+    """Fails after ``chunks`` chunks, e.g. ElevenLabs answering 401 quota_exceeded"""
+
+    def __init__(self, chunks=0):
+        self.chunks = chunks
+        self.calls = 0
+
+    async def stream(self, *args, **kwargs):
+        self.calls += 1
+        for _ in range(self.chunks):
+            yield b"\xff\xfbpartial"
+        raise RuntimeError("quota_exceeded")
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def persona(tmp_path, monkeypatch):
+    """Make every user's active persona use ``backend``"""
+    from app.services.persona_manager import PersonaManager
+
+    def use(backend):
+        (tmp_path / "default_persona.yml").write_text(
+            f"name: Fuka\ndescription: test\nvoice_id: v1\ntts_backend: {backend}\n"
+        )
+    monkeypatch.setattr(PersonaManager, "_characters_dir", tmp_path)
+    return use
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    monkeypatch.setattr(tts_backend, "_backends", {})
+    monkeypatch.setattr(tts_backend, "_down_until", {})
+    monkeypatch.setattr(tts_backend, "TTS_FALLBACK_BACKEND", "local")
+    return tts_backend._backends
+
+
+def _speak(monkeypatch, requests=1):
+    from app.api import chat
+
+    async def generate_reply(user_id, message, mode):
+        return {"reply": "Hello there, nice to meet you.", "voice_id": "v1",
+                "conversation_id": None, "message_id": None}
+
+    monkeypatch.setattr(chat.ChatEngine, "generate_reply", staticmethod(generate_reply))
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/chat")
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            turn = {"user_id": str(uuid.uuid4()), "message": "hi"}
+            return [await client.post("/chat/speak", json=turn) for _ in range(requests)]
+
+    return asyncio.run(scenario())
+
+
+# === Test: /chat/speak streams MP3 from the local backend ===
+def test_speak_on_local_backend(monkeypatch, persona, backends):
+    persona("local")
+    response, = _speak(monkeypatch)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert response.content[:2] == b"\xff\xfb"
+    assert list(backends) == ["local"]
+
+
+# === Test: a backend failing before its first chunk fails over, and stays skipped ===
+def test_speak_fails_over_before_first_chunk(monkeypatch, persona, backends):
+    persona("elevenlabs")
+    broken = backends["elevenlabs"] = _FailingBackend()
+    first, second = _speak(monkeypatch, requests=2)
+
+    assert first.status_code == 200
+    assert first.content[:2] == b"\xff\xfb"
+    assert second.content == first.content
+    # The second stream went straight to the fallback
+    assert broken.calls == 1
+    assert "elevenlabs" in tts_backend._down_until
+
+
+# === Test: once audio has started the stream is not switched ===
+def test_no_failover_after_first_chunk(monkeypatch, backends):
+    monkeypatch.setattr(tts_backend, "TTS_BACKEND", "elevenlabs")
+    broken = backends["elevenlabs"] = _FailingBackend(chunks=1)
+
+    async def scenario():
+        chunks = []
+        with pytest.raises(RuntimeError):
+            async for chunk in tts_backend.synthesize_reply_as_stream("Hello there", "v1"):
+                chunks.append(chunk)
+        return chunks
+
+    assert asyncio.run(scenario()) == [b"\xff\xfbpartial"]
+    assert broken.calls == 1
+    assert "local" not in backends